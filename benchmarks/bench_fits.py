@@ -0,0 +1,197 @@
+"""
+End-to-end cost of the pyLIMA fitters on canned synthetic events.
+
+For each fitter and scenario, the suite records the wall time (time_fit), the peak
+RSS of the process (peakmem_fit), the number of objective function evaluations per
+second and, for the fitters accepting a computational pool, the scaling with the
+number of workers. The fitters are given small budgets: the goal is to track the
+cost of a fit, not to reach convergence.
+"""
+import numpy as np
+from pyLIMA.fits import BOOTSTRAP_fit, DE_fit, DEMC_fit, DREAM_fit, GRIDS_fit, \
+    LM_fit, MCMC_fit, TRF_fit
+
+from .synthetic_events import FLUXES_PARAMETERS, simulate_model
+
+SCENARIOS = {'PSPL': {'model_type': 'PSPL'},
+             'FSPL': {'model_type': 'FSPL'},
+             'USBL': {'model_type': 'USBL'},
+             'PSPL_parallax': {'model_type': 'PSPL', 'parallax': True}}
+
+GRID_PARAMETERS = {'PSPL': ['u0'], 'FSPL': ['rho'],
+                   'USBL': ['separation', 'mass_ratio'], 'PSPL_parallax': ['piEN']}
+
+NUMBER_OF_POINTS = 500
+WORKERS = [1, 2, 4]
+
+
+def objective_evaluations(fit):
+    """
+    Count the number of objective function evaluations of a fit
+
+    Parameters
+    ----------
+    fit : object, a fit object that has been fitted
+
+    Returns
+    -------
+    evaluations : int, the number of objective function evaluations
+    """
+    if len(fit.trials) != 0:
+
+        return len(fit.trials)
+
+    if 'DEMC_chains' in fit.fit_results.keys():
+
+        chains = fit.fit_results['DEMC_chains']
+
+        return chains.shape[0] * chains.shape[1] + chains.shape[1]
+
+    # least_squares fits do not record trials
+    fit_object = fit.fit_results['fit_object']
+    evaluations = fit_object['nfev']
+
+    # finite differences Jacobian are not counted by least_squares
+    if (fit.model.Jacobian_flag == 'Numerical') & (fit_object['njev'] is not None):
+        evaluations += fit_object['njev'] * len(fit_object['x'])
+
+    return evaluations
+
+
+class _FitBenchmark:
+    params = (list(SCENARIOS.keys()), WORKERS)
+    param_names = ['scenario', 'workers']
+    number = 1
+    repeat = 1
+    warmup_time = 0
+    timeout = 1800
+
+    def setup(self, scenario, workers):
+
+        np.random.seed(42)
+
+        self.model, self.pyLIMA_parameters = simulate_model(
+            number_of_points=NUMBER_OF_POINTS, **SCENARIOS[scenario])
+
+        self.model_parameters_guess = [
+            self.pyLIMA_parameters[key] for key in self.model.model_dictionnary.keys()
+            if key.split('_')[0] not in FLUXES_PARAMETERS]
+
+    def new_fit(self, scenario):
+
+        raise NotImplementedError
+
+    def fit_kwargs(self):
+
+        return {}
+
+    def run_fit(self, scenario, workers):
+
+        fit = self.new_fit(scenario)
+        fit.model_parameters_guess = list(self.model_parameters_guess)
+
+        if workers > 1:
+
+            fit.define_execution_backend('process', number_of_workers=workers)
+
+        fit.fit(**self.fit_kwargs())
+
+        return fit
+
+    def time_fit(self, scenario, workers):
+        self.run_fit(scenario, workers)
+
+    def peakmem_fit(self, scenario, workers):
+        self.run_fit(scenario, workers)
+
+    def track_objective_evaluations_per_second(self, scenario, workers):
+        fit = self.run_fit(scenario, workers)
+
+        return objective_evaluations(fit) / fit.fit_results['fit_time']
+
+    track_objective_evaluations_per_second.unit = 'evaluations/s'
+
+
+class LMFit(_FitBenchmark):
+    params = (list(SCENARIOS.keys()), [1])
+
+    def new_fit(self, scenario):
+        return LM_fit.LMfit(self.model)
+
+
+class TRFFit(_FitBenchmark):
+    params = (list(SCENARIOS.keys()), [1])
+
+    def new_fit(self, scenario):
+        return TRF_fit.TRFfit(self.model)
+
+
+class TRFProjectionFit(_FitBenchmark):
+    params = (list(SCENARIOS.keys()), [1])
+
+    def new_fit(self, scenario):
+        return TRF_fit.TRFfit(self.model, telescopes_fluxes_method='polyfit')
+
+
+class DEFit(_FitBenchmark):
+
+    def new_fit(self, scenario):
+        return DE_fit.DEfit(self.model, DE_population_size=5, max_iteration=20)
+
+
+class MCMCFit(_FitBenchmark):
+
+    def new_fit(self, scenario):
+        return MCMC_fit.MCMCfit(self.model, MCMC_walkers=2, MCMC_links=100)
+
+
+class DEMCFit(_FitBenchmark):
+
+    def new_fit(self, scenario):
+        return DEMC_fit.DEMCfit(self.model, DEMC_walkers=2, DEMC_links=100)
+
+
+class DREAMFit(_FitBenchmark):
+
+    def new_fit(self, scenario):
+        return DREAM_fit.DREAMfit(self.model, DEMC_population_size=5,
+                                  max_iteration=50)
+
+
+class GRIDFit(_FitBenchmark):
+
+    def new_fit(self, scenario):
+        return GRIDS_fit.GRIDfit(self.model, DE_population_size=5, max_iteration=5,
+                                 fix_parameters=GRID_PARAMETERS[scenario],
+                                 grid_resolution=2)
+
+    # the DE fits of the grid cells are not kept, count the cells instead
+    track_objective_evaluations_per_second = None
+
+    def track_cells_per_second(self, scenario, workers):
+        fit = self.run_fit(scenario, workers)
+
+        return len(fit.fit_results['GRIDS_population']) / fit.fit_results[
+            'fit_time']
+
+    track_cells_per_second.unit = 'cells/s'
+
+
+class BOOTSTRAPFit(_FitBenchmark):
+    number_of_samples = 4
+
+    def new_fit(self, scenario):
+        return BOOTSTRAP_fit.BOOTSTRAPfit(self.model)
+
+    def fit_kwargs(self):
+        return {'number_of_samples': self.number_of_samples}
+
+    # each sample is a full TRF fit on a resampled event, count the samples instead
+    track_objective_evaluations_per_second = None
+
+    def track_samples_per_second(self, scenario, workers):
+        fit = self.run_fit(scenario, workers)
+
+        return len(fit.fit_results['samples']) / fit.fit_results['fit_time']
+
+    track_samples_per_second.unit = 'samples/s'
@@ -0,0 +1,65 @@
+"""
+Throughput of the magnification kernels, over a grid of data sizes and source
+positions (i.e. impact parameters, from caustic crossing to low magnification).
+"""
+import numpy as np
+from pyLIMA.magnification import magnification_FSPL, magnification_PSPL, \
+    magnification_VBB
+
+from .synthetic_events import CANNED_PARAMETERS, source_trajectory
+
+NUMBER_OF_POINTS = [100, 1000, 10000]
+IMPACT_PARAMETERS = [0.001, 0.1, 1.0]
+
+
+class PointLensMagnification:
+    params = (NUMBER_OF_POINTS, IMPACT_PARAMETERS)
+    param_names = ['number_of_points', 'impact_parameter']
+
+    def setup(self, number_of_points, impact_parameter):
+        self.tau, self.beta, _, _ = source_trajectory(number_of_points,
+                                                      impact_parameter)
+        self.rho = CANNED_PARAMETERS['rho']
+        self.gamma = 0.5
+
+    def time_magnification_PSPL(self, number_of_points, impact_parameter):
+        magnification_PSPL.magnification_PSPL(self.tau, self.beta)
+
+    def time_magnification_FSPL_Yoo(self, number_of_points, impact_parameter):
+        magnification_FSPL.magnification_FSPL_Yoo(self.tau, self.beta, self.rho,
+                                                  self.gamma)
+
+    def time_magnification_FSPL_Yoo_Jacobian(self, number_of_points,
+                                             impact_parameter):
+        magnification_FSPL.magnification_FSPL_Yoo_Jacobian(self.tau, self.beta,
+                                                           self.rho, self.gamma)
+
+
+class BinaryLensMagnification:
+    params = (NUMBER_OF_POINTS, IMPACT_PARAMETERS)
+    param_names = ['number_of_points', 'impact_parameter']
+    timeout = 300
+
+    def setup(self, number_of_points, impact_parameter):
+        _, _, self.x_source, self.y_source = source_trajectory(
+            number_of_points, impact_parameter, CANNED_PARAMETERS['alpha'])
+        self.separation = np.ones(number_of_points) * CANNED_PARAMETERS[
+            'separation']
+        self.mass_ratio = CANNED_PARAMETERS['mass_ratio']
+        self.rho = CANNED_PARAMETERS['rho']
+        self.limb_darkening_coefficient = 0.5
+
+    def time_magnification_USBL(self, number_of_points, impact_parameter):
+        magnification_VBB.magnification_USBL(self.separation, self.mass_ratio,
+                                             self.x_source, self.y_source,
+                                             self.rho)
+
+    def time_magnification_FSBL(self, number_of_points, impact_parameter):
+        magnification_VBB.magnification_FSBL(self.separation, self.mass_ratio,
+                                             self.x_source, self.y_source,
+                                             self.rho,
+                                             self.limb_darkening_coefficient)
+
+    def time_magnification_PSBL(self, number_of_points, impact_parameter):
+        magnification_VBB.magnification_PSBL(self.separation, self.mass_ratio,
+                                             self.x_source, self.y_source)
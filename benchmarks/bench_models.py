@@ -0,0 +1,50 @@
+"""
+Full-model evaluation cost, i.e. compute_the_microlensing_model on every telescope,
+for each pyLIMA model with and without parallax, orbital motion and double source.
+"""
+from .synthetic_events import BINARY_MODELS, MODELS, simulate_model
+
+NUMBER_OF_POINTS = [1000]
+SECOND_ORDER = ['None', 'parallax', 'orbital_motion', 'double_source']
+
+
+class ModelEvaluation:
+    params = (list(MODELS.keys()), SECOND_ORDER, NUMBER_OF_POINTS)
+    param_names = ['model', 'second_order', 'number_of_points']
+    timeout = 300
+
+    def setup(self, model_type, second_order, number_of_points):
+
+        if (second_order == 'orbital_motion') & (model_type not in BINARY_MODELS):
+            # orbital motion is meaningless for a point lens
+            raise NotImplementedError
+
+        if (second_order == 'double_source') & (model_type == 'FSPLarge'):
+            # FSPLarge does not model a second source
+            raise NotImplementedError
+
+        self.model, self.pyLIMA_parameters = simulate_model(
+            model_type=model_type,
+            parallax=second_order == 'parallax',
+            orbital_motion=second_order == 'orbital_motion',
+            double_source=second_order == 'double_source',
+            number_of_points=number_of_points)
+
+        self.parameters = [self.pyLIMA_parameters[key] for key in
+                           self.model.model_dictionnary.keys()]
+
+    def time_compute_the_microlensing_model(self, model_type, second_order,
+                                            number_of_points):
+        for telescope in self.model.event.telescopes:
+            self.model.compute_the_microlensing_model(telescope,
+                                                      self.pyLIMA_parameters)
+
+    def time_compute_pyLIMA_parameters(self, model_type, second_order,
+                                       number_of_points):
+        self.model.compute_pyLIMA_parameters(self.parameters)
+
+    def time_full_evaluation(self, model_type, second_order, number_of_points):
+        pyLIMA_parameters = self.model.compute_pyLIMA_parameters(self.parameters)
+
+        for telescope in self.model.event.telescopes:
+            self.model.compute_the_microlensing_model(telescope, pyLIMA_parameters)
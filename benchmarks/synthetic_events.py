@@ -0,0 +1,187 @@
+"""
+Canned synthetic events for the pyLIMA benchmarks.
+
+Everything here is built with pyLIMA.simulations.simulator, with fixed parameters
+and fixed random seeds, so that benchmarks run offline and are comparable between
+runs and between pyLIMA versions.
+"""
+import numpy as np
+from astropy.utils import iers
+from pyLIMA.models import FSBLmodel, FSPLmodel, FSPLargemodel, PSBLmodel, \
+    PSPLmodel, USBLmodel
+from pyLIMA.simulations import simulator
+
+# No IERS downloads during benchmarks, the bundled tables are good enough
+iers.conf.auto_download = False
+
+TIME_START = 2460000.
+TIME_END = 2460500.
+T0_PAR = 2460250.
+
+MODELS = {'PSPL': PSPLmodel, 'FSPL': FSPLmodel, 'FSPLarge': FSPLargemodel,
+          'USBL': USBLmodel, 'FSBL': FSBLmodel, 'PSBL': PSBLmodel}
+
+BINARY_MODELS = ['USBL', 'FSBL', 'PSBL']
+
+CANNED_PARAMETERS = {'t0': T0_PAR, 'u0': 0.1, 'tE': 35.0, 'rho': 0.01,
+                     'separation': 1.1, 'mass_ratio': 0.02, 'alpha': 0.5,
+                     'piEN': 0.1, 'piEE': -0.2,
+                     'delta_t0': 5.0, 'delta_u0': 0.05, 'rho_2': 0.005,
+                     'v_para': 0.1, 'v_perp': 0.05, 'v_radial': 0.02,
+                     'r_s': 0.5, 'a_s': 1.5}
+
+SOURCE_FLUX = 1000.
+TOTAL_FLUX = 1200.
+FLUX_RATIO = 0.3
+FLUXES_PARAMETERS = ['fsource', 'fblend', 'gblend', 'ftotal']
+
+
+def simulate_event(number_of_points=1000, number_of_telescopes=1, seed=42):
+    """
+    Simulate an event observed by telescopes with uniform sampling, no
+    observational constraints and no astrometry.
+
+    Parameters
+    ----------
+    number_of_points : int, the number of photometric points per telescope
+    number_of_telescopes : int, the number of telescopes
+    seed : int, the random seed
+
+    Returns
+    -------
+    event : object, an event object
+    """
+    np.random.seed(seed)
+
+    event = simulator.simulate_a_microlensing_event(name='Benchmark', ra=270,
+                                                    dec=-30)
+
+    timestamps = np.linspace(TIME_START, TIME_END, number_of_points)
+
+    for index in range(number_of_telescopes):
+
+        telescope = simulator.simulate_a_telescope(name='Tel_' + str(index),
+                                                   timestamps=timestamps,
+                                                   uniform_sampling=True,
+                                                   astrometry=False)
+        event.telescopes.append(telescope)
+
+    return event
+
+
+def canned_model_parameters(model):
+    """
+    Return the canned parameters of a model, in the model_dictionnary order.
+
+    Parameters
+    ----------
+    model : object, a microlensing model object
+
+    Returns
+    -------
+    parameters : list, the model parameters
+    """
+    parameters = []
+
+    for key in model.model_dictionnary.keys():
+
+        if 'fsource' in key:
+
+            parameters.append(SOURCE_FLUX)
+
+        elif 'ftotal' in key:
+
+            parameters.append(TOTAL_FLUX)
+
+        elif 'fblend' in key:
+
+            parameters.append(TOTAL_FLUX - SOURCE_FLUX)
+
+        elif 'gblend' in key:
+
+            parameters.append(TOTAL_FLUX / SOURCE_FLUX - 1)
+
+        elif 'q_flux' in key:
+
+            parameters.append(FLUX_RATIO)
+
+        else:
+
+            parameters.append(CANNED_PARAMETERS[key])
+
+    return parameters
+
+
+def simulate_model(model_type='PSPL', parallax=False, orbital_motion=False,
+                   double_source=False, number_of_points=1000,
+                   number_of_telescopes=1, add_noise=True, seed=42):
+    """
+    Simulate a model with its synthetic light curves.
+
+    Parameters
+    ----------
+    model_type : str, one of MODELS
+    parallax : bool, add annual parallax
+    orbital_motion : bool, add 2D orbital motion (binary models only)
+    double_source : bool, add a static second source
+    number_of_points : int, the number of photometric points per telescope
+    number_of_telescopes : int, the number of telescopes
+    add_noise : bool, add Poisson noise to the light curves
+    seed : int, the random seed
+
+    Returns
+    -------
+    model : object, a microlensing model object
+    pyLIMA_parameters : dict, the pyLIMA_parameters used to simulate the light curves
+    """
+    event = simulate_event(number_of_points=number_of_points,
+                           number_of_telescopes=number_of_telescopes, seed=seed)
+
+    kwargs = {}
+
+    if parallax:
+        kwargs['parallax'] = ['Annual', T0_PAR]
+
+    if orbital_motion:
+        kwargs['orbital_motion'] = ['2D', T0_PAR]
+
+    if double_source:
+        kwargs['double_source'] = ['Static', 0]
+
+    model = MODELS[model_type](event, **kwargs)
+    model.define_model_parameters()
+
+    pyLIMA_parameters = model.compute_pyLIMA_parameters(
+        canned_model_parameters(model))
+
+    simulator.simulate_lightcurve_flux(model, pyLIMA_parameters,
+                                       add_noise=add_noise)
+
+    return model, pyLIMA_parameters
+
+
+def source_trajectory(number_of_points, impact_parameter, alpha=0.5):
+    """
+    A straight source trajectory in the lens plane, crossing the lens at a given
+    impact parameter.
+
+    Parameters
+    ----------
+    number_of_points : int, the number of points
+    impact_parameter : float, the minimum distance to the origin
+    alpha : float, the trajectory angle in radians
+
+    Returns
+    -------
+    tau : array, (t-t0)/tE
+    beta : array, [u0]*len(t)
+    x_source : array, the horizontal positions of the source
+    y_source : array, the vertical positions of the source
+    """
+    tau = np.linspace(-2, 2, number_of_points)
+    beta = np.ones(number_of_points) * impact_parameter
+
+    x_source = tau * np.cos(alpha) - beta * np.sin(alpha)
+    y_source = tau * np.sin(alpha) + beta * np.cos(alpha)
+
+    return tau, beta, x_source, y_source
@@ -1,112 +1,219 @@
-import copy
 import time as python_time
 
 import numpy as np
-from pyLIMA.fits.ML_fit import MLfit
-from pyLIMA.models import generate_model
+from pyLIMA.fits.LM_fit import LMfit
+from pyLIMA.fits.ML_fit import FitException, MLfit
+from pyLIMA.fits.TRF_fit import TRFfit
+from pyLIMA.fits.execution_backends import pool_method
 from tqdm import tqdm
 
-from pyLIMA import event
+BOOTSTRAP_METHODS = ['indexes', 'weights']
 
 
-class BOOTSTRAPfit(MLfit):
-    """Under Construction"""
+class WeightedLMfit(LMfit):
+    """
+    A LMfit of the weighted residuals, i.e. minimizing sum(weights*residuals**2),
+    see BOOTSTRAPfit
+
+    Attributes
+    -----------
+    residuals_weights : array, the weight of each residual, ordered as the
+    residuals of objective_function
+    """
+    def __init__(self, model, residuals_weights, telescopes_fluxes_method='fit',
+                 loss_function='chi2'):
+
+        super().__init__(model, telescopes_fluxes_method=telescopes_fluxes_method,
+                         loss_function=loss_function)
+
+        self.residuals_weights = np.asarray(residuals_weights, dtype=float)
+
+    def objective_function(self, fit_process_parameters):
+
+        residuals = super().objective_function(fit_process_parameters)
+
+        return residuals * self.residuals_weights ** 0.5
+
+    def residuals_Jacobian(self, fit_process_parameters):
+
+        jacobian = super().residuals_Jacobian(fit_process_parameters)
 
-    def __init__(self, model, bootstrap_fitter='TRF', telescopes_fluxes_method='fit'):
+        return jacobian * self.residuals_weights[:, None] ** 0.5
+
+
+class WeightedTRFfit(WeightedLMfit, TRFfit):
+    """
+    A TRFfit of the weighted residuals, see WeightedLMfit
+    """
+
+
+BOOTSTRAP_FITTERS = {'LM': WeightedLMfit, 'TRF': WeightedTRFfit}
+
+
+class BOOTSTRAPfit(MLfit):
+    """
+    Bootstrap of the data, i.e. the distribution of the best fit models of
+    resampled datasets.
+
+    A resample is not a copy of the event: it is a vector of weights over the
+    residuals of the event data, and each sample is a weighted least squares fit
+    of the original model. With the 'indexes' method (the classical bootstrap),
+    the weights are the number of times each data point is drawn with
+    replacement. With the 'weights' method (the Bayesian bootstrap), the weights
+    are drawn from a Dirichlet distribution (scaled to the number of points).
+    Astrometric points keep the same weight in ra and dec.
+
+    Each sample uses its own random generator, spawned from BOOTSTRAP_seed, so the
+    samples are identical whatever the execution backend. The telescopes fluxes
+    are fitted parameters (telescopes_fluxes_method='fit'), so that the weights
+    apply to them too.
+
+    Attributes
+    -----------
+    bootstrap_fitter : str, the fit of each sample, 'TRF' or 'LM'
+    BOOTSTRAP_method : str, 'indexes' or 'weights'
+    BOOTSTRAP_seed : int, the seed of the samples random generators, None draws one
+    (stored in fit_results['seed'])
+    """
+
+    def __init__(self, model, bootstrap_fitter='TRF', telescopes_fluxes_method='fit',
+                 BOOTSTRAP_method='indexes', BOOTSTRAP_seed=None):
         """The fit class has to be intialized with an event object."""
 
+        if telescopes_fluxes_method != 'fit':
+
+            raise FitException('The bootstrap needs telescopes_fluxes_method="fit"')
+
+        if bootstrap_fitter not in BOOTSTRAP_FITTERS:
+
+            raise FitException('Unknown bootstrap_fitter ' + str(bootstrap_fitter) +
+                               ', choose between ' + str(list(BOOTSTRAP_FITTERS)))
+
+        if BOOTSTRAP_method not in BOOTSTRAP_METHODS:
+
+            raise FitException('Unknown BOOTSTRAP_method ' + str(BOOTSTRAP_method) +
+                               ', choose between ' + str(BOOTSTRAP_METHODS))
+
         super().__init__(model, telescopes_fluxes_method=telescopes_fluxes_method)
 
-    def generate_new_model(self):
+        self.bootstrap_fitter = bootstrap_fitter
+        self.BOOTSTRAP_method = BOOTSTRAP_method
+        self.BOOTSTRAP_seed = BOOTSTRAP_seed
 
-        # create a new event
+    def fit_type(self):
+        return "Bootstrap"
 
-        new_event = event.Event(ra=self.model.event.ra, dec=self.model.event.dec)
+    def draw_weights(self, number_of_points, random_generator):
+        """
+        Draw the weights of the points of a dataset
 
-        for tel in self.model.event.telescopes:
+        Parameters
+        ----------
+        number_of_points : int, the number of points
+        random_generator : object, a numpy.random.Generator
 
-            if tel.lightcurve_flux is not None:
+        Returns
+        -------
+        weights : array, the weights, summing to number_of_points
+        """
+        if self.BOOTSTRAP_method == 'indexes':
 
-                bootstrap_indexes_photometry = np.random.randint(0,
-                                                                 len(tel.lightcurve_flux),
-                                                                 len(tel.lightcurve_flux))
+            indexes = random_generator.integers(0, number_of_points, number_of_points)
 
-            else:
+            return np.bincount(indexes, minlength=number_of_points).astype(float)
 
-                bootstrap_indexes_photometry = None
+        weights = random_generator.dirichlet(np.ones(number_of_points))
 
-            if tel.astrometry is not None:
+        return weights * number_of_points
 
-                bootstrap_indexes_astrometry = np.random.randint(0, len(tel.astrometry),
-                                                                 len(tel.astrometry))
+    def residuals_weights(self, random_generator):
+        """
+        Draw the weights of a resample, in the residuals order of
+        LMfit.objective_function, i.e. the photometry of each telescope then the
+        astrometry (ra and dec) of each telescope
 
-            else:
+        Parameters
+        ----------
+        random_generator : object, a numpy.random.Generator
 
-                bootstrap_indexes_astrometry = None
+        Returns
+        -------
+        weights : array, the residuals weights
+        """
+        weights = []
 
-            new_telescope = copy.deepcopy(tel)
-            new_telescope.trim_data(photometry_mask=bootstrap_indexes_photometry,
-                                    astrometry_mask=bootstrap_indexes_astrometry)
+        if self.model.photometry:
 
-            new_event.telescopes.append(new_telescope)
+            for telescope in self.model.event.telescopes:
 
-        new_model = generate_model.create_model(self.model.model_type(), new_event,
-                                                parallax=self.model.parallax_model,
-                                                xallarap=self.model.xallarap_model,
-                                                orbital_motion=self.model.orbital_motion_model,
-                                                origin=self.model.origin,
-                                                blend_flux_parameter=self.model.blend_flux_parameter,
-                                                fancy_parameters=self.model.fancy_to_pyLIMA_dictionnary)
+                if telescope.lightcurve_flux is not None:
 
-        return new_model
+                    weights.append(self.draw_weights(len(telescope.lightcurve_flux),
+                                                     random_generator))
 
-    def new_step(self, popi, popo):
+        if self.model.astrometry:
 
-        from pyLIMA.fits import TRF_fit
-        np.random.seed(popi)
-        updated_model = self.generate_new_model()
+            for telescope in self.model.event.telescopes:
 
-        trf = TRF_fit.TRFfit(updated_model)
-        trf.model_parameters_guess = self.model_parameters_guess
+                if telescope.astrometry is not None:
 
-        for key in self.fit_parameters.keys():
-            trf.fit_parameters[key][1] = self.fit_parameters[key][1]
+                    astrometry_weights = self.draw_weights(len(telescope.astrometry),
+                                                           random_generator)
 
-        trf.fit()
+                    weights.append(np.r_[astrometry_weights, astrometry_weights])
 
-        return trf.fit_results['best_model']
+        return np.concatenate(weights)
 
-    def fit(self, number_of_samples=100, computational_pool=None):
+    def new_step(self, sample_index, seed_sequence):
+        """
+        Fit a resample
 
-        start_time = python_time.time()
+        Parameters
+        ----------
+        sample_index : int, the sample index
+        seed_sequence : object, the numpy.random.SeedSequence of the sample
+
+        Returns
+        -------
+        best_model : list, the best fit parameters of the resample
+        """
+        random_generator = np.random.default_rng(seed_sequence)
+        weights = self.residuals_weights(random_generator)
+
+        fitter = BOOTSTRAP_FITTERS[self.bootstrap_fitter](
+            self.model, weights, telescopes_fluxes_method=self.telescopes_fluxes_method)
+        fitter.model_parameters_guess = self.model_parameters_guess
+        fitter.telescopes_fluxes_parameters_guess = \
+            self.telescopes_fluxes_parameters_guess
+
+        for key in self.fit_parameters.keys():
+            fitter.fit_parameters[key][1] = self.fit_parameters[key][1]
 
-        samples = []
+        fitter.fit()
 
-        if computational_pool is not None:
+        return fitter.fit_results['best_model']
 
-            number_of_loop = 1
+    def fit(self, number_of_samples=100, computational_pool=None):
 
-        else:
+        start_time = python_time.time()
+        self.clear_objective_cache()
 
-            number_of_loop = number_of_samples
+        root_sequence = np.random.SeedSequence(self.BOOTSTRAP_seed)
+        tasks = list(enumerate(root_sequence.spawn(number_of_samples)))
 
-        for step in tqdm(range(number_of_loop)):
+        with self.execution_pool(computational_pool) as pool:
 
-            if computational_pool is not None:
+            if pool is not None:
 
-                iterable = [(i, i) for i in range(number_of_samples)]
+                samples = pool.starmap(pool_method(pool, self, 'new_step'), tasks)
 
-                new_step = computational_pool.starmap(self.new_step, iterable)
-                for samp in new_step:
-                    samples.append(samp)
             else:
 
-                new_step = self.new_step(step, step)
-
-                samples.append(new_step)
+                samples = [self.new_step(*task) for task in tqdm(tasks)]
 
         computation_time = python_time.time() - start_time
 
         samples = np.array(samples)
 
-        self.fit_results = {'samples': samples, 'fit_time': computation_time}
+        self.fit_results = {'samples': samples, 'fit_time': computation_time,
+                            'seed': root_sequence.entropy}
@@ -3,6 +3,8 @@ import time as python_time
 
 import emcee
 import numpy as np
+from pyLIMA.fits.execution_backends import pool_method
+from pyLIMA.fits.MCMC_fit import sample_until_convergence
 from pyLIMA.fits.ML_fit import MLfit
 from pyLIMA.outputs import pyLIMA_plots
 from pyLIMA.priors import parameters_priors
@@ -11,10 +13,24 @@ from pyLIMA.priors import parameters_priors
 class DEMCfit(MLfit):
     """
     Under Construction
+
+    Attributes
+    -----------
+    DEMC_walkers : int, the number of walkers = number_of_walkers*len(fit_parameters)
+    DEMC_links : int, the total number of iteration
+    DEMC_check_every : int, if > 0, the convergence is checked every
+    DEMC_check_every links and the fit stops as soon as the targets are met,
+    DEMC_links being the maximum (see MCMC_fit.sample_until_convergence)
+    DEMC_target_R : float, the split R-hat target of the adaptive run
+    DEMC_target_ESS : float, the effective sample size target of the adaptive run
+    DEMC_initial_design : str, the design of the initial walkers, 'latinhypercube'
+    or 'sobol' (see MLfit.initial_population_design)
     """
     def __init__(self, model, rescale_photometry=False, rescale_astrometry=False,
                  telescopes_fluxes_method='polyfit', loss_function='likelihood',
-                 DEMC_walkers=2, DEMC_links=5000):
+                 DEMC_walkers=2, DEMC_links=5000, DEMC_check_every=0,
+                 DEMC_target_R=1.01, DEMC_target_ESS=1000,
+                 DEMC_initial_design='latinhypercube'):
         """The fit class has to be intialized with an event object."""
 
         super().__init__(model, rescale_photometry=rescale_photometry,
@@ -25,6 +41,10 @@ class DEMCfit(MLfit):
         self.DEMC_walkers = DEMC_walkers  # times number of dimension!
         self.DEMC_links = DEMC_links
         self.DEMC_chains = []
+        self.DEMC_check_every = DEMC_check_every
+        self.DEMC_target_R = DEMC_target_R
+        self.DEMC_target_ESS = DEMC_target_ESS
+        self.DEMC_initial_design = DEMC_initial_design
         self.priors = parameters_priors.default_parameters_priors(self.fit_parameters)
 
     def fit_type(self):
@@ -32,91 +52,69 @@ class DEMCfit(MLfit):
 
     def objective_function(self, fit_process_parameters):
 
-        likelihood = -self.model_likelihood(fit_process_parameters)
-
-        # Priors
-        priors = self.get_priors(fit_process_parameters)
-
-        likelihood += -priors
-
-        return likelihood
-
-    def fit(self, initial_population=[], computational_pool=False):
-
-        start_time = python_time.time()
-        # Safety, recompute in case user changes boundaries after init
-        self.priors = parameters_priors.default_parameters_priors(self.fit_parameters)
-
-        number_of_parameters = len(self.fit_parameters)
-        nwalkers = self.DEMC_walkers * number_of_parameters
-
-        if initial_population == []:
-
-            import scipy.stats as ss
-            sampler = ss.qmc.LatinHypercube(d=len(self.fit_parameters))
-            # self.betas = np.logspace(-3, 0, number_of_walkers)
-            # self.betas = np.linspace(0,1, number_of_walkers)
+        objective = self.standard_objective_function(fit_process_parameters)
 
-            for i in range(nwalkers):
+        return -objective
 
-                individual = sampler.random(n=1)[0]
+    def run_DEMC(self, sampler, population, number_of_links):
+        """
+        Run the sampler for number_of_links links, or until convergence if
+        DEMC_check_every > 0
 
-                for ind, j in enumerate(self.fit_parameters.keys()):
-                    individual[ind] = individual[ind] * (self.fit_parameters[j][1][1] -
-                                                         self.fit_parameters[j][1][
-                                                             0]) + \
-                                      self.fit_parameters[j][1][0]
+        Parameters
+        ----------
+        sampler : object, an emcee.EnsembleSampler
+        population : array, the initial walkers positions
+        number_of_links : int, the (maximum) number of links
 
-                individual = np.array(individual)
-                individual = np.r_[individual]
+        Returns
+        -------
+        convergence : dict, the convergence trace of an adaptive run (see
+        MCMC_fit.sample_until_convergence), None otherwise
+        """
+        if self.DEMC_check_every > 0:
 
-                objective = self.objective_function(individual)
-                individual = np.r_[individual, objective]
+            return sample_until_convergence(sampler, population, number_of_links,
+                                            check_every=self.DEMC_check_every,
+                                            target_R=self.DEMC_target_R,
+                                            target_ESS=self.DEMC_target_ESS)
 
-                initial_population.append(individual)
+        sampler.run_mcmc(population, number_of_links, progress=True)
 
-        population = np.array(initial_population)[:, :-1]
+        return None
 
-        nlinks = self.DEMC_links
+    def fit(self, initial_population=[], computational_pool=None):
 
-        if computational_pool:
-
-            pool = computational_pool
+        start_time = python_time.time()
+        self.clear_objective_cache()
+        # Safety, recompute in case user changes boundaries after init
+        self.priors = parameters_priors.default_parameters_priors(self.fit_parameters)
 
-        else:
-            pool = None
+        with self.execution_pool(computational_pool) as pool:
 
-        try:
-            # create a new MPI pool
-            from schwimmbad import MPIPool
-            pool = MPIPool()
-            if not pool.is_master():
-                pool.wait()
-                sys.exit(0)
+            number_of_parameters = len(self.fit_parameters)
+            nwalkers = self.DEMC_walkers * number_of_parameters
 
-        except ModuleNotFoundError:
+            if len(initial_population) == 0:
 
-            pass
+                # emcee evaluates the initial walkers itself
+                population = self.initial_population_design(
+                    nwalkers, design=self.DEMC_initial_design)
 
-        if pool:
+            else:
 
-            with pool:
+                population = np.array(initial_population)[:, :-1]
 
-                sampler = emcee.EnsembleSampler(nwalkers, number_of_parameters,
-                                                self.objective_function,
-                                                a=2.0,
-                                                moves=[(emcee.moves.DEMove(), 0.8), (
-                                                    emcee.moves.DESnookerMove(), 0.2)],
-                                                pool=pool)
+            nlinks = self.DEMC_links
 
-                sampler.run_mcmc(population, nlinks, progress=True)
-        else:
+            moves = [(emcee.moves.DEMove(), 0.8), (emcee.moves.DESnookerMove(), 0.2)]
 
             sampler = emcee.EnsembleSampler(nwalkers, number_of_parameters,
-                                            self.objective_function,
-                                            a=2.0, pool=pool)
+                                            pool_method(pool, self,
+                                                        'objective_function'),
+                                            moves=moves, pool=pool)
 
-            sampler.run_mcmc(population, nlinks, progress=True)
+            convergence = self.run_DEMC(sampler, population, nlinks)
 
         computation_time = python_time.time() - start_time
 
@@ -141,6 +139,10 @@ class DEMCfit(MLfit):
                             self.loss_function: fit_log_likelihood,
                             'DEMC_chains': DEMC_chains, 'fit_time': computation_time}
 
+        if convergence is not None:
+
+            self.fit_results['convergence'] = convergence
+
     def fit_outputs(self):
 
         pyLIMA_plots.plot_lightcurves(self.model, self.fit_results['best_model'])
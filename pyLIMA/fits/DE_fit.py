@@ -3,6 +3,7 @@ import time as python_time
 
 import numpy as np
 import scipy
+from pyLIMA.fits.execution_backends import pool_method
 from pyLIMA.fits.ML_fit import MLfit
 from tqdm import tqdm
 from pyLIMA.priors import parameters_priors
@@ -50,36 +51,39 @@ class DEfit(MLfit):
     def fit(self, initial_population=[], computational_pool=None):
 
         start_time = python_time.time()
+        self.clear_objective_cache()
         # Safety, recompute in case user changes boundaries after init
         self.priors = parameters_priors.default_parameters_priors(
             self.priors_parameters)
 
-        if computational_pool:
+        with self.execution_pool(computational_pool) as pool:
 
-            worker = computational_pool.map
+            if pool is not None:
 
-        else:
+                worker = pool.map
 
-            worker = 1
+            else:
 
-        if initial_population == []:
+                worker = 1
 
-            init = 'sobol'
+            if len(initial_population) == 0:
 
-        else:
+                init = 'sobol'
 
-            init = initial_population
+            else:
 
-        bounds = [self.fit_parameters[key][1] for key in self.fit_parameters.keys()]
+                init = initial_population
 
-        differential_evolution_estimation = scipy.optimize.differential_evolution(
-            self.objective_function,
-            bounds=bounds,
-            mutation=(0.5, 1.0), popsize=int(self.DE_population_size),
-            maxiter=self.max_iteration, tol=0.00,
-            atol=1, strategy=self.strategy,
-            recombination=0.7, polish=False, init=init,
-            disp=self.display_progress, workers=worker)
+            bounds = [self.fit_parameters[key][1] for key in self.fit_parameters.keys()]
+
+            differential_evolution_estimation = scipy.optimize.differential_evolution(
+                pool_method(pool, self, 'objective_function'),
+                bounds=bounds,
+                mutation=(0.5, 1.0), popsize=int(self.DE_population_size),
+                maxiter=self.max_iteration, tol=0.00,
+                atol=1, strategy=self.strategy,
+                recombination=0.7, polish=False, init=init,
+                disp=self.display_progress, workers=worker)
 
         self.trials = np.array(self.trials)
 
@@ -141,60 +145,63 @@ class DEfitnew(MLfit):
     def fit(self, initial_population=[], computational_pool=None):
 
         start_time = python_time.time()
+        self.clear_objective_cache()
         # Safety, recompute in case user changes boundaries after init
         self.priors = parameters_priors.default_parameters_priors(self.fit_parameters)
 
-        if computational_pool:
+        with self.execution_pool(computational_pool) as pool:
+
+            if pool is not None:
 
-            worker = computational_pool.map
+                worker = pool.map
 
-        else:
+            else:
 
-            worker = 1
+                worker = 1
 
-        if initial_population == []:
+            if len(initial_population) == 0:
 
-            init = 'latinhypercube'
+                init = 'latinhypercube'
 
-        else:
+            else:
 
-            init = initial_population
+                init = initial_population
 
-        bounds = [self.fit_parameters[key][1] for key in self.fit_parameters.keys()]
+            bounds = [self.fit_parameters[key][1] for key in self.fit_parameters.keys()]
 
-        solver = scipy.optimize._differentialevolution.DifferentialEvolutionSolver(
-            self.objective_function, bounds=bounds,
-            mutation=(0.5, 1.5),
-            popsize=int(self.DE_population_size),
-            maxiter=1, tol=0.00, atol=1.0,
-            strategy=self.strategy,
-            recombination=0.5, polish=False,
-            init=init, disp=self.display_progress,
-            workers=worker,updating='deferred')
+            solver = scipy.optimize._differentialevolution.DifferentialEvolutionSolver(
+                pool_method(pool, self, 'objective_function'), bounds=bounds,
+                mutation=(0.5, 1.5),
+                popsize=int(self.DE_population_size),
+                maxiter=1, tol=0.00, atol=1.0,
+                strategy=self.strategy,
+                recombination=0.5, polish=False,
+                init=init, disp=self.display_progress,
+                workers=worker,updating='deferred')
 
-        if initial_population == []:
+            if len(initial_population) == 0:
 
-            solver.init_population_lhs()
+                solver.init_population_lhs()
 
-        else:
+            else:
 
-            solver.init_population_array(init)
+                solver.init_population_array(init)
 
-        pop = []
-        pop_energies = []
+            pop = []
+            pop_energies = []
 
-        for loop in tqdm(range(self.max_iteration)):
-            solver.__next__()
+            for loop in tqdm(range(self.max_iteration)):
+                solver.__next__()
 
-            pop.append(np.copy(solver._scale_parameters(solver.population)))
-            pop_energies.append(np.copy(solver.population_energies))
+                pop.append(np.copy(solver._scale_parameters(solver.population)))
+                pop_energies.append(np.copy(solver.population_energies))
 
-            print('Best:', pop[-1][0], pop_energies[-1][0])
-            # converged = solver.converged()
+                print('Best:', pop[-1][0], pop_energies[-1][0])
+                # converged = solver.converged()
 
-            # if converged:
+                # if converged:
 
-            #    break
+                #    break
 
         pop = np.array(pop)
         pop_energies = np.array(pop_energies)
@@ -2,6 +2,7 @@ import sys
 import time as python_time
 
 import numpy as np
+from pyLIMA.fits.execution_backends import pool_method
 from pyLIMA.fits.ML_fit import MLfit
 from tqdm import tqdm
 from pyLIMA.priors import parameters_priors
@@ -10,10 +11,15 @@ from pyLIMA.priors import parameters_priors
 class DREAMfit(MLfit):
     """
     Under Construction
+
+    Attributes
+    -----------
+    initial_design : str, the design of the initial archive, 'latinhypercube' or
+    'sobol' (see MLfit.initial_population_design)
     """
     def __init__(self, model, rescale_photometry=False, rescale_astrometry=False,
                  telescopes_fluxes_method='polyfit', DEMC_population_size=10,
-                 max_iteration=10000):
+                 max_iteration=10000, initial_design='latinhypercube'):
         """The fit class has to be intialized with an event object."""
 
         super().__init__(model, rescale_photometry=rescale_photometry,
@@ -23,6 +29,7 @@ class DREAMfit(MLfit):
         self.population = []  # to be recognize by all process during parallelization
         self.DEMC_population_size = DEMC_population_size  # Times number of dimensions!
         self.max_iteration = max_iteration
+        self.initial_design = initial_design
         self.priors = parameters_priors.default_parameters_priors(self.fit_parameters)
 
     def fit_type(self):
@@ -51,127 +58,120 @@ class DREAMfit(MLfit):
 
         return scaled
 
-    def new_individual(self, parent0, parent1, parent2, parent3):
-
-        # np.random.seed(random.randint(0, 100000))
+    def population_objectives(self, population, pool=None):
+        """
+        Evaluate the objective function of a population, in one map of the pool if
+        any. The individuals outside the boundaries or the priors support are
+        rejected (np.inf) without evaluation.
 
-        # number_of_parents = np.random.randint(5, 10) * 2
+        Parameters
+        ----------
+        population : array, the individuals (unscaled parameters)
+        pool : object, the fit pool, or None
 
-        # indexes = np.random.choice(len(pop), number_of_parents, replace=False)
-        # print(parent1[-1],indexes)
-        # try:
+        Returns
+        -------
+        objectives : array, the objective of each individual
+        """
+        population = np.asarray(population, dtype=float)
 
-        #    index1 = np.random.choice(len(pop), number_of_parents, replace=False)
+        objectives = np.full(len(population), np.inf)
+        inside = ~self.parameters_outside_support(population)
 
-        # except:
+        if pool is not None:
 
-        #    index1 = np.random.choice(len(pop), number_of_parents)
+            objectives[inside] = pool.map(pool_method(pool, self, 'objective_function'),
+                                          list(population[inside]))
 
-        # index2 = np.random.choice(len(pop[0]), number_of_parents, replace=False)
-        # crossover_index = np.random.choice(len(self.crossover), 1,
-        # p=self.prob_crossover)
-        # crossover = self.crossover[crossover_index]
-        crossover = np.random.uniform(0.0, 1.0, len(parent0[:-1]))
-
-        mutate = np.random.uniform(0, 1, len(parent0[:-1])) < crossover
-        # breakpoint()
-        # mutate = np.random.uniform(0, 1, len(parent1[:-1])) < -1
-        if True not in mutate:
+        else:
 
-            rand = np.random.randint(0, len(mutate))
-            mutate[rand] = True
+            objectives[inside] = [self.objective_function(individual) for individual
+                                  in population[inside]]
+
+        return objectives
+
+    def new_generation(self, parents0, parents1, parents2, parents3, pool=None):
+        """
+        Propose a child for each individual of the population, with a differential
+        (or, one time in ten, a snooker) jump on a random subset of parameters,
+        and accept them with the Metropolis rule
+
+        Parameters
+        ----------
+        parents0 : array, the current population (scaled parameters and objective)
+        parents1 : array, the first parents of the jumps
+        parents2 : array, the second parents of the jumps
+        parents3 : array, the parents of the snooker jumps
+        pool : object, the fit pool, or None
+
+        Returns
+        -------
+        population : array, the new population
+        accepted : array, 1 for the mutated parameters of the accepted children
+        """
+        number_of_walkers, number_of_parameters = parents0[:, :-1].shape
+
+        crossover = np.random.uniform(0.0, 1.0,
+                                      (number_of_walkers, number_of_parameters))
+        mutate = np.random.uniform(0, 1, (number_of_walkers,
+                                          number_of_parameters)) < crossover
+
+        # mutate at least one parameter
+        no_mutation = np.where(~mutate.any(axis=1))[0]
+        mutate[no_mutation, np.random.randint(0, number_of_parameters,
+                                              len(no_mutation))] = True
 
-        # mutation = np.random.uniform(-2, 2, len(parent1[:-1]))
         eps1 = 10 ** -3
         eps2 = 10 ** -7
 
-        mutation = np.random.uniform(1 - eps1, 1 + eps1, len(parent0[:-1]))
-        shifts = np.random.normal(0, eps2, len(parent0[:-1]))  # *self.scale
+        mutation = np.random.uniform(1 - eps1, 1 + eps1,
+                                     (number_of_walkers, number_of_parameters))
+        shifts = np.random.normal(0, eps2, (number_of_walkers, number_of_parameters))
 
-        gamma = 2.38 / (2 * len(parent0[:-1][mutate])) ** 0.5  # *self.scale
+        gamma = 2.38 / (2 * mutate.sum(axis=1)) ** 0.5
 
-        # gamma = 2.38 / (2 * len(index1[::2]) * len(parent1[:-1][mutate])) ** 0.5
-        jumping_nodes = np.random.randint(0, 10)
+        progress = (parents1[:, :-1] - parents2[:, :-1]) * mutation * gamma[:, None]
 
-        # if jumping_nodes == 5:
+        snooker = np.random.randint(0, 10, number_of_walkers) == 9
 
-        # mutation = np.ones(len(parent1[:-1]))
-        #    gamma = 1
+        if snooker.any():
 
-        mutation *= gamma
+            dz = parents0[snooker] - parents3[snooker]
+            zp1 = np.sum(parents1[snooker] * dz, axis=1)
+            zp2 = np.sum(parents2[snooker] * dz, axis=1)
 
-        # progress1 = np.sum([pop[i] for i in indexes[::2]], axis=0)
-        # progress2 = np.sum([pop[i] for i in indexes[1::2]], axis=0)
-        # progress1 = np.sum([pop[i][j] for i in index1[::2] for j in index2[::2]],
-        # axis=0)
-        # progress2 = np.sum([pop[i][j] for i in index1[1::2] for j in index2[1::2]],
-        # axis=0)
+            with np.errstate(divide='ignore', invalid='ignore'):
 
-        progress1 = parent1
-        progress2 = parent2
+                snooker_progress = np.random.uniform(1.2, 2.2, len(dz))[:, None] * (
+                        zp1 - zp2)[:, None] * dz / np.sum(dz * dz, axis=1)[:, None]
 
-        progress = (progress1[:-1] - progress2[:-1]) * mutation
+            progress[snooker] = snooker_progress[:, :-1]
 
-        if jumping_nodes == 9:
-            #
-            # snooker
+        progress[~np.all(np.isfinite(progress), axis=1)] = 1
 
-            dz = parent0 - parent3
-            # progress = dz[:-1]
-            zp1 = np.dot(parent1, dz.T)
-            zp2 = np.dot(parent2, dz.T)
-            progress = np.random.uniform(1.2, 2.2) * (zp1 - zp2) * dz / np.dot(dz, dz.T)
-            progress = progress[:-1]
-        # breakpoint()
+        children = np.copy(parents0)
+        children[:, :-1] += np.where(mutate, progress, 0) + shifts
 
-        if np.all(np.isfinite(progress)):
-
-            pass
-
-        else:
+        # reflect the children outside the boundaries, between parents0 and parents1
+        outside = (children[:, :-1] < 0) | (children[:, :-1] > 1)
+        children[:, :-1][outside] = (parents0[:, :-1][outside] +
+                                     parents1[:, :-1][outside]) / 2
 
-            progress = np.ones(len(parent0[:-1]))
-        # print(gamma,progress)
+        children[:, -1] = self.population_objectives(
+            self.unscale_parameters(children[:, :-1]), pool)
 
-        child = np.copy(parent0)
+        casino = np.random.uniform(0, 1, number_of_walkers)
 
-        child[:-1][mutate] += progress[mutate]
-        child[:-1] += shifts
+        with np.errstate(over='ignore', invalid='ignore'):
 
-        # jump = np.zeros(len(self.crossover))
-        # nid = np.zeros(len(self.crossover))
-        # nid[crossover_index] += 1
-        accepted = np.zeros(len(parent0[:-1]))
+            probability = np.exp(-children[:, -1] + parents0[:, -1])
 
-        for ind, param in enumerate(self.fit_parameters.keys()):
+        accept = probability > casino
 
-            if (child[ind] < 0) | (child[ind] > 1):
-                progress[ind] = (parent1[ind] - parent0[ind]) / 2
-                child[ind] = parent0[ind] + progress[ind]
+        population = np.where(accept[:, None], children, parents0)
+        accepted = (mutate & accept[:, None]).astype(float)
 
-                # child[ind] = parent1[ind]
-                # progress[ind] = 0
-                # mutate[ind] = False
-
-                # return parent0, accepted#, jump, nid
-
-        objective = self.objective_function(self.unscale_parameters(child[:-1]))
-        # breakpoint()
-        casino = np.random.uniform(0, 1)
-        probability = np.exp((-objective + parent0[-1]))
-
-        if probability > casino:
-
-            child[-1] = objective
-            # jump[crossover_index] += np.sum(progress[mutate]**2/var_pop[:-1][mutate])
-            accepted[mutate] += 1
-            # self.all.append(child)
-            return child, accepted  # , jump, nid
-
-        else:
-            child[-1] = objective
-            # self.all.append(child)
-            return parent0, accepted  # , jump, nid
+        return population, accepted
 
     def swap_temperatures(self, population):
 
@@ -222,6 +222,7 @@ class DREAMfit(MLfit):
     def fit(self, initial_population=[], computational_pool=None):
 
         start_time = python_time.time()
+        self.clear_objective_cache()
         bounds_min = [self.fit_parameters[key][1][0] for key in
                       self.fit_parameters.keys()]
         bounds_max = [self.fit_parameters[key][1][1] for key in
@@ -239,138 +240,89 @@ class DREAMfit(MLfit):
             np.round(self.DEMC_population_size * len(self.fit_parameters)))
         self.number_of_walkers = number_of_walkers
         self.swap = np.zeros(number_of_walkers)
-        Z = []
-
-        if initial_population == []:
 
-            import scipy.stats as ss
-            sampler = ss.qmc.LatinHypercube(d=len(self.fit_parameters))
-            # self.betas = np.logspace(-3, 0, number_of_walkers)
-            # self.betas = np.linspace(0,1, number_of_walkers)
-            for j in range(len(self.fit_parameters) * 5):
-                for i in range(number_of_walkers):
+        with self.execution_pool(computational_pool) as pool:
 
-                    individual = sampler.random(n=1)[0]
+            if initial_population == []:
 
-                    for ind, j in enumerate(self.fit_parameters.keys()):
-                        individual[ind] = individual[ind] * (
-                                self.fit_parameters[j][1][1] -
-                                self.fit_parameters[j][1][0]) + \
-                                          self.fit_parameters[j][1][0]
+                # the whole archive in one design, evaluated in one map of the pool
+                archive = self.initial_population_design(
+                    len(self.fit_parameters) * 5 * number_of_walkers,
+                    design=self.initial_design)
+                objectives = self.population_objectives(archive, pool)
 
-                    individual = np.array(individual)
-                    individual = np.r_[individual]
+                Z = np.c_[self.scale_parameters(archive), objectives].tolist()
 
-                    objective = self.objective_function(individual)
-                    individual = np.r_[self.scale_parameters(individual), objective]
-                    Z.append(individual.tolist())
-
-
-        else:
-
-            Z = [self.scale_parameters(i[:-1]).tolist() + [i[-1]] for i in
-                 + initial_population]
-
-        initial_population = np.array(Z[-number_of_walkers:])
-
-        all_population = []
-        all_population.append(initial_population)
-        all_acceptance = []
-
-        loop_population = np.copy(initial_population)
-        self.all = Z.copy()
-        # Jumps = np.ones(len(self.crossover))
-        Z_prime = np.array(Z)
-        # N_id = np.ones(len(self.crossover))
-        for loop in tqdm(range(self.max_iteration)):
-
-            parent_indexes = np.random.choice(len(Z_prime), 3 * number_of_walkers,
-                                              replace=False)
-            parents1 = Z_prime[parent_indexes[::2]]
-            parents2 = Z_prime[parent_indexes[1::2]]
-            parents3 = Z_prime[parent_indexes[2::2]]
-
-            indexes = [(loop_population[i], parents1[i], parents2[i], parents3[i]) for i
-                       in range(len(loop_population))]
+            else:
 
-            if computational_pool is not None:
-                # breakpoint()
+                Z = [self.scale_parameters(i[:-1]).tolist() + [i[-1]] for i in
+                     + initial_population]
 
-                new_step = computational_pool.starmap(self.new_individual, indexes)
-                loop_population = np.array([i[0] for i in new_step])
-                acceptance = np.array([i[1] for i in new_step])
-                # jumps = new_step[:,2]
-            # n_id = new_step[:,3]
-            # loop_population = self.swap_temperatures(loop_population)
+            initial_population = np.array(Z[-number_of_walkers:])
 
-            else:
+            all_population = []
+            all_population.append(initial_population)
+            all_acceptance = []
 
-                # var_pop = np.var(loop_population, axis=0)
-                loop_population = []
-                acceptance = []
-                # jumps = []
-                # n_id = []
+            loop_population = np.copy(initial_population)
+            self.all = Z.copy()
+            # Jumps = np.ones(len(self.crossover))
+            Z_prime = np.array(Z)
+            # N_id = np.ones(len(self.crossover))
 
-                for j, ind in enumerate(indexes):
-                    new_step = self.new_individual(ind[0], ind[1], ind[2], ind[3])
-                    loop_population.append(new_step[0])
-                    acceptance.append(new_step[1])
-                    # jumps.append(new_step[2])
-                    # n_id.append(new_step[3])
+            for loop in tqdm(range(self.max_iteration)):
 
-                loop_population = np.array(loop_population)
-                acceptance = np.array(acceptance)
-                # loop_population = self.swap_temperatures(loop_population)
+                parent_indexes = np.random.choice(len(Z_prime), 3 * number_of_walkers,
+                                                  replace=False)
+                parents1 = Z_prime[parent_indexes[::3]]
+                parents2 = Z_prime[parent_indexes[1::3]]
+                parents3 = Z_prime[parent_indexes[2::3]]
 
-                # jumps = np.array(jumps)
-                # n_id = np.array(n_id)
+                loop_population, acceptance = self.new_generation(
+                    loop_population, parents1, parents2, parents3, pool)
 
-            # if loop<0.1*self.max_iteration:
+                # if loop<0.1*self.max_iteration:
 
-            #    jumps = np.sum(jumps,axis=0)
-            #    mask = jumps == 0
-            #    jumps[mask] = np.max(jumps)
-            #    Jumps += jumps
+                #    jumps = np.sum(jumps,axis=0)
+                #    mask = jumps == 0
+                #    jumps[mask] = np.max(jumps)
+                #    Jumps += jumps
 
-            #    n_id = np.sum(n_id, axis=0)
-            #    mask = n_id == 0
-            #    n_id[mask] = 1
-            #    N_id += n_id
+                #    n_id = np.sum(n_id, axis=0)
+                #    mask = n_id == 0
+                #    n_id[mask] = 1
+                #    N_id += n_id
 
-            #    pCR = Jumps/N_id
-            #    self.prob_crossover = pCR/np.sum(pCR)
-            # breakpoint()
-
-            all_population.append(loop_population)
-            all_acceptance.append(acceptance)
-            #breakpoint()
+                #    pCR = Jumps/N_id
+                #    self.prob_crossover = pCR/np.sum(pCR)
+                # breakpoint()
 
-            if loop % 10 == 0:
-                Z += loop_population.tolist()
-                Z_prime = np.array(Z)
+                all_population.append(loop_population)
+                all_acceptance.append(acceptance)
+                #breakpoint()
 
-            # if loop%1000==0:
-            #    accepted = np.mean([np.any(i==1,axis=1).sum() for i in
-            #    all_acceptance[-1000:]])/len(loop_population)
+                if loop % 10 == 0:
+                    Z += loop_population.tolist()
+                    Z_prime = np.array(Z)
 
-            #    if (accepted>0.9):# and (self.scale<100):
+                # if loop%1000==0:
+                #    accepted = np.mean([np.any(i==1,axis=1).sum() for i in
+                #    all_acceptance[-1000:]])/len(loop_population)
 
-            #        self.scale *= 2
+                #    if (accepted>0.9):# and (self.scale<100):
 
-            #    if (accepted<0.1):# and (self.scale>0.01):
+                #        self.scale *= 2
 
-            #        self.scale /= 2
-            # breakpoint()
+                #    if (accepted<0.1):# and (self.scale>0.01):
 
-            print(loop, self.scale, np.array(all_population)[:, :, -1].min())
+                #        self.scale /= 2
+                # breakpoint()
 
         self.population = np.array(all_population)
         self.population[:, :, :-1] = self.unscale_parameters(self.population[:, :, :-1])
         self.acceptance = np.array(all_acceptance)
         DEMC_population = np.copy(self.population)
         self.Z = Z_prime
-        breakpoint()
-        print(self.swap / self.max_iteration)
         computation_time = python_time.time() - start_time
         print(sys._getframe().f_code.co_name, ' : ' + self.fit_type() + ' fit SUCCESS')
 
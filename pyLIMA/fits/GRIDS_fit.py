@@ -1,9 +1,13 @@
+import itertools
+import os
 import sys
 import time as python_time
 
 import numpy as np
-from pyLIMA.fits.ML_fit import MLfit
+import scipy.stats as ss
+from pyLIMA.fits.ML_fit import FitException, MLfit
 from pyLIMA.fits import DE_fit
+from pyLIMA.fits.execution_backends import StarCall, pool_method
 from tqdm import tqdm
 
 
@@ -12,6 +16,16 @@ class GRIDfit(MLfit):
     Performs fits on fix grids of parameters, fitting left parameters with DE.
     Standard way to find preliminary binary models. Efficient but slow...
 
+    The grid cells are independent DE fits: they are dispatched to the fit pool
+    (see MLfit.define_execution_backend), each DE fit running serially in its
+    worker with its own trials.
+
+    With GRID_refinement_levels > 0, the grid is hierarchical: after the coarse
+    grid, only the cells with an objective within GRID_delta_chi2 of the best are
+    split into GRID_refinement_factor**len(fix_parameters) sub-cells, and so on for
+    each level. The DE of a sub-cell is warm-started with the best models of its
+    parent cell and of the parent neighbours.
+
     Attributes
     ----------
     DE_population_size : int, the scale of the population, i.e. the number
@@ -19,11 +33,28 @@ class GRIDfit(MLfit):
     max_iteration : int, the total number of iteration
     fix_parameters : dict, the parameters that are set on the grid
     grid_resolution : int, the resolution of the grid for each grid parameters
+    GRID_checkpoint : str, a .npz file where the finished cells are saved. If it
+    already contains cells of the same grid, the fit resumes from them. None
+    (default) does not save the cells. The cells of the refinement level i are
+    saved in a separate file, suffixed by _level_i
+    GRID_checkpoint_every : int, the checkpoint is saved every GRID_checkpoint_every
+    finished cells (or every GRID_checkpoint_interval seconds if sooner) and at
+    the end of each level
+    GRID_checkpoint_interval : float, see GRID_checkpoint_every
+    GRID_refinement_levels : int, the number of refinement levels (0 is a uniform
+    grid)
+    GRID_delta_chi2 : float, the cells within GRID_delta_chi2 of the best objective
+    are refined
+    GRID_refinement_factor : int, each refined cell is split in
+    GRID_refinement_factor sub-cells along each grid parameter
     """
     def __init__(self, model, rescale_photometry=False, rescale_astrometry=False,
                  telescopes_fluxes_method='polyfit', DE_population_size=5,
                  max_iteration=2000,
-                 fix_parameters=[], grid_resolution=10):
+                 fix_parameters=[], grid_resolution=10, GRID_checkpoint=None,
+                 GRID_refinement_levels=0, GRID_delta_chi2=25,
+                 GRID_refinement_factor=2, GRID_checkpoint_every=100,
+                 GRID_checkpoint_interval=600):
         """The fit class has to be intialized with an event object."""
 
         super().__init__(model, rescale_photometry=rescale_photometry,
@@ -34,6 +65,12 @@ class GRIDfit(MLfit):
         self.max_iteration = max_iteration
         self.fix_parameters = fix_parameters
         self.grid_resolution = grid_resolution
+        self.GRID_checkpoint = GRID_checkpoint
+        self.GRID_refinement_levels = GRID_refinement_levels
+        self.GRID_delta_chi2 = GRID_delta_chi2
+        self.GRID_refinement_factor = GRID_refinement_factor
+        self.GRID_checkpoint_every = GRID_checkpoint_every
+        self.GRID_checkpoint_interval = GRID_checkpoint_interval
         self.intervals = []
 
     def fit_type(self):
@@ -44,6 +81,7 @@ class GRIDfit(MLfit):
         """
 
         parameters_on_the_grid = []
+        self.intervals = []
 
         for parameter_name in self.fix_parameters:
             parameter_range = self.fit_parameters[parameter_name][1]
@@ -60,67 +98,326 @@ class GRIDfit(MLfit):
 
         return reformate_grid
 
+    def refine_the_hyper_grid(self, hyper_grid, intervals, population):
+        """
+        Split the cells within GRID_delta_chi2 of the best objective into
+        GRID_refinement_factor**len(fix_parameters) sub-cells
+
+        Parameters
+        ----------
+        hyper_grid : array, the cells lower corners
+        intervals : array, the cells sizes
+        population : array, the cells best models, objective being last
+
+        Returns
+        -------
+        refined_grid : array, the sub-cells lower corners
+        refined_intervals : array, the sub-cells sizes
+        seeds : list, for each sub-cell, the best models of the parent cell and its
+        neighbours, sorted by objective
+        """
+        objectives = population[:, -1]
+        selected_cells = np.where(objectives <= objectives.min() +
+                                  self.GRID_delta_chi2)[0]
+
+        refined_intervals = intervals / self.GRID_refinement_factor
+        offsets = np.array(list(itertools.product(range(self.GRID_refinement_factor),
+                                                  repeat=len(intervals))))
+        offsets = offsets * refined_intervals
+
+        refined_grid = []
+        seeds = []
+
+        for index in selected_cells:
+
+            neighbours = np.all(np.abs(hyper_grid - hyper_grid[index]) <=
+                                intervals * 1.001, axis=1)
+            cell_seeds = population[neighbours]
+            cell_seeds = cell_seeds[cell_seeds[:, -1].argsort(), :-1]
+
+            for offset in offsets:
+
+                refined_grid.append(hyper_grid[index] + offset)
+                seeds.append(cell_seeds)
+
+        return np.array(refined_grid), refined_intervals, seeds
+
     def objective_function(self, fit_process_parameters):
 
         objective = self.standard_objective_function(fit_process_parameters)
 
         return objective
 
-    def fit_on_grid_pixel(self, *fixed_parameters):
+    def fit_on_grid_pixel(self, fixed_parameters, intervals=None, seeds=None):
+        """
+        Fit a grid cell with DE, the grid parameters being fixed at the cell center
 
-        fixed_parameters, computational_pool = fixed_parameters[0]
+        Parameters
+        ----------
+        fixed_parameters : array, the grid parameters values of the cell lower corner
+        intervals : array, the cell sizes, default is self.intervals
+        seeds : array, models to include in the DE initial population
 
+        Returns
+        -------
+        best_model : array, the best fit parameters followed by the objective
+        """
         fixed_parameters = np.ravel(fixed_parameters)
+
+        if intervals is None:
+
+            intervals = self.intervals
+
         defit = DE_fit.DEfit(self.model,DE_population_size= self.DE_population_size,display_progress=False,
                              strategy='best1bin', loss_function='chi2',max_iteration=self.max_iteration)
 
+        # the objective of the best model is then memoized
+        defit.objective_cache = self.objective_cache
+
         for key in self.fit_parameters:
 
             defit.fit_parameters[key][1] = self.fit_parameters[key][1]
 
         for ind, key in enumerate(self.fix_parameters):
 
-            defit.fit_parameters[key][1] = [fixed_parameters[ind]+self.intervals[ind]/2, fixed_parameters[ind]+self.intervals[ind]/2]
+            defit.fit_parameters[key][1] = [fixed_parameters[ind]+intervals[ind]/2, fixed_parameters[ind]+intervals[ind]/2]
+
+        initial_population = []
+
+        if seeds is not None:
 
-        defit.fit(computational_pool=computational_pool)
+            initial_population = self.seeded_population(defit, seeds)
+
+        defit.fit(initial_population=initial_population)
         fitted_parameters = defit.fit_results['best_model']
         best_model = np.append( fitted_parameters,self.objective_function(fitted_parameters))
         return best_model
 
+    def seeded_population(self, defit, seeds):
+        """
+        A DE initial population within the cell bounds (latin hypercube), where up
+        to half of the individuals are replaced by the seeds
+
+        Parameters
+        ----------
+        defit : object, the DEfit of the cell
+        seeds : array, the seeds, best first
+
+        Returns
+        -------
+        population : array, the DE initial population
+        """
+        bounds = defit.fit_parameters_bounds().T
+
+        # scipy requires at least 5 individuals
+        population_size = max(5, int(self.DE_population_size * len(bounds)))
+
+        sampler = ss.qmc.LatinHypercube(d=len(bounds))
+        population = bounds[:, 0] + sampler.random(n=population_size) * (
+                bounds[:, 1] - bounds[:, 0])
+
+        number_of_seeds = min(len(seeds), population_size // 2)
+        population[:number_of_seeds] = np.clip(seeds[:number_of_seeds],
+                                               bounds[:, 0], bounds[:, 1])
+
+        return population
+
+    def fit_grid_cell(self, cell_index, fixed_parameters, intervals=None,
+                      seeds=None):
+        """
+        Fit a grid cell, see fit_on_grid_pixel
+
+        Parameters
+        ----------
+        cell_index : int, the cell index in the hyper grid
+        fixed_parameters : array, the grid parameters values of the cell
+        intervals : array, the cell sizes, default is self.intervals
+        seeds : array, models to include in the DE initial population
+
+        Returns
+        -------
+        cell_index : int, the cell index in the hyper grid
+        best_model : array, the best fit parameters followed by the objective
+        """
+        return cell_index, self.fit_on_grid_pixel(fixed_parameters, intervals,
+                                                  seeds)
+
+    def checkpoint_file(self, level):
+        """
+        The checkpoint file of a refinement level
+
+        Parameters
+        ----------
+        level : int, the refinement level, 0 is the coarse grid
+
+        Returns
+        -------
+        checkpoint : str, the checkpoint file, None if GRID_checkpoint is None
+        """
+        if (self.GRID_checkpoint is None) or (level == 0):
+
+            return self.GRID_checkpoint
+
+        root, extension = os.path.splitext(self.GRID_checkpoint)
+
+        return root + '_level_' + str(level) + extension
+
+    def load_checkpoint(self, hyper_grid, checkpoint_file):
+        """
+        Load the finished cells from a checkpoint
+
+        Parameters
+        ----------
+        hyper_grid : array, the hyper grid
+        checkpoint_file : str, the checkpoint file, or None
+
+        Returns
+        -------
+        cells : dict, {cell_index : best_model} of the finished cells
+        """
+        if (checkpoint_file is None) or (not os.path.exists(checkpoint_file)):
+
+            return {}
+
+        checkpoint = np.load(checkpoint_file)
+
+        if (checkpoint['hyper_grid'].shape != hyper_grid.shape) or (
+                not np.allclose(checkpoint['hyper_grid'], hyper_grid)):
+
+            raise FitException('The grid of ' + checkpoint_file + ' differs '
+                               'from this fit grid, please use another '
+                               'GRID_checkpoint')
+
+        cells = dict(zip(checkpoint['cells_indexes'].tolist(),
+                         checkpoint['cells_population']))
+
+        print('Resuming the grid from ' + checkpoint_file + ' with ' +
+              str(len(cells)) + ' finished cells')
+
+        return cells
+
+    def save_checkpoint(self, hyper_grid, cells, checkpoint_file):
+        """
+        Save the finished cells in a checkpoint (atomically, so an interruption
+        keeps the previous checkpoint)
+
+        Parameters
+        ----------
+        hyper_grid : array, the hyper grid
+        cells : dict, {cell_index : best_model} of the finished cells
+        checkpoint_file : str, the checkpoint file, or None
+        """
+        if checkpoint_file is None:
+
+            return
+
+        cells_indexes = sorted(cells.keys())
+
+        temporary_file = checkpoint_file + '.tmp'
+
+        with open(temporary_file, 'wb') as checkpoint:
+
+            np.savez(checkpoint, hyper_grid=hyper_grid,
+                     cells_indexes=np.array(cells_indexes, dtype=int),
+                     cells_population=np.array([cells[i] for i in cells_indexes]))
+
+        os.replace(temporary_file, checkpoint_file)
+
+    def fit_grid_cells(self, hyper_grid, intervals, seeds, pool, level=0):
+        """
+        Fit the cells of a grid, on the pool if any, saving the finished cells in
+        the level checkpoint (every GRID_checkpoint_every cells or
+        GRID_checkpoint_interval seconds, and at the end)
+
+        Parameters
+        ----------
+        hyper_grid : array, the cells lower corners
+        intervals : array, the cells sizes
+        seeds : list, the seeds of each cell, or None
+        pool : object, the fit pool, or None
+        level : int, the refinement level
+
+        Returns
+        -------
+        population : array, the cells best models, objective being last
+        """
+        checkpoint_file = self.checkpoint_file(level)
+        cells = self.load_checkpoint(hyper_grid, checkpoint_file)
+
+        if seeds is None:
+
+            seeds = [None] * len(hyper_grid)
+
+        remaining_cells = [(index, hyper_grid[index], intervals, seeds[index]) for
+                           index in range(len(hyper_grid)) if index not in cells]
+
+        unsaved_cells = 0
+        last_save = python_time.time()
+
+        with tqdm(total=len(hyper_grid), initial=len(cells)) as progress:
+
+            if pool is not None:
+
+                fit_grid_cell = StarCall(pool_method(pool, self, 'fit_grid_cell'))
+                new_cells = pool.imap_unordered(fit_grid_cell, remaining_cells)
+
+            else:
+
+                new_cells = (self.fit_grid_cell(*cell) for cell in remaining_cells)
+
+            for index, best_model in new_cells:
+
+                cells[index] = best_model
+                unsaved_cells += 1
+                progress.update(1)
+
+                if (unsaved_cells >= self.GRID_checkpoint_every) or (
+                        python_time.time() - last_save >=
+                        self.GRID_checkpoint_interval):
+
+                    self.save_checkpoint(hyper_grid, cells, checkpoint_file)
+                    unsaved_cells = 0
+                    last_save = python_time.time()
+
+        if unsaved_cells != 0:
+
+            self.save_checkpoint(hyper_grid, cells, checkpoint_file)
+
+        population = np.array([cells[index] for index in range(len(hyper_grid))])
+
+        return population
+
     def fit(self, computational_pool=None):
 
 
         hyper_grid = self.construct_the_hyper_grid()
         start_time = python_time.time()
+        self.clear_objective_cache()
 
         self.bounds = [self.fit_parameters[key][1] for key in self.fit_parameters.keys()]
 
-        #if computational_pool is not None:
-
-            #with computational_pool as pool, tqdm(total=len(hyper_grid)) as pbar:
+        intervals = np.array(self.intervals)
 
-            #    res = [pool.apply_async(self.fit_on_grid_pixel, args=(hyper_grid[i],),
-            #                            callback=lambda _: pbar.update(1)) for i in
-            #           range(len(hyper_grid))]
+        with self.execution_pool(computational_pool) as pool:
 
-            #    population = np.array([r.get() for r in res])
+            population = self.fit_grid_cells(hyper_grid, intervals, None, pool)
 
-        #else:
-        #    population = []
+            populations = [population]
+            levels = [np.zeros(len(population), dtype=int)]
 
-        #    for j in tqdm(range(len(hyper_grid))):
-        #        new_step = self.fit_on_grid_pixel([hyper_grid[j]])
-        #        population.append(new_step)
+            for level in range(1, self.GRID_refinement_levels + 1):
 
-        ###This is not clean, can not have a parallelization of the grid because of the Manage List of the DE fit
+                hyper_grid, intervals, seeds = self.refine_the_hyper_grid(
+                    hyper_grid, intervals, population)
 
-        population = []
+                population = self.fit_grid_cells(hyper_grid, intervals, seeds, pool,
+                                                 level=level)
 
-        for j in tqdm(range(len(hyper_grid))):
-            new_step = self.fit_on_grid_pixel([hyper_grid[j], computational_pool])
-            population.append(new_step)
+                populations.append(population)
+                levels.append(np.ones(len(population), dtype=int) * level)
 
-        GRIDS_population = np.array(population)
+        GRIDS_population = np.concatenate(populations)
+        GRIDS_levels = np.concatenate(levels)
 
         computation_time = python_time.time() - start_time
         print(sys._getframe().f_code.co_name,
@@ -135,5 +432,6 @@ class GRIDfit(MLfit):
                             self.loss_function: GRIDS_population[
                                 best_model_index, -1],
                             'fit_time': computation_time,
-                            'GRIDS_population': GRIDS_population}
+                            'GRIDS_population': GRIDS_population,
+                            'GRIDS_levels': GRIDS_levels}
 
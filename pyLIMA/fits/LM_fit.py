@@ -4,17 +4,39 @@ import time as python_time
 import numpy as np
 import scipy
 from pyLIMA.fits.ML_fit import MLfit
+from pyLIMA.fits.execution_backends import pool_method
 
 
 class LMfit(MLfit):
     """
     Standard Levenberg-Marquardt fit
 
+    With telescopes_fluxes_method='fit' (default), the telescopes fluxes are fitted
+    parameters. Otherwise (e.g. 'polyfit'), the fit runs a variable projection: the
+    fluxes are solved by weighted linear least squares at each residuals evaluation,
+    and the optimizer only sees the microlensing parameters (see
+    projected_residuals_Jacobian). The best model and the covariance matrix in
+    fit_results still contain the fluxes.
+
     Attributes
     -----------
     guess : list, the starting point of the fit
+    numerical_Jacobian : str, the Jacobian of the models without analytical
+    Jacobian. '2-point' (default) lets scipy compute it serially, 'pool' evaluates
+    the perturbed residuals on the fit pool (see residuals_finite_differences and
+    MLfit.define_execution_backend)
+    finite_differences_steps : dict, {parameter : absolute step} of the 'pool'
+    finite differences. The other parameters use a step relative to their value,
+    i.e. relative_step*max(|x|,1)
+    relative_step : float, the relative step of the 'pool' finite differences
+
+    The 'pool' steps are not adapted during the fit: a parameter either has the
+    fixed step given in finite_differences_steps, or the relative step of scipy
+    '2-point' finite differences.
     """
-    def __init__(self, model, telescopes_fluxes_method='fit', loss_function='chi2'):
+    def __init__(self, model, telescopes_fluxes_method='fit', loss_function='chi2',
+                 numerical_Jacobian='2-point', finite_differences_steps=None,
+                 relative_step=np.finfo(float).eps ** 0.5):
         """The fit class has to be intialized with an event object."""
 
         if loss_function == 'likelihood':
@@ -27,6 +49,14 @@ class LMfit(MLfit):
                          loss_function=loss_function)
 
         self.guess = []
+        self.numerical_Jacobian = numerical_Jacobian
+        self.finite_differences_steps = {}
+
+        if finite_differences_steps is not None:
+
+            self.finite_differences_steps.update(finite_differences_steps)
+        self.relative_step = relative_step
+        self.last_residuals = None
         #self.priors = None
 
     def fit_type(self):
@@ -36,6 +66,12 @@ class LMfit(MLfit):
 
         parameters = np.array(fit_process_parameters)
 
+        cached = self.cached_value(('residuals',), parameters)
+
+        if cached is not None:
+
+            return cached
+
         model_parameters = parameters[self.model_parameters_index]
 
         pyLIMA_parameters = self.model.compute_pyLIMA_parameters(model_parameters)
@@ -61,11 +97,251 @@ class LMfit(MLfit):
         residuals = np.concatenate(residuals)
         errors = np.concatenate(errors)
 
-        return residuals / errors
+        normalised_residuals = residuals / errors
+        normalised_residuals.flags.writeable = False
+
+        self.cache_value(('residuals',), parameters, normalised_residuals)
+
+        return normalised_residuals
+
+    def cached_objective_function(self, fit_process_parameters):
+        """
+        The objective function, keeping the last residuals so the finite
+        differences Jacobian at the same parameters does not recompute them
+
+        Parameters
+        ----------
+        fit_process_parameters : list, list containing the fit parameters
+
+        Returns
+        -------
+        residuals : array, the normalised residuals
+        """
+        parameters = np.array(fit_process_parameters, dtype=float)
+        residuals = self.objective_function(parameters)
+
+        self.last_residuals = (parameters, residuals)
+
+        return residuals
+
+    def finite_differences_step(self, fit_process_parameters):
+        """
+        The finite differences steps of each parameter, i.e. the
+        finite_differences_steps if given, relative_step*max(|x|,1) otherwise. The
+        steps are reversed if they go beyond the upper boundaries
+
+        Parameters
+        ----------
+        fit_process_parameters : array, the fit parameters
+
+        Returns
+        -------
+        steps : array, the steps
+        """
+        steps = []
+
+        for ind, key in enumerate(self.fit_parameters.keys()):
+
+            value = fit_process_parameters[ind]
+            step = self.finite_differences_steps.get(
+                key, self.relative_step * max(np.abs(value), 1))
+
+            if value + step > self.fit_parameters[key][1][1]:
+
+                step = -step
+
+            steps.append(step)
+
+        return np.array(steps)
+
+    def residuals_finite_differences(self, fit_process_parameters, pool=None):
+        """
+        The forward finite differences Jacobian of the residuals, with the
+        perturbed residuals evaluated in a single map of the pool. The residuals at
+        fit_process_parameters are reused from the last objective function call.
+
+        Parameters
+        ----------
+        fit_process_parameters : array, the fit parameters
+        pool : object, the fit pool, or None
+
+        Returns
+        -------
+        jacobian : array, (residuals,parameters) the Jacobian
+        """
+        parameters = np.array(fit_process_parameters, dtype=float)
+
+        if (self.last_residuals is not None) and np.array_equal(
+                self.last_residuals[0], parameters):
+
+            residuals = self.last_residuals[1]
+
+        else:
+
+            residuals = self.cached_objective_function(parameters)
+
+        steps = self.finite_differences_step(parameters)
+        perturbed_parameters = list(parameters + np.diag(steps))
+
+        if pool is not None:
+
+            objective_function = pool_method(pool, self, 'objective_function')
+            perturbed_residuals = pool.map(objective_function, perturbed_parameters)
+
+        else:
+
+            perturbed_residuals = [self.objective_function(perturbed) for perturbed in
+                                   perturbed_parameters]
+
+        jacobian = (np.array(perturbed_residuals) - residuals) / steps[:, None]
+
+        return jacobian.T
+
+    def variable_projection_Jacobians(self, model_parameters):
+        """
+        The residuals Jacobians of each telescope, for the model parameters and for
+        the telescope fluxes, at the linear least squares fluxes
+
+        Parameters
+        ----------
+        model_parameters : array, the model parameters
+
+        Returns
+        -------
+        model_jacobians : list, the (points,model parameters) Jacobian of each
+        telescope
+        fluxes_jacobians : list, the (points,fluxes) Jacobian of each telescope
+        """
+        pyLIMA_parameters = self.model.compute_pyLIMA_parameters(model_parameters)
+
+        number_of_model_parameters = len(self.model_parameters_index)
+
+        model_jacobians = []
+        fluxes_jacobians = []
+
+        for telescope in self.model.event.telescopes:
+
+            if telescope.lightcurve_flux is not None:
+
+                # The objective function is : (data-model)/errors
+                jacobi = -self.model.photometric_model_Jacobian(
+                    telescope, pyLIMA_parameters) / telescope.lightcurve_flux[
+                    'err_flux'].value
+
+                model_jacobians.append(jacobi[:number_of_model_parameters].T)
+                fluxes_jacobians.append(jacobi[number_of_model_parameters:].T)
 
-    def fit(self):
+        return model_jacobians, fluxes_jacobians
+
+    def projected_residuals_Jacobian(self, fit_process_parameters):
+        """
+        The Jacobian of the variable projection residuals, i.e. with the telescopes
+        fluxes solved by linear least squares. The Jacobian of each telescope is
+        projected on the orthogonal complement of its fluxes Jacobian (Kaufman 1975,
+        BIT 15, 49)
+
+        Parameters
+        ----------
+        fit_process_parameters : array, the model parameters
+
+        Returns
+        -------
+        jacobian : array, (residuals,model parameters) the Jacobian
+        """
+        model_jacobians, fluxes_jacobians = self.variable_projection_Jacobians(
+            np.array(fit_process_parameters, dtype=float))
+
+        jacobian = []
+
+        for model_jacobian, fluxes_jacobian in zip(model_jacobians, fluxes_jacobians):
+
+            basis = np.linalg.qr(fluxes_jacobian)[0]
+
+            jacobian.append(model_jacobian - basis @ (basis.T @ model_jacobian))
+
+        return np.concatenate(jacobian)
+
+    def variable_projection_solution(self, model_parameters):
+        """
+        The best model of a variable projection fit, i.e. the model parameters and
+        the linear least squares fluxes, and its covariance matrix (not scaled by
+        the reduced chi2), including the fluxes
+
+        Parameters
+        ----------
+        model_parameters : array, the best model parameters
+
+        Returns
+        -------
+        best_model : list, the model parameters and the telescopes fluxes
+        covariance_matrix : array, the covariance matrix of best_model
+        """
+        telescopes_fluxes = self.model.find_telescopes_fluxes(model_parameters)
+
+        best_model = list(model_parameters) + list(telescopes_fluxes.values())
+
+        model_jacobians, fluxes_jacobians = self.variable_projection_Jacobians(
+            np.array(model_parameters, dtype=float))
+
+        number_of_model_parameters = len(model_parameters)
+
+        jacobian = np.zeros((np.sum([len(jacobi) for jacobi in model_jacobians]),
+                             len(best_model)))
+
+        start_index = 0
+        column = number_of_model_parameters
+
+        for model_jacobian, fluxes_jacobian in zip(model_jacobians, fluxes_jacobians):
+
+            rows = slice(start_index, start_index + len(model_jacobian))
+
+            jacobian[rows, :number_of_model_parameters] = model_jacobian
+            jacobian[rows, column:column + fluxes_jacobian.shape[1]] = fluxes_jacobian
+
+            start_index = rows.stop
+            column += fluxes_jacobian.shape[1]
+
+        covariance_matrix = np.linalg.pinv(np.dot(jacobian.T, jacobian))
+
+        return [float(value) for value in best_model], covariance_matrix
+
+    def define_Jacobian_function(self, pool=None):
+        """
+        The Jacobian given to scipy.optimize.least_squares: the analytical Jacobian
+        if the model has one (except for a variable projection of 'noblend'
+        fluxes), else numerical (see numerical_Jacobian)
+
+        Parameters
+        ----------
+        pool : object, the fit pool, or None
+
+        Returns
+        -------
+        jacobian_function : callable or str, the least_squares jac
+        """
+        if self.model.Jacobian_flag != 'Numerical':
+
+            if self.telescopes_fluxes_method == 'fit':
+
+                return self.residuals_Jacobian
+
+            # the projected Jacobian needs the least squares fluxes, but the
+            # 'noblend' source flux is the median of flux/magnification
+            if self.model.blend_flux_parameter != 'noblend':
+
+                return self.projected_residuals_Jacobian
+
+        if self.numerical_Jacobian == 'pool':
+
+            return lambda parameters: self.residuals_finite_differences(parameters,
+                                                                         pool)
+
+        return '2-point'
+
+    def fit(self, computational_pool=None):
 
         start_time = python_time.time()
+        self.clear_objective_cache()
 
         # use the analytical Jacobian (faster) if no second order are present,
         # else let the
@@ -80,14 +356,6 @@ class LMfit(MLfit):
         for telescope in self.model.event.telescopes:
             n_data = n_data + telescope.n_data('flux')
 
-        if self.model.Jacobian_flag != 'Numerical':
-
-            jacobian_function = self.residuals_Jacobian
-
-        else:
-
-            jacobian_function = '2-point'
-
         if self.loss_function == 'soft_l1':
 
             loss = 'soft_l1'
@@ -98,25 +366,38 @@ class LMfit(MLfit):
 
         scaling = 10 ** np.floor(np.log10(np.abs(self.guess))) + 1
 
-        lm_fit = scipy.optimize.least_squares(self.objective_function, self.guess,
-                                              method='lm', max_nfev=50000,
-                                              jac=jacobian_function, loss=loss,
-                                              xtol=10 ** -10, ftol=10 ** -10,
-                                              gtol=10 ** -10,
-                                              x_scale=scaling)
+        with self.execution_pool(computational_pool) as pool:
+
+            jacobian_function = self.define_Jacobian_function(pool)
+
+            lm_fit = scipy.optimize.least_squares(self.cached_objective_function,
+                                                  self.guess, method='lm',
+                                                  max_nfev=50000,
+                                                  jac=jacobian_function, loss=loss,
+                                                  xtol=10 ** -10, ftol=10 ** -10,
+                                                  gtol=10 ** -10,
+                                                  x_scale=scaling)
 
         fit_results = lm_fit['x'].tolist()
         fit_chi2 = lm_fit['cost'] * 2  # chi2
 
-        try:
-            # Try to extract the covariance matrix from the levenberg-marquard_fit
-            # output
-            covariance_matrix = np.linalg.pinv(np.dot(lm_fit['jac'].T, lm_fit['jac']))
+        if self.telescopes_fluxes_method != 'fit':
 
-        except ValueError:
+            fit_results, covariance_matrix = self.variable_projection_solution(
+                lm_fit['x'])
+
+        else:
+
+            try:
+                # Try to extract the covariance matrix from the levenberg-marquard_fit
+                # output
+                covariance_matrix = np.linalg.pinv(np.dot(lm_fit['jac'].T,
+                                                          lm_fit['jac']))
+
+            except ValueError:
 
-            covariance_matrix = np.zeros((len(self.model.model_dictionnary),
-                                          len(self.model.model_dictionnary)))
+                covariance_matrix = np.zeros((len(self.model.model_dictionnary),
+                                              len(self.model.model_dictionnary)))
 
         covariance_matrix *= fit_chi2 / (n_data - len(self.model.model_dictionnary))
         computation_time = python_time.time() - start_time
@@ -3,9 +3,83 @@ import time as python_time
 
 import emcee
 import numpy as np
+from pyLIMA.fits import fit_metrics
+from pyLIMA.fits.execution_backends import pool_method
 from pyLIMA.fits.ML_fit import MLfit
 from pyLIMA.priors import parameters_priors
 
+
+def sample_until_convergence(sampler, population, number_of_links, thin=1,
+                             check_every=100, target_R=1.01, target_ESS=1000,
+                             window=None):
+    """
+    Run an emcee sampler for at most number_of_links stored links, checking the
+    convergence every check_every stored links (see
+    fit_metrics.convergence_diagnostics). Stop as soon as the effective sample size
+    is above target_ESS and the split R-hat of all parameters is below target_R.
+
+    Each check reads the stored chain from the sampler, i.e. from disk with a
+    backend. Without a window, the whole chain is read at every check, so the I/O
+    grows as the square of the number of links; a window only reads the last
+    window stored links, and the diagnostics are the ones of this window.
+
+    Parameters
+    ----------
+    sampler : object, an emcee.EnsembleSampler
+    population : array, the initial walkers positions, or None to resume
+    number_of_links : int, the maximum number of links to store
+    thin : int, only one link every thin is stored
+    check_every : int, the number of stored links between two checks
+    target_R : float, the split R-hat target
+    target_ESS : float, the effective sample size target
+    window : int, the number of last stored links used by the checks, None (default)
+    uses all of them
+
+    Returns
+    -------
+    convergence : dict, the convergence trace, i.e. the links at which convergence
+    was checked with the corresponding autocorrelation_time, effective_sample_size
+    and R_hat, and if the chains converged
+    """
+    convergence = {'links': [], 'autocorrelation_time': [],
+                   'effective_sample_size': [], 'R_hat': [], 'converged': False}
+
+    if population is None:
+
+        population = sampler.get_last_sample()
+
+    for state in sampler.sample(population, iterations=number_of_links,
+                                thin_by=thin, progress=True):
+
+        if sampler.iteration % check_every != 0:
+
+            continue
+
+        discard = 0
+
+        if window is not None:
+
+            discard = max(sampler.iteration - window, 0)
+
+        diagnostics = fit_metrics.convergence_diagnostics(
+            sampler.get_chain(discard=discard))
+
+        convergence['links'].append(sampler.iteration)
+
+        for key in diagnostics.keys():
+
+            convergence[key].append(diagnostics[key])
+
+        if (diagnostics['effective_sample_size'] >= target_ESS) & (
+                np.max(diagnostics['R_hat']) <= target_R):
+
+            convergence['converged'] = True
+
+            break
+
+    return convergence
+
+
 class MCMCfit(MLfit):
     """
     Monte-Carlo Markov Chain using emcee
@@ -14,11 +88,29 @@ class MCMCfit(MLfit):
     Attributes
     -----------
     MCMC_walkers : int, the number of walkers = number_of_walkers*len(fit_parameters)
-    MCMC_links : int, the total number of iteration
+    MCMC_links : int, the total number of iteration (after the burn-in)
+    MCMC_backend : str, the HDF5 file where the chains are streamed (see
+    emcee.backends.HDFBackend, requires h5py). If the file already contains chains,
+    the fit resumes from the last stored link. None (default) keeps the chains in
+    memory. With a backend, the fit_results do not hold the chains, they are read
+    from the file on demand (see MCMC_chains)
+    MCMC_thin : int, only one link every MCMC_thin is stored
+    MCMC_burn_in : int, the number of iterations run, but not stored, before the
+    MCMC_links
+    MCMC_check_every : int, if > 0, the convergence is checked every
+    MCMC_check_every stored links and the fit stops as soon as the targets are
+    met, MCMC_links being the maximum (see sample_until_convergence)
+    MCMC_target_R : float, the split R-hat target of the adaptive run
+    MCMC_target_ESS : float, the effective sample size target of the adaptive run
+    MCMC_check_window : int, the number of last stored links used by the
+    convergence checks, None (default) uses all of them (see
+    sample_until_convergence)
     """
     def __init__(self, model, rescale_photometry=False, rescale_astrometry=False,
                  telescopes_fluxes_method='polyfit', loss_function='likelihood',
-                 MCMC_walkers=2, MCMC_links=5000):
+                 MCMC_walkers=2, MCMC_links=5000, MCMC_backend=None, MCMC_thin=1,
+                 MCMC_burn_in=0, MCMC_check_every=0, MCMC_target_R=1.01,
+                 MCMC_target_ESS=1000, MCMC_check_window=None):
         """The fit class has to be intialized with an event object."""
 
         super().__init__(model, rescale_photometry=rescale_photometry,
@@ -28,179 +120,326 @@ class MCMCfit(MLfit):
 
         self.MCMC_walkers = MCMC_walkers  # times number of dimension!
         self.MCMC_links = MCMC_links
+        self.MCMC_backend = MCMC_backend
+        self.MCMC_thin = MCMC_thin
+        self.MCMC_burn_in = MCMC_burn_in
+        self.MCMC_check_every = MCMC_check_every
+        self.MCMC_target_R = MCMC_target_R
+        self.MCMC_target_ESS = MCMC_target_ESS
+        self.MCMC_check_window = MCMC_check_window
 
     def fit_type(self):
         return "Monte Carlo Markov Chain (Affine Invariant)"
 
     def objective_function(self, fit_process_parameters):
 
-        #if self.loss_function != 'likelihood':
+        # the walkers outside the boundaries get -np.inf, without computing the
+        # model (see MLfit.parameters_outside_support)
+        objective = self.standard_objective_function(fit_process_parameters)
 
-        #limits_check = self.fit_parameters_inside_limits(fit_process_parameters)
+        return -objective
 
-        #if limits_check is not None:
+    def objective_function_with_fluxes(self, fit_process_parameters):
+        """
+        The emcee log-probability, returning the telescopes fluxes as blobs so
+        they can be stored alongside the chains (see reconstruct_chains)
 
-        #    return -limits_check #i.e. -np.inf
+        Parameters
+        ----------
+        fit_process_parameters : list, list containing the fit parameters
 
-        objective = self.standard_objective_function(fit_process_parameters)
+        Returns
+        -------
+        log_probability : float, the log-probability
+        fluxes : array, the telescopes fluxes
+        """
+        objective, fluxes = self.objective_function_and_fluxes(fit_process_parameters)
 
-        return -objective
+        return -objective, np.array(fluxes)
+
+    def record_trial(self, trial):
+        """
+        Store a trial of the fit algorithm, only if the chains are kept in memory.
+        With a MCMC_backend, the samples and the fluxes are streamed to disk instead.
+
+        Parameters
+        ----------
+        trial : list, the fit parameters (and fluxes) followed by the objective
+        """
+        if self.MCMC_backend is None:
+
+            super().record_trial(trial)
+
+    def define_MCMC_backend(self):
+        """
+        Open the on-disk storage of the chains, if any
+
+        Returns
+        -------
+        backend : object, an emcee.backends.HDFBackend or None
+        """
+        if self.MCMC_backend is None:
+
+            return None
+
+        backend = emcee.backends.HDFBackend(self.MCMC_backend)
+
+        return backend
+
+    def run_MCMC(self, sampler, population, number_of_links):
+        """
+        Run the burn-in (not stored) then store number_of_links links, thinned by
+        MCMC_thin. If population is None, the sampler resumes from its backend.
+
+        Parameters
+        ----------
+        sampler : object, an emcee.EnsembleSampler
+        population : array, the initial walkers positions, or None to resume
+        number_of_links : int, the number of links to store
+
+        Returns
+        -------
+        convergence : dict, the convergence trace of an adaptive run (see
+        sample_until_convergence), None otherwise
+        """
+        convergence = None
+
+        if (population is not None) & (self.MCMC_burn_in > 0):
 
-    def fit(self, initial_population=[], computational_pool=False):
+            population = sampler.run_mcmc(population, self.MCMC_burn_in, store=False,
+                                          progress=True)
+
+        if number_of_links > 0:
+
+            if self.MCMC_check_every > 0:
+
+                convergence = sample_until_convergence(
+                    sampler, population, number_of_links, thin=self.MCMC_thin,
+                    check_every=self.MCMC_check_every, target_R=self.MCMC_target_R,
+                    target_ESS=self.MCMC_target_ESS, window=self.MCMC_check_window)
+
+            else:
+
+                sampler.run_mcmc(population, number_of_links, thin_by=self.MCMC_thin,
+                                 progress=True)
+
+        return convergence
+
+    def fit(self, initial_population=[], computational_pool=None):
 
         start_time = python_time.time()
+        self.clear_objective_cache()
         #Safety, recompute in case user changes boundaries after init
         self.priors = parameters_priors.default_parameters_priors(
             self.priors_parameters)
 
-        if initial_population == []:
+        with self.execution_pool(computational_pool) as pool:
 
-            best_solution = self.initial_guess()
+            if initial_population == []:
 
-            if best_solution is None:
+                best_solution = self.initial_guess()
 
-                return None
+                if best_solution is None:
 
-            if self.telescopes_fluxes_method != 'fit':
+                    return None
 
-                best_solution = best_solution[:len(self.fit_parameters)]
+                if self.telescopes_fluxes_method != 'fit':
 
-            number_of_parameters = len(best_solution)
-            nwalkers = self.MCMC_walkers * number_of_parameters
+                    best_solution = best_solution[:len(self.fit_parameters)]
 
-            # Initialize the population of MCMC
-            eps = 10 ** -4
-            floors = np.floor(np.round(best_solution))
-            initial = best_solution - floors
-            mask = initial == 0
-            initial[mask] = eps
+                number_of_parameters = len(best_solution)
+                nwalkers = self.MCMC_walkers * number_of_parameters
 
-            deltas = initial * np.random.uniform(-eps, eps,
-                                                 (nwalkers, number_of_parameters))
-            population = best_solution + deltas
+                # Initialize the population of MCMC
+                eps = 10 ** -4
+                floors = np.floor(np.round(best_solution))
+                initial = best_solution - floors
+                mask = initial == 0
+                initial[mask] = eps
 
-        else:
+                deltas = initial * np.random.uniform(-eps, eps,
+                                                     (nwalkers, number_of_parameters))
+                population = best_solution + deltas
 
-            population = initial_population[:, :-1]
-            number_of_parameters = population.shape[1]
+            else:
 
-            nwalkers = self.MCMC_walkers * number_of_parameters
+                population = initial_population[:, :-1]
+                number_of_parameters = population.shape[1]
 
-        nlinks = self.MCMC_links
+                nwalkers = self.MCMC_walkers * number_of_parameters
 
-        if computational_pool:
+            nlinks = self.MCMC_links // self.MCMC_thin
 
-            pool = computational_pool
+            backend = self.define_MCMC_backend()
 
-        else:
-            pool = None
+            if (backend is not None) and backend.initialized and (
+                    backend.iteration > 0):
 
-        try:
-            # create a new MPI pool
-            from schwimmbad import MPIPool
-            pool = MPIPool()
-            if not pool.is_master():
-                pool.wait()
-                sys.exit(0)
-        except ModuleNotFoundError:
+                print('Resuming the MCMC from ' + self.MCMC_backend + ' at link ' +
+                      str(backend.iteration))
+                nlinks = nlinks - backend.iteration
+                population = None
 
-            pass
+            if self.telescopes_fluxes_method == 'polyfit':
 
-        if pool:
+                log_probability = pool_method(pool, self,
+                                              'objective_function_with_fluxes')
 
-            with pool:
+            else:
 
-                sampler = emcee.EnsembleSampler(nwalkers, number_of_parameters,
-                                                self.objective_function, pool=pool)
-
-                sampler.run_mcmc(population, nlinks, progress=True)
-        else:
+                log_probability = pool_method(pool, self, 'objective_function')
 
             sampler = emcee.EnsembleSampler(nwalkers, number_of_parameters,
-                                            self.objective_function, pool=pool)
+                                            log_probability, pool=pool,
+                                            backend=backend)
 
-            sampler.run_mcmc(population, nlinks, progress=True)
+            convergence = self.run_MCMC(sampler, population, nlinks)
 
         computation_time = python_time.time() - start_time
         print(sys._getframe().f_code.co_name, ' : ' + self.fit_type() + ' fit SUCCESS')
 
         self.trials = np.array(self.trials)
-        self.trials[:, -1] *= -1
-
-        MCMC_chains, MCMC_chains_with_fluxes = self.reconstruct_chains(
-            sampler.get_chain(), sampler.get_log_prob())
-
-        best_model_index = np.where(
-            MCMC_chains[:, :, -1] == MCMC_chains[:, :, -1].max())
-        fit_results = MCMC_chains_with_fluxes[np.unique(best_model_index[0])[0],
-                      np.unique(best_model_index[1])[0], :-1]
-        fit_log_likelihood = MCMC_chains[
-            np.unique(best_model_index[0])[0], np.unique(best_model_index[1])[0], -1]
-
-        self.fit_results = {'best_model': fit_results,
-                            self.loss_function: fit_log_likelihood,
-                            'MCMC_chains': MCMC_chains,
-                            'MCMC_chains_with_fluxes': MCMC_chains_with_fluxes,
-                            'fit_time': computation_time,
-                            'fit_object': sampler}
 
-        self.print_fit_results()
+        if len(self.trials) != 0:
+
+            self.trials[:, -1] *= -1
 
-    def reconstruct_chains(self, mcmc_samples, mcmc_prob):
+        mcmc_prob = sampler.get_log_prob()
+        best_link, best_walker = np.unravel_index(np.argmax(mcmc_prob),
+                                                  mcmc_prob.shape)
 
+        if backend is None:
 
+            MCMC_chains, MCMC_chains_with_fluxes = self.reconstruct_chains(
+                sampler.get_chain(), mcmc_prob, sampler.get_blobs())
 
+            best_sample = MCMC_chains_with_fluxes[best_link, best_walker]
+            chains_results = {'MCMC_chains': MCMC_chains,
+                              'MCMC_chains_with_fluxes': MCMC_chains_with_fluxes}
 
+        else:
+
+            # only the best link is read from the file, see MCMC_chains
+            best_sample = self.backend_link(backend, best_link)[1][0, best_walker]
+            chains_results = {'MCMC_backend': backend,
+                              'MCMC_backend_file': self.MCMC_backend}
+
+        self.fit_results = {'best_model': best_sample[:-1],
+                            self.loss_function: best_sample[-1],
+                            **chains_results,
+                            'fit_time': computation_time,
+                            'fit_object': sampler}
+
+        if convergence is not None:
+
+            self.fit_results['convergence'] = convergence
+
+        self.print_fit_results()
+
+    def reconstruct_chains(self, mcmc_samples, mcmc_prob, mcmc_fluxes=None):
+        """
+        Assemble the chains, and the chains with the telescopes fluxes in the
+        pyLIMA order, i.e. model parameters, fluxes, rescaling parameters and
+        log-probability
+
+        Parameters
+        ----------
+        mcmc_samples : array, (links,walkers,parameters) the emcee chains
+        mcmc_prob : array, (links,walkers) the emcee log-probabilities
+        mcmc_fluxes : array, (links,walkers,fluxes) the emcee blobs, i.e. the
+        telescopes fluxes if telescopes_fluxes_method == 'polyfit'
+
+        Returns
+        -------
+        MCMC_chains : array, the chains with the log-probability
+        MCMC_chains_with_fluxes : array, the chains with the fluxes and
+        log-probability
+        """
         rangei, rangej, rangek = mcmc_samples.shape
 
         MCMC_chains = np.zeros((rangei, rangej, rangek + 1))
         MCMC_chains[:, :, :-1] = mcmc_samples
         MCMC_chains[:, :, -1] = mcmc_prob
 
-        if self.telescopes_fluxes_method == 'polyfit':
-            Rangei,Rangej = self.trials.shape
-            MCMC_chains_with_fluxes = np.zeros((rangei,rangej,Rangej))
+        if (self.telescopes_fluxes_method == 'polyfit') & (mcmc_fluxes is not None):
+
+            mcmc_fluxes = np.asarray(mcmc_fluxes, dtype=float).reshape(rangei, rangej,
+                                                                       -1)
+            number_of_model_parameters = len(self.model_parameters_index)
+
+            MCMC_chains_with_fluxes = np.concatenate(
+                [mcmc_samples[:, :, :number_of_model_parameters], mcmc_fluxes,
+                 mcmc_samples[:, :, number_of_model_parameters:],
+                 mcmc_prob[:, :, None]], axis=-1)
+
+        else:
 
-            for j in range(rangej):
+            MCMC_chains_with_fluxes = MCMC_chains.copy()
 
-                    unique_sample = np.unique(mcmc_samples[:,j],return_inverse=True,
-                                              axis=0)
+        return MCMC_chains, MCMC_chains_with_fluxes
 
-                    unique_trials = []
-                    for unique_values in unique_sample[0]:
+    def backend_link(self, backend, link):
+        """
+        Read one stored link from the MCMC_backend file, see reconstruct_chains
 
-                       index = np.where(self.trials[:, :len(self.fit_parameters)][:, -1]
-                                             == unique_values[-1])[0][0]
-                       unique_trials.append(self.trials[index].tolist())
+        Parameters
+        ----------
+        backend : object, the emcee.backends.HDFBackend
+        link : int, the index of the stored link
 
+        Returns
+        -------
+        MCMC_chains : array, the (1,walkers,parameters+1) chains of the link
+        MCMC_chains_with_fluxes : array, the chains of the link with the fluxes
+        """
+        with backend.open() as hdf:
 
-                    MCMC_chains_with_fluxes[:,j] = np.array(unique_trials)[unique_sample[1].ravel()]
+            group = hdf[backend.name]
 
-            columns_to_swap = []
-            if self.rescale_photometry:
-                columns_to_swap += self.rescale_photometry_parameters_index
+            mcmc_samples = group['chain'][link:link + 1]
+            mcmc_prob = group['log_prob'][link:link + 1]
+            mcmc_fluxes = None
 
-            if self.rescale_astrometry:
-                columns_to_swap += self.rescale_photometry_parameters_index
+            if group.attrs['has_blobs']:
 
-            if (columns_to_swap != []):
+                mcmc_fluxes = group['blobs'][link:link + 1]
 
-                old_column = columns_to_swap
-                new_column = np.arange(old_column[-1]+1,Rangej-1,1).tolist()
+        return self.reconstruct_chains(mcmc_samples, mcmc_prob, mcmc_fluxes)
 
-                MCMC_chains_with_fluxes[:, :, old_column + new_column] = MCMC_chains_with_fluxes[:, :,
-                                                                     new_column + old_column]
+    def MCMC_chains(self, discard=0, thin=1):
+        """
+        The chains of the last fit, see reconstruct_chains. They are stored in the
+        fit_results without a MCMC_backend, and read from the file otherwise.
 
-        else:
+        Parameters
+        ----------
+        discard : int, the number of first stored links to discard
+        thin : int, only one stored link every thin is used
 
-            MCMC_chains_with_fluxes = MCMC_chains.copy()
+        Returns
+        -------
+        MCMC_chains : array, the chains with the log-probability
+        MCMC_chains_with_fluxes : array, the chains with the fluxes and
+        log-probability
+        """
+        if 'MCMC_chains' in self.fit_results:
 
-        return MCMC_chains, MCMC_chains_with_fluxes
+            return (self.fit_results['MCMC_chains'][discard + thin - 1::thin],
+                    self.fit_results['MCMC_chains_with_fluxes'][
+                    discard + thin - 1::thin])
+
+        sampler = self.fit_results['fit_object']
+
+        return self.reconstruct_chains(sampler.get_chain(discard=discard, thin=thin),
+                                       sampler.get_log_prob(discard=discard,
+                                                            thin=thin),
+                                       sampler.get_blobs(discard=discard, thin=thin))
 
     def samples_to_plot(self):
 
-        chains = self.fit_results['MCMC_chains_with_fluxes']
-        samples = chains.reshape(-1, chains.shape[2])
-        samples_to_plot = samples[int(len(samples) / 2):]
+        number_of_links = self.fit_results['fit_object'].iteration
+
+        chains = self.MCMC_chains(discard=number_of_links // 2)[1]
+        samples_to_plot = chains.reshape(-1, chains.shape[2])
 
         return samples_to_plot
@@ -31,6 +31,7 @@ class MINIMIZEfit(LMfit):
     def fit(self):
 
         starting_time = python_time.time()
+        self.clear_objective_cache()
         self.population = []
         # use the analytical Jacobian (faster) if no second order are present,
         # else let the
@@ -32,6 +32,7 @@ class MINUITfit(LMfit):
     def fit(self):
 
         starting_time = python_time.time()
+        self.clear_objective_cache()
 
         # use the analytical Jacobian (faster) if no second order are present,
         # else let the
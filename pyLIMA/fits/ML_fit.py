@@ -1,13 +1,22 @@
+import itertools
 import sys
 from collections import OrderedDict
 from multiprocessing import Manager
 
 import numpy as np
+import scipy.sparse
+from scipy.stats import qmc
 import pyLIMA.fits.objective_functions as objective_functions
+from pyLIMA.fits import execution_backends
 from bokeh.layouts import gridplot
 from bokeh.plotting import output_file, save
 from pyLIMA.priors import parameters_boundaries
 from pyLIMA.priors import parameters_priors
+from pyLIMA.toolbox import instrumentation, objective_cache
+
+
+# the versions of the compiled priors, see MLfit.compile_priors
+PRIORS_VERSIONS = itertools.count()
 
 
 class FitException(Exception):
@@ -32,7 +41,10 @@ class MLfit(object):
     fit_parameters : dict, dictionnary containing the parameters name and boundaries
     fit_results : dict, dictionnary containing the fit results
     priors : list, a list of parameters priors (None by default)
-    trials : list, a Manager().list() to collect all algorithm fit trials
+    compiled_priors : tuple, the cache of compile_priors (and of the fit
+    parameters boundaries, see fit_parameters_bounds)
+    trials : list, to collect all algorithm fit trials, a Manager().list() when the
+    fit runs on a pool of processes (see execution_pool)
     model_parameters_guess : list, a list containing the parameters guess
     rescale_photometry_parameters_guess : list, contains guess on rescaling photometry
     rescale_astrometry_parameters_guess : list, contains guess on rescaling astrometry
@@ -41,6 +53,17 @@ class MLfit(object):
     rescale_photometry_parameters_index : list, indexes of photometry rescaling
     parameters
     rescale_astrometry_parameters_index : list, indexes of astrometry rescaling
+    instrumentation : object, an Instrumentation object if the fit is instrumented
+    (see enable_instrumentation), None otherwise
+    execution_backend : str, where the objective function is evaluated by the fits
+    that can be parallelized ('serial','thread','process' or 'MPI', see
+    define_execution_backend)
+    number_of_workers : int, the number of threads or processes, None uses
+    os.cpu_count()
+    shared_memory : bool, share the telescopes arrays and the model parallax basis
+    with the 'process' workers
+    objective_cache : object, the ObjectiveCache memoizing the objective function,
+    None if disabled (see define_objective_cache)
     """
 
     def __init__(self, model, rescale_photometry=False, rescale_astrometry=False,
@@ -64,9 +87,15 @@ class MLfit(object):
         self.priors_parameters = []
         self.fit_results = {}
         self.priors = None
+        self.compiled_priors = None
         self.extra_priors = None
-        self.trials = Manager().list()  # to be recognize by all process during
-        # parallelization
+        self.trials = []
+        self.instrumentation = None
+        self.execution_backend = 'serial'
+        self.number_of_workers = None
+        self.shared_memory = False
+        self.objective_cache = None
+        self.define_objective_cache()
 
         self.model_parameters_guess = []
         self.rescale_photometry_parameters_guess = []
@@ -267,14 +296,69 @@ class MLfit(object):
         self.priors = parameters_priors.default_parameters_priors(
             self.priors_parameters)
 
-    def fit_parameters_inside_limits(self, fit_process_parameters):
+    def parameters_outside_support(self, fit_process_parameters):
+        """
+        Check if fit parameters are outside the fit boundaries or outside the
+        support of their priors, i.e. if the model is not worth computing
 
-        for ind,key in enumerate(self.fit_parameters.keys()):
+        Parameters
+        ----------
+        fit_process_parameters : array, the fit parameters, or a
+        (population,parameters) array
+
+        Returns
+        -------
+        outside : bool or array, True for the rejected parameters
+        """
+        parameters = np.asarray(fit_process_parameters, dtype=float)
 
-            if (fit_process_parameters[ind]<self.fit_parameters[key][1][0]) | (
-                    fit_process_parameters[ind]>self.fit_parameters[key][1][1]):
+        fit_priors = self.compile_priors()[0]
+        bounds = self.compiled_priors[4]
 
-                return np.inf
+        values = parameters[..., :bounds.shape[1]]
+        outside = np.any((values < bounds[0]) | (values > bounds[1]), axis=-1)
+
+        if self.priors is not None:
+
+            outside |= fit_priors.ln_probability(parameters) == -np.inf
+
+        return outside
+
+    def initial_population_design(self, number_of_individuals,
+                                  design='latinhypercube'):
+        """
+        Draw a space-filling population within the fit boundaries, in one call of
+        the scipy.stats.qmc sampler
+
+        Parameters
+        ----------
+        number_of_individuals : int, the population size
+        design : str, 'latinhypercube' or 'sobol' (the first number_of_individuals
+        points of a scrambled Sobol sequence)
+
+        Returns
+        -------
+        population : array, the (number_of_individuals,parameters) population
+        """
+        bounds = self.fit_parameters_bounds()
+
+        if design == 'latinhypercube':
+
+            sample = qmc.LatinHypercube(d=bounds.shape[1]).random(
+                n=number_of_individuals)
+
+        elif design == 'sobol':
+
+            exponent = int(np.ceil(np.log2(max(number_of_individuals, 1))))
+            sample = qmc.Sobol(d=bounds.shape[1]).random_base2(m=exponent)
+            sample = sample[:number_of_individuals]
+
+        else:
+
+            raise FitException('Unknown design ' + str(design) +
+                               ', choose between latinhypercube and sobol')
+
+        return bounds[0] + sample * (bounds[1] - bounds[0])
 
     def standard_objective_function(self, fit_process_parameters):
         """
@@ -289,6 +373,65 @@ class MLfit(object):
 
         objective : float, the value of the objective function
         """
+        objective, fluxes = self.objective_function_and_fluxes(fit_process_parameters)
+
+        return objective
+
+    def objective_function_and_fluxes(self, fit_process_parameters):
+        """
+        Compute the objective function based on the model and fit_process_parameters,
+        and the telescopes fluxes if they are not fitted (i.e.
+        telescopes_fluxes_method != 'fit')
+
+        Parameters
+        ----------
+        fit_process_parameters : list, list containing the fit parameters
+
+        Returns
+        -------
+
+        objective : float, the value of the objective function
+        fluxes : list, the telescopes fluxes (empty if telescopes_fluxes_method ==
+        'fit')
+
+        Parameters outside the support (see parameters_outside_support) are rejected
+        without computing the model: the objective is np.inf and the fluxes are
+        np.nan, and they are recorded as such in the trials.
+        """
+        if self.parameters_outside_support(fit_process_parameters):
+
+            objective = np.inf
+            fluxes = []
+
+            if self.telescopes_fluxes_method != 'fit':
+
+                fluxes = [np.nan] * len(
+                    self.model.telescopes_fluxes_model_parameters({}))
+
+            self.record_trial(np.asarray(fit_process_parameters).tolist() + fluxes +
+                              [objective])
+
+            return objective, fluxes
+
+        parameters = np.asarray(fit_process_parameters)
+        cache_kind = ('objective', self.loss_function)
+
+        if self.loss_function == 'likelihood':
+
+            # the likelihood depends on the priors version
+            self.compile_priors()
+            cache_kind += (self.compiled_priors[-1],)
+
+        cached = self.cached_value(cache_kind, parameters)
+
+        if cached is not None:
+
+            objective, fluxes = cached
+
+            self.record_trial(parameters.tolist() + fluxes + [objective])
+
+            return objective, list(fluxes)
+
         if self.loss_function == 'likelihood':
             likelihood, pyLIMA_parameters = self.model_likelihood(
                 fit_process_parameters)
@@ -304,44 +447,351 @@ class MLfit(object):
 
         if self.telescopes_fluxes_method != 'fit':
 
+            fluxes = self.telescopes_fluxes_from_pyLIMA_parameters(pyLIMA_parameters)
+
+            self.record_trial(fit_process_parameters.tolist() + fluxes + [objective])
+
+        else:
+
             fluxes = []
 
-            for tel in self.model.event.telescopes:
+            self.record_trial(fit_process_parameters.tolist() + [objective])
+
+        self.cache_value(cache_kind, parameters, (objective, list(fluxes)))
 
-                if tel.lightcurve_flux is not None:
+        return objective, fluxes
 
-                        #if np.isinf(objective):
+    def telescopes_fluxes_from_pyLIMA_parameters(self, pyLIMA_parameters):
+        """
+        Collect the telescopes fluxes, in the model_dictionnary order
 
-                        #    fluxes.append(np.nan)
-                        #    fluxes.append(np.nan)
-                        #else:
-                        fluxes.append(pyLIMA_parameters['fsource_' + tel.name])
-                        if self.model.blend_flux_parameter == 'gblend':
-                            fluxes.append(pyLIMA_parameters['gblend_' + tel.name])
+        Parameters
+        ----------
+        pyLIMA_parameters : dict, a pyLIMA_parameters object
 
-                        if self.model.blend_flux_parameter == 'fblend':
-                            fluxes.append(pyLIMA_parameters['fblend_' + tel.name])
+        Returns
+        -------
+        fluxes : list, the telescopes fluxes
+        """
+        fluxes = []
 
-                        if self.model.blend_flux_parameter == 'ftotal':
-                            fluxes.append(pyLIMA_parameters['ftotal_' + tel.name])
+        for tel in self.model.event.telescopes:
 
-                        if self.model.blend_flux_parameter == 'noblend':
-                            pass
-            self.trials.append(fit_process_parameters.tolist() + fluxes + [objective])
+            if tel.lightcurve_flux is not None:
+
+                fluxes.append(pyLIMA_parameters['fsource_' + tel.name])
+
+                if self.model.blend_flux_parameter == 'gblend':
+                    fluxes.append(pyLIMA_parameters['gblend_' + tel.name])
+
+                if self.model.blend_flux_parameter == 'fblend':
+                    fluxes.append(pyLIMA_parameters['fblend_' + tel.name])
+
+                if self.model.blend_flux_parameter == 'ftotal':
+                    fluxes.append(pyLIMA_parameters['ftotal_' + tel.name])
+
+        return fluxes
+
+    def record_trial(self, trial):
+        """
+        Store a trial of the fit algorithm
+
+        Parameters
+        ----------
+        trial : list, the fit parameters (and fluxes) followed by the objective
+        """
+        self.trials.append(trial)
+
+    def enable_instrumentation(self):
+        """
+        Count the calls and time spent in each stage of the fit, i.e. the model
+        stages (see MLmodel.enable_instrumentation) plus residuals, priors and trial
+        recording. Off by default, and without overhead when off. The summary is
+        stored in fit_results['instrumentation'] after each fit.
+
+        Returns
+        -------
+        instrumentation : object, the Instrumentation object
+        """
+        self.disable_instrumentation()
+
+        self.instrumentation = self.model.enable_instrumentation()
+        instrumentation.instrument_methods(self, instrumentation.FIT_STAGES,
+                                           self.instrumentation)
+        self.fit = instrumentation.InstrumentedFit(self.instrumentation, 'fit', self,
+                                                   'fit')
+
+        return self.instrumentation
+
+    def disable_instrumentation(self):
+        """
+        Remove the instrumentation of this fit and of its model
+        """
+        instrumentation.remove_instrumentation(self, list(
+            instrumentation.FIT_STAGES.keys()) + ['fit'])
+
+        if self.instrumentation is not None:
+            self.model.disable_instrumentation()
+
+        self.instrumentation = None
+
+    def define_objective_cache(self, maxsize=128):
+        """
+        Memoize the objective function (and the residuals of the least squares
+        fits) of the last maxsize parameters vectors evaluated, see
+        objective_cache.ObjectiveCache. The memoized likelihoods are tied to the
+        priors (and extra_priors) they were computed with, and the cache is
+        cleared at the start of each fit (see clear_objective_cache), as it does
+        not know about changes of the model or of the data.
+
+        Parameters
+        ----------
+        maxsize : int, the number of memoized parameters vectors, 0 disables the
+        cache
+        """
+        if maxsize > 0:
+
+            self.objective_cache = objective_cache.ObjectiveCache(maxsize)
 
         else:
 
-            self.trials.append(fit_process_parameters.tolist() + [objective])
+            self.objective_cache = None
 
-        return objective
+    def clear_objective_cache(self):
+        """
+        Forget the memoized values, called at the start of each fit
+        """
+        if self.objective_cache is not None:
 
-    def get_priors_probability(self, pyLIMA_parameters):
+            self.objective_cache.clear()
+
+    def cached_value(self, kind, fit_process_parameters):
         """
-        Transform the prior probability to ln space
+        Look for a memoized value, see define_objective_cache
+
+        Parameters
+        ----------
+        kind : tuple, what is memoized, e.g. ('objective','chi2')
+        fit_process_parameters : array, the fit parameters
+
+        Returns
+        -------
+        value : the memoized value, None if unknown or if the cache is disabled
+        """
+        if self.objective_cache is None:
+
+            return None
+
+        return self.objective_cache.get(kind, fit_process_parameters)
+
+    def cache_value(self, kind, fit_process_parameters, value):
+        """
+        Memoize a value, if the cache is enabled
+
+        Parameters
+        ----------
+        kind : tuple, what is memoized, e.g. ('objective','chi2')
+        fit_process_parameters : array, the fit parameters
+        value : object, the value
+        """
+        if self.objective_cache is not None:
+
+            self.objective_cache.put(kind, fit_process_parameters, value)
+
+    def define_execution_backend(self, execution_backend='serial',
+                                 number_of_workers=None, shared_memory=False):
+        """
+        Select where the objective function is evaluated. The pool is opened at the
+        beginning of each fit and closed at the end. A computational_pool given to
+        the fit method overrides this choice.
+
+        Parameters
+        ----------
+        execution_backend : str, 'serial','thread','process' or 'MPI' (requires
+        schwimmbad and mpi4py)
+        number_of_workers : int, the number of threads or processes, None uses
+        os.cpu_count()
+        shared_memory : bool, for the 'process' backend, move the telescopes arrays
+        and the model parallax basis into shared memory during the fit, so that
+        the memory does not grow with the number of workers (see
+        shared_arrays.shared_model)
+        """
+        execution_backends.check_execution_backend(execution_backend)
+
+        self.execution_backend = execution_backend
+        self.number_of_workers = number_of_workers
+        self.shared_memory = shared_memory
+
+    def make_pool(self, number_of_workers=None):
+        """
+        A 'process' pool whose workers cache this fit, to be given as
+        computational_pool to several fits. The workers keep the fit as it is now
+        (boundaries, priors, guesses...), so make a new pool if it changes, and
+        close the pool once done (see execution_backends.process_pool).
+
+        Parameters
+        ----------
+        number_of_workers : int, the number of processes, None uses
+        number_of_workers (or os.cpu_count() if None too)
+
+        Returns
+        -------
+        pool : object, a multiprocessing.Pool
+        """
+        if number_of_workers is None:
+
+            number_of_workers = self.number_of_workers
+
+        # the workers record the trials in a list owned by the pool
+        trials = self.trials
+        self.trials = Manager().list()
+
+        try:
+
+            pool = execution_backends.process_pool(self, number_of_workers)
+            pool.worker_trials = self.trials
+
+        finally:
+
+            self.trials = trials
+
+        return pool
+
+    def execution_pool(self, computational_pool=None):
+        """
+        The pool of a fit, to be used as a context manager. The workers of a
+        'process' pool receive the fit once, when they start, then only the
+        parameters are sent with each task (see execution_backends.pool_method).
+        If the pool runs other processes, the trials are moved to a
+        Manager().list()
+
+        Parameters
+        ----------
+        computational_pool : object, a user-supplied pool or executor, or an
+        execution backend name. If None (or False), the execution_backend is used
+
+        Returns
+        -------
+        pool : context manager yielding an object with map and starmap methods, or
+        None for a serial fit (see execution_backends.open_pool)
+        """
+        if not computational_pool:
+
+            computational_pool = self.execution_backend
+
+        if getattr(computational_pool, 'worker_instance', None) is self:
+
+            # the workers cached the trials list of the pool, see make_pool
+            computational_pool.worker_trials[:] = list(self.trials)
+            self.trials = computational_pool.worker_trials
+
+        elif not execution_backends.runs_in_process(computational_pool):
+
+            # to be recognized by all processes during parallelization
+            self.trials = Manager().list(list(self.trials))
+
+        shared_model = None
+
+        if self.shared_memory:
+
+            shared_model = self.model
+
+        return execution_backends.open_pool(computational_pool,
+                                            self.number_of_workers,
+                                            worker_instance=self,
+                                            shared_model=shared_model)
+
+    def compile_priors(self):
+        """
+        Compile the priors in two parameters_priors.CompiledPriors: the priors of
+        the fit parameters, evaluated on the fit parameters vector (i.e. before
+        computing the model), and the priors of the other parameters (e.g. the
+        telescopes fluxes estimated with the model), evaluated on the
+        pyLIMA_parameters. The compilation, and the fit parameters boundaries, are
+        cached until the priors (or the extra_priors, or the boundaries) change, each
+        compilation having a new version number.
+
+        Returns
+        -------
+        fit_priors : object, the CompiledPriors of the fit parameters
+        model_priors_keys : list, the other parameters with a prior
+        model_priors : object, the CompiledPriors of the other parameters
+        """
+        priors = self.priors
+
+        if priors is None:
+
+            priors = {}
+
+        signature = [(key, id(prior)) for key, prior in priors.items()]
+
+        if self.extra_priors is not None:
+
+            signature += [('extra_priors', id(prior)) for prior in self.extra_priors]
+
+        signature += [(key, tuple(value[1])) for key, value in
+                      self.fit_parameters.items()]
+
+        if (self.compiled_priors is None) or (self.compiled_priors[0] != signature):
+
+            fit_priors = parameters_priors.CompiledPriors(
+                [priors.get(key) for key in self.fit_parameters.keys()])
+
+            model_priors_keys = [key for key in priors.keys() if
+                                 (key not in self.fit_parameters.keys()) and (
+                                         priors[key] is not None)]
+            model_priors = parameters_priors.CompiledPriors(
+                [priors[key] for key in model_priors_keys])
+
+            bounds = np.array([self.fit_parameters[key][1] for key in
+                               self.fit_parameters.keys()], dtype=float).T
+            bounds.flags.writeable = False
+
+            self.compiled_priors = (signature, fit_priors, model_priors_keys,
+                                    model_priors, bounds, next(PRIORS_VERSIONS))
+
+        return self.compiled_priors[1:4]
+
+    def fit_parameters_bounds(self):
+        """
+        The boundaries of the fit parameters, cached with the compiled priors (see
+        compile_priors)
+
+        Returns
+        -------
+        bounds : array, the (2,parameters) lower and upper boundaries
+        """
+        self.compile_priors()
+
+        return self.compiled_priors[4]
+
+    def priors_probability(self, fit_process_parameters):
+        """
+        The ln-prior of the fit parameters, known before computing the model
+
+        Parameters
+        ----------
+        fit_process_parameters : array, the fit parameters, or a
+        (population,parameters) array
+
+        Returns
+        -------
+        ln_prior : float or array, the ln-prior, -np.inf outside the priors support
+        """
+        fit_priors = self.compile_priors()[0]
+
+        return fit_priors.ln_probability(fit_process_parameters)
+
+    def get_priors_probability(self, pyLIMA_parameters, fit_process_parameters=None):
+        """
+        Transform the prior probability to ln space. A parameter outside its prior
+        support counts for -10**10.
 
         Parameters
         ----------
         pyLIMA_parameters : dict, a pyLIMA_parameters object
+        fit_process_parameters : array, the fit parameters if known, to avoid
+        collecting them from pyLIMA_parameters
 
         Returns
         -------
@@ -351,23 +801,21 @@ class MLfit(object):
 
         if self.priors is not None:
 
-            for ind, prior_key in enumerate(self.priors.keys()):
+            fit_priors, model_priors_keys, model_priors = self.compile_priors()
 
-                prior_pdf = self.priors[prior_key]
+            if fit_process_parameters is None:
 
-                if prior_pdf is not None:
+                fit_process_parameters = [pyLIMA_parameters.get(key, np.nan) for key
+                                          in self.fit_parameters.keys()]
 
-                    probability = prior_pdf.pdf(pyLIMA_parameters[prior_key])
+            ln_likelihood += fit_priors.ln_probability(fit_process_parameters,
+                                                       penalty=-10 ** 10)
 
-                    if probability > 0:
+            if len(model_priors_keys) != 0:
 
-                        ln_likelihood += np.log(probability)
-
-                    else:
-
-                        #ln_likelihood = -np.inf
-                        ln_likelihood += -10**10
-                        #return ln_likelihood
+                ln_likelihood += model_priors.ln_probability(
+                    [pyLIMA_parameters[key] for key in model_priors_keys],
+                    penalty=-10 ** 10)
 
         if self.extra_priors is not None:
 
@@ -875,6 +1323,8 @@ class MLfit(object):
         ln_likelihood : float, the ln-likelihood
         pyLIMA_parameters : dict, an updated pyLIMA_parameters object
         """
+        fit_process_parameters = None
+
         # it is a pyLIMA_parameters object or not
         if (isinstance(parameters, list) | isinstance(parameters, np.ndarray)):
 
@@ -884,6 +1334,8 @@ class MLfit(object):
 
             pyLIMA_parameters = self.model.compute_pyLIMA_parameters(model_parameters)
 
+            fit_process_parameters = parameters
+
         else:
 
             pyLIMA_parameters = parameters
@@ -940,7 +1392,8 @@ class MLfit(object):
         ln_likelihood = 0.5*np.sum(residuals / errors + np.log(errors) +
                                 np.log(2 * np.pi))
 
-        prior = self.get_priors_probability(pyLIMA_parameters)
+        prior = self.get_priors_probability(
+            pyLIMA_parameters, fit_process_parameters=fit_process_parameters)
 
         ln_likelihood += -prior  # Default is -ln_likelihood
 
@@ -1130,9 +1583,96 @@ class MLfit(object):
 
         return photometric_jacobian
 
+    def telescopes_fluxes_columns(self, telescope):
+        """
+        The Jacobian columns of the fluxes of a telescope, i.e. the indexes of its
+        fluxes in the fit parameters
+
+        Parameters
+        ----------
+        telescope : object, a telescope object
+
+        Returns
+        -------
+        columns : list, the fsource (and fblend, gblend or ftotal) columns
+        """
+        fit_parameters_keys = list(self.fit_parameters.keys())
+
+        flux_keys = ['fsource_' + telescope.name]
+
+        if self.model.blend_flux_parameter != 'noblend':
+
+            flux_keys.append(self.model.blend_flux_parameter + '_' + telescope.name)
+
+        return [fit_parameters_keys.index(key) for key in flux_keys if key in
+                fit_parameters_keys]
+
+    def residuals_Jacobian_sparsity(self):
+        """
+        The sparsity structure of the residuals Jacobian: the model parameters
+        affect all the residuals, the fluxes of a telescope only its photometry
+
+        Returns
+        -------
+        sparsity : scipy.sparse.csr_matrix, (residuals,parameters) 1 for the non-zero
+        elements
+        """
+        number_of_parameters = len(self.fit_parameters)
+
+        fluxes_columns = np.concatenate(
+            [self.telescopes_fluxes_columns(telescope) for telescope in
+             self.model.event.telescopes]).astype(int)
+
+        model_columns = np.setdiff1d(np.arange(number_of_parameters), fluxes_columns)
+
+        # the (rows,columns) blocks of each dataset
+        blocks = []
+
+        if self.model.photometry:
+
+            for telescope in self.model.event.telescopes:
+
+                if telescope.lightcurve_flux is not None:
+
+                    blocks.append((len(telescope.lightcurve_flux), np.r_[
+                        model_columns, self.telescopes_fluxes_columns(telescope)]))
+
+        if self.model.astrometry:
+
+            for telescope in self.model.event.telescopes:
+
+                if telescope.astrometry is not None:
+
+                    blocks.append((2 * len(telescope.astrometry), model_columns))
+
+        rows = []
+        columns = []
+        start_row = 0
+
+        for number_of_rows, block_columns in blocks:
+
+            block_columns = np.asarray(block_columns, dtype=int)
+
+            rows.append(np.repeat(np.arange(start_row, start_row + number_of_rows),
+                                  len(block_columns)))
+            columns.append(np.tile(block_columns, number_of_rows))
+
+            start_row += number_of_rows
+
+        rows = np.concatenate(rows)
+        columns = np.concatenate(columns)
+
+        sparsity = scipy.sparse.coo_matrix(
+            (np.ones(len(rows), dtype=np.int8), (rows, columns)),
+            shape=(start_row, number_of_parameters)).tocsr()
+
+        return sparsity
+
     def photometric_residuals_Jacobian(self, fit_process_parameters):
         """
-        Given a set of parameters, estimate the Jacobian of photometric residuals
+        Given a set of parameters, estimate the Jacobian of photometric residuals.
+        The Jacobian is filled telescope by telescope into a preallocated array,
+        the fluxes columns of a telescope being only non-zero over its rows.
 
         Parameters
         ----------
@@ -1145,59 +1685,45 @@ class MLfit(object):
 
         pyLIMA_parameters = self.model.compute_pyLIMA_parameters(fit_process_parameters)
 
-        count = 0
-        for telescope in self.model.event.telescopes:
-
-            if count == 0:
+        # the model Jacobian rows are the model parameters, then fsource (and the
+        # blend flux)
+        number_of_model_parameters = len(self.model.model_dictionnary) - len(
+            self.model.telescopes_fluxes_model_parameters({}))
 
-                _jacobi = self.model.photometric_model_Jacobian(telescope,
-                                                                pyLIMA_parameters) / \
-                          telescope.lightcurve_flux['err_flux'].value
-
-            else:
+        telescopes = [telescope for telescope in self.model.event.telescopes if
+                      telescope.lightcurve_flux is not None]
 
-                _jacobi = np.c_[
-                    _jacobi, self.model.photometric_model_Jacobian(telescope,
-                                                                   pyLIMA_parameters) /
-                             telescope.lightcurve_flux['err_flux'].value]
+        flux_columns = [self.telescopes_fluxes_columns(telescope) for telescope in
+                        telescopes]
 
-            count += 1
+        number_of_points = np.sum([len(telescope.lightcurve_flux) for telescope in
+                                   telescopes])
+        number_of_columns = number_of_model_parameters + np.sum(
+            [len(columns) for columns in flux_columns])
 
-        # The objective function is : (data-model)/errors
+        jacobi = np.zeros((number_of_points, number_of_columns))
 
-        _jacobi = -_jacobi
-        # Split the fs and g derivatives in several columns correpsonding to
-        # each observatories
         start_index = 0
 
-        if self.model.blend_flux_parameter != 'noblend':
-            jacobi = _jacobi[:-2]
-            dresdfs = _jacobi[-2]
-            dresdg = _jacobi[-1]
+        for telescope, columns in zip(telescopes, flux_columns):
 
-        else:
-            jacobi = _jacobi[:-1]
+            rows = slice(start_index, start_index + len(telescope.lightcurve_flux))
 
-            dresdfs = _jacobi[-1]
-            dresdg = None
+            # The objective function is : (data-model)/errors
+            _jacobi = -self.model.photometric_model_Jacobian(
+                telescope, pyLIMA_parameters) / telescope.lightcurve_flux[
+                'err_flux'].value
 
-        for telescope in self.model.event.telescopes:
-            derivative_fs = np.zeros((len(dresdfs)))
-            index = np.arange(start_index, start_index + len(telescope.lightcurve_flux))
+            jacobi[rows, :number_of_model_parameters] = \
+                _jacobi[:number_of_model_parameters].T
 
-            if self.model.blend_flux_parameter != 'noblend':
-                derivative_g = np.zeros((len(dresdg)))
+            if len(columns) != 0:
 
-                derivative_fs[index] = dresdfs[index]
-                derivative_g[index] = dresdg[index]
-                jacobi = np.r_[jacobi, np.array([derivative_fs, derivative_g])]
-            else:
-                derivative_fs[index] = dresdfs[index]
-                jacobi = np.r_[jacobi, [derivative_fs]]
+                jacobi[rows, columns] = _jacobi[number_of_model_parameters:].T
 
-            start_index = index[-1] + 1
+            start_index = rows.stop
 
-        return jacobi.T
+        return jacobi
 
     def check_telescopes_fluxes_limits(self, telescopes_fluxes):
         """
@@ -0,0 +1,236 @@
+import sys
+import time as python_time
+
+import numpy as np
+from pyLIMA.fits.LM_fit import LMfit
+from pyLIMA.fits.ML_fit import FitException, MLfit
+from pyLIMA.fits.TRF_fit import TRFfit
+from pyLIMA.fits.execution_backends import pool_method
+from sklearn.cluster import AgglomerativeClustering
+from tqdm import tqdm
+
+MULTISTART_FITTERS = {'LM': LMfit, 'TRF': TRFfit}
+
+
+class MULTISTARTfit(MLfit):
+    """
+    Multi-start local optimization: the polish of a global exploration (e.g. the
+    DE_population of a DEfit or the GRIDS_population of a GRIDfit) from several
+    distinct basins, instead of the best model only.
+
+    The best MULTISTART_elites individuals of the population are clustered by
+    single linkage (scikit-learn AgglomerativeClustering), in parameters
+    scaled by the fit boundaries: individuals closer than
+    MULTISTART_basin_distance are in the same basin. The best individual of each
+    of the MULTISTART_starts best basins starts a local fit (TRF or LM), and the
+    local fits run in parallel on the fit pool. The local minima are finally
+    ranked by objective, and the minima closer than MULTISTART_basin_distance to
+    a better one are dropped.
+
+    The population must come from a fit of the same model with the same
+    telescopes_fluxes_method, i.e. the columns are the fit parameters (only the
+    first len(fit_parameters) are used) and the last one is the objective.
+
+    Attributes
+    -----------
+    local_fitter : str, the local fit of each start, 'TRF' or 'LM'
+    MULTISTART_starts : int, the maximum number of local fits
+    MULTISTART_elites : int, the number of best individuals to cluster
+    MULTISTART_basin_distance : float, the single linkage distance threshold, in
+    units of the fit boundaries
+    """
+
+    def __init__(self, model, local_fitter='TRF', telescopes_fluxes_method='polyfit',
+                 loss_function='chi2', MULTISTART_starts=5, MULTISTART_elites=500,
+                 MULTISTART_basin_distance=0.05):
+        """The fit class has to be intialized with an event object."""
+
+        if local_fitter not in MULTISTART_FITTERS:
+
+            raise FitException('Unknown local_fitter ' + str(local_fitter) +
+                               ', choose between ' + str(list(MULTISTART_FITTERS)))
+
+        super().__init__(model, telescopes_fluxes_method=telescopes_fluxes_method,
+                         loss_function=loss_function)
+
+        self.local_fitter = local_fitter
+        self.MULTISTART_starts = MULTISTART_starts
+        self.MULTISTART_elites = MULTISTART_elites
+        self.MULTISTART_basin_distance = MULTISTART_basin_distance
+
+    def fit_type(self):
+        return "Multi-start local optimization"
+
+    def scaled_parameters(self, parameters):
+        """
+        Scale parameters by the fit boundaries, i.e. 0 and 1 at the boundaries
+
+        Parameters
+        ----------
+        parameters : array, the (population,parameters) fit parameters
+
+        Returns
+        -------
+        scaled : array, the scaled parameters
+        """
+        bounds = self.fit_parameters_bounds()
+
+        return (parameters - bounds[0]) / (bounds[1] - bounds[0])
+
+    def basins_starts(self, population):
+        """
+        Find the starts of the local fits, i.e. the best individual of the
+        MULTISTART_starts best basins of the population
+
+        Parameters
+        ----------
+        population : array, the (...,parameters+1) population, the last column being
+        the objective
+
+        Returns
+        -------
+        starts : array, the (starts,parameters+1) starts, best first
+        """
+        number_of_parameters = len(self.fit_parameters)
+
+        population = np.asarray(population, dtype=float)
+        population = population.reshape(-1, population.shape[-1])
+
+        if population.shape[1] < number_of_parameters + 1:
+
+            raise FitException('The population needs the ' +
+                               str(list(self.fit_parameters.keys())) +
+                               ' columns and the objective')
+
+        population = np.c_[population[:, :number_of_parameters], population[:, -1]]
+
+        population = population[np.isfinite(population[:, -1])]
+
+        if len(population) == 0:
+
+            raise FitException('The population has no finite objective')
+
+        population = np.unique(population, axis=0)
+        elites = population[population[:, -1].argsort()][:self.MULTISTART_elites]
+
+        if len(elites) == 1:
+
+            return elites
+
+        clustering = AgglomerativeClustering(
+            n_clusters=None, distance_threshold=self.MULTISTART_basin_distance,
+            linkage='single')
+        basins = clustering.fit_predict(self.scaled_parameters(elites[:, :-1]))
+
+        # the elites are sorted, so the first individual of a basin is its best
+        basins_best = np.sort(np.unique(basins, return_index=True)[1])
+
+        return elites[basins_best[:self.MULTISTART_starts]]
+
+    def local_fit(self, start):
+        """
+        Run the local fit from a start
+
+        Parameters
+        ----------
+        start : array, the start fit parameters
+
+        Returns
+        -------
+        local_minimum : array, the best fit parameters followed by the objective
+        """
+        fitter = MULTISTART_FITTERS[self.local_fitter](
+            self.model, telescopes_fluxes_method=self.telescopes_fluxes_method,
+            loss_function=self.loss_function)
+
+        for key in self.fit_parameters.keys():
+            fitter.fit_parameters[key][1] = self.fit_parameters[key][1]
+
+        bounds = self.fit_parameters_bounds()
+        guess = np.clip(start, bounds[0], bounds[1]).tolist()
+
+        number_of_fluxes = 0
+
+        if self.telescopes_fluxes_method == 'fit':
+
+            number_of_fluxes = len(self.model.telescopes_fluxes_model_parameters({}))
+
+        number_of_model_parameters = len(guess) - number_of_fluxes
+
+        fitter.model_parameters_guess = guess[:number_of_model_parameters]
+        fitter.telescopes_fluxes_parameters_guess = guess[number_of_model_parameters:]
+
+        fitter.fit()
+
+        fit_results = fitter.fit_results
+
+        # LMfit stores its objective as the chi2
+        objective = fit_results.get(self.loss_function, fit_results.get('chi2'))
+
+        return np.r_[fit_results['best_model'], objective]
+
+    def distinct_minima(self, local_minima):
+        """
+        Rank the local minima, and drop the ones closer than
+        MULTISTART_basin_distance to a better one
+
+        Parameters
+        ----------
+        local_minima : array, the (starts,parameters+1) local minima
+
+        Returns
+        -------
+        indexes : array, the indexes of the distinct local minima, best first
+        """
+        ranking = local_minima[:, -1].argsort()
+        scaled = self.scaled_parameters(local_minima[:, :len(self.fit_parameters)])
+
+        indexes = []
+
+        for index in ranking:
+
+            distances = np.sqrt(np.sum((scaled[indexes] - scaled[index]) ** 2,
+                                       axis=1))
+
+            if np.all(distances > self.MULTISTART_basin_distance):
+
+                indexes.append(index)
+
+        return np.array(indexes)
+
+    def fit(self, population, computational_pool=None):
+
+        start_time = python_time.time()
+        self.clear_objective_cache()
+
+        starts = self.basins_starts(population)
+
+        with self.execution_pool(computational_pool) as pool:
+
+            if pool is not None:
+
+                local_minima = pool.map(pool_method(pool, self, 'local_fit'),
+                                        list(starts[:, :-1]))
+
+            else:
+
+                local_minima = [self.local_fit(start) for start in
+                                tqdm(starts[:, :-1])]
+
+        local_minima = np.array(local_minima)
+        distinct = self.distinct_minima(local_minima)
+
+        local_minima = local_minima[distinct]
+        starts = starts[distinct]
+
+        computation_time = python_time.time() - start_time
+        print(sys._getframe().f_code.co_name, ' : ' + self.fit_type() + ' fit SUCCESS')
+
+        print('best_model:', local_minima[0, :-1], self.loss_function,
+              local_minima[0, -1])
+
+        self.fit_results = {'best_model': local_minima[0, :-1],
+                            self.loss_function: local_minima[0, -1],
+                            'fit_time': computation_time,
+                            'MULTISTART_minima': local_minima,
+                            'MULTISTART_starts': starts}
@@ -76,6 +76,7 @@ class NGSA2fit(MLfit):
     def fit(self, computational_pool=None):
 
         # starting_time = python_time.time()
+        self.clear_objective_cache()
 
         from pymoo.algorithms.moo.nsga2 import NSGA2
 
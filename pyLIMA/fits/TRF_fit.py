@@ -2,18 +2,42 @@ import time as python_time
 
 import numpy as np
 import scipy
+import scipy.sparse
 from pyLIMA.fits.LM_fit import LMfit
 
 
 class TRFfit(LMfit):
+    """
+    Trust Region Reflective fit, i.e. a LMfit within the parameters boundaries
+
+    Attributes
+    -----------
+    sparse_Jacobian : bool, give the sparsity structure of the residuals Jacobian
+    (see MLfit.residuals_Jacobian_sparsity) to the finite differences with fitted
+    fluxes. scipy then solves the trust region subproblems with 'lsmr' instead
+    of 'exact', which is faster for many telescopes but converges differently.
+    """
+    def __init__(self, model, telescopes_fluxes_method='fit', loss_function='chi2',
+                 numerical_Jacobian='2-point', finite_differences_steps=None,
+                 relative_step=np.finfo(float).eps ** 0.5, sparse_Jacobian=False):
+        """The fit class has to be intialized with an event object."""
+
+        super().__init__(model, telescopes_fluxes_method=telescopes_fluxes_method,
+                         loss_function=loss_function,
+                         numerical_Jacobian=numerical_Jacobian,
+                         finite_differences_steps=finite_differences_steps,
+                         relative_step=relative_step)
+
+        self.sparse_Jacobian = sparse_Jacobian
 
     def fit_type(self):
 
         return "Trust Region Reflective"
 
-    def fit(self):
+    def fit(self, computational_pool=None):
 
         starting_time = python_time.time()
+        self.clear_objective_cache()
 
         # use the analytical Jacobian (faster) if no second order are present,
         # else let the
@@ -36,14 +60,6 @@ class TRFfit(LMfit):
         for telescope in self.model.event.telescopes:
             n_data = n_data + telescope.n_data('flux')
 
-        if self.model.Jacobian_flag != 'Numerical':
-
-            jacobian_function = self.residuals_Jacobian
-
-        else:
-
-            jacobian_function = '2-point'
-
         if self.loss_function == 'soft_l1':
 
             loss = 'soft_l1'
@@ -53,25 +69,55 @@ class TRFfit(LMfit):
 
             loss = 'linear'
 
-        trf_fit = scipy.optimize.least_squares(self.objective_function, self.guess,
-                                               method='trf',
-                                               bounds=(bounds_min, bounds_max),
-                                               max_nfev=50000, jac=jacobian_function,
-                                               loss=loss, xtol=10**-10, ftol=10**-10,
-                                               gtol=10**-10,
-                                               x_scale=scaling)
+        with self.execution_pool(computational_pool) as pool:
+
+            jacobian_function = self.define_Jacobian_function(pool)
+
+            # scipy perturbs the fluxes of all telescopes at once
+            if self.sparse_Jacobian & (jacobian_function == '2-point') & (
+                    self.telescopes_fluxes_method == 'fit'):
+
+                jacobian_sparsity = self.residuals_Jacobian_sparsity()
+
+            else:
+
+                jacobian_sparsity = None
+
+            trf_fit = scipy.optimize.least_squares(self.cached_objective_function,
+                                                   self.guess, method='trf',
+                                                   bounds=(bounds_min, bounds_max),
+                                                   max_nfev=50000,
+                                                   jac=jacobian_function,
+                                                   jac_sparsity=jacobian_sparsity,
+                                                   loss=loss,
+                                                   xtol=10**-10, ftol=10**-10,
+                                                   gtol=10**-10,
+                                                   x_scale=scaling)
         fit_results = trf_fit['x'].tolist()
         fit_chi2 = trf_fit['cost'] * 2  # chi2
 
-        try:
-            # Try to extract the covariance matrix from the levenberg-marquard_fit
-            # output
-            covariance_matrix = np.linalg.pinv(np.dot(trf_fit['jac'].T, trf_fit['jac']))
+        if self.telescopes_fluxes_method != 'fit':
+
+            fit_results, covariance_matrix = self.variable_projection_solution(
+                trf_fit['x'])
+
+        else:
+
+            try:
+                # Try to extract the covariance matrix from the levenberg-marquard_fit
+                # output
+                jacobian = trf_fit['jac']
+
+                if scipy.sparse.issparse(jacobian):
+
+                    jacobian = jacobian.toarray()
+
+                covariance_matrix = np.linalg.pinv(np.dot(jacobian.T, jacobian))
 
-        except ValueError:
+            except ValueError:
 
-            covariance_matrix = np.zeros((len(self.fit_parameters),
-                                          len(self.fit_parameters)))
+                covariance_matrix = np.zeros((len(self.fit_parameters),
+                                              len(self.fit_parameters)))
 
         covariance_matrix *= fit_chi2 / (n_data - len(self.model.model_dictionnary))
         computation_time = python_time.time() - starting_time
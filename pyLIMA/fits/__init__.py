@@ -7,6 +7,7 @@ from .LM_fit import LMfit
 from .TRF_fit import TRFfit
 from .MCMC_fit import MCMCfit
 from .MINIMIZE_fit import MINIMIZEfit
+from .MULTISTART_fit import MULTISTARTfit
 
 import numpy as np
 #if int(np.__version__[0]) >= 2:
@@ -25,4 +26,4 @@ else:
     from .NGSA2_fit import NGSA2fit
 
 __all__ = ["BOOTSTRAPfit", "DEMCfit", "DEfit", "DREAMfit", "GRIDfit", "LMfit",
-           "MCMCfit", "MINIMIZEfit",  "TRFfit", "NGSA2fit"]
+           "MCMCfit", "MINIMIZEfit", "MULTISTARTfit", "TRFfit", "NGSA2fit"]
@@ -0,0 +1,296 @@
+import concurrent.futures
+import contextlib
+import multiprocessing
+import multiprocessing.pool
+import sys
+
+from pyLIMA.toolbox import shared_arrays
+
+EXECUTION_BACKENDS = ['serial', 'thread', 'process', 'MPI']
+
+# the instance (i.e. the fit) cached by each worker of a 'process' pool
+WORKER_CACHE = {'instance': None}
+
+
+def initialize_worker(instance):
+    """
+    Cache an instance in the worker globals, see WorkerMethod
+
+    Parameters
+    ----------
+    instance : object, the instance to cache
+    """
+    WORKER_CACHE['instance'] = instance
+
+
+class WorkerMethod(object):
+    """
+    A method of an instance cached by the pool workers (see initialize_worker). Only
+    the method name is pickled, so the tasks sent to the workers only contain the
+    method name and its arguments, e.g. a parameters vector.
+
+    Attributes
+    ----------
+    instance : object, the instance, None once unpickled in a worker
+    method_name : str, the method name
+    """
+
+    def __init__(self, instance, method_name):
+
+        self.instance = instance
+        self.method_name = method_name
+
+    def __getstate__(self):
+
+        return {'instance': None, 'method_name': self.method_name}
+
+    def __call__(self, *args, **kwargs):
+
+        instance = self.instance
+
+        if instance is None:
+
+            instance = WORKER_CACHE['instance']
+
+        return getattr(instance, self.method_name)(*args, **kwargs)
+
+
+def pool_method(pool, instance, method_name):
+    """
+    The method of an instance to be mapped by a pool. If the pool workers cached
+    the instance (see open_pool), a WorkerMethod is returned, otherwise the bound
+    method, that is pickled with the whole instance for each task.
+
+    Parameters
+    ----------
+    pool : object, the pool, or None
+    instance : object, the instance
+    method_name : str, the method name
+
+    Returns
+    -------
+    method : callable, the method
+    """
+    if (pool is not None) and (getattr(pool, 'worker_instance', None) is instance):
+
+        return WorkerMethod(instance, method_name)
+
+    return getattr(instance, method_name)
+
+
+class StarCall(object):
+    """
+    Call a function with unpacked arguments, i.e. a picklable lambda args: f(*args)
+
+    Attributes
+    ----------
+    function : callable, the function to call
+    """
+
+    def __init__(self, function):
+
+        self.function = function
+
+    def __call__(self, arguments):
+
+        return self.function(*arguments)
+
+
+class MapPool(object):
+    """
+    Give the pool interface used by the fits (map, starmap and imap_unordered) to
+    any object with a map method, e.g. a concurrent.futures executor or a schwimmbad pool
+
+    Attributes
+    ----------
+    executor : object, the wrapped executor
+    """
+
+    def __init__(self, executor):
+
+        self.executor = executor
+
+    def map(self, function, iterable):
+
+        return list(self.executor.map(function, iterable))
+
+    def starmap(self, function, iterable):
+
+        return self.map(StarCall(function), iterable)
+
+    def imap_unordered(self, function, iterable):
+
+        return self.executor.map(function, iterable)
+
+
+def runs_in_process(execution_backend):
+    """
+    Check if the tasks of an execution backend run in the current process, i.e.
+    if they can append the fit trials to a normal list
+
+    Parameters
+    ----------
+    execution_backend : str or object, one of EXECUTION_BACKENDS or a pool
+
+    Returns
+    -------
+    in_process : bool, True for the serial and thread backends
+    """
+    if isinstance(execution_backend, str):
+
+        return execution_backend in ['serial', 'thread']
+
+    return isinstance(execution_backend, (multiprocessing.pool.ThreadPool,
+                                          concurrent.futures.ThreadPoolExecutor))
+
+
+def process_pool(worker_instance, number_of_workers=None):
+    """
+    A multiprocessing pool whose workers receive worker_instance once, when they
+    start, and cache it (see pool_method). The workers keep the instance as it
+    was when the pool was created. The pool is not closed by the fits, so it can
+    be reused by several fits of the instance: close it once done.
+
+    Parameters
+    ----------
+    worker_instance : object, the instance (i.e. the fit) to cache in the workers
+    number_of_workers : int, the number of processes, None uses os.cpu_count()
+
+    Returns
+    -------
+    pool : object, a multiprocessing.Pool
+    """
+    pool = multiprocessing.Pool(number_of_workers, initializer=initialize_worker,
+                                initargs=(worker_instance,))
+    pool.worker_instance = worker_instance
+
+    return pool
+
+
+def check_execution_backend(execution_backend):
+    """
+    Check that the execution backend is known
+
+    Parameters
+    ----------
+    execution_backend : str, one of EXECUTION_BACKENDS
+    """
+    if execution_backend not in EXECUTION_BACKENDS:
+
+        raise ValueError('Unknown execution backend ' + str(execution_backend) +
+                         ', choose between ' + str(EXECUTION_BACKENDS))
+
+
+@contextlib.contextmanager
+def open_pool(execution_backend='serial', number_of_workers=None,
+              worker_instance=None, shared_model=None):
+    """
+    Open the pool of a fit, and close it at the end of the fit. A user-supplied
+    pool or executor is used as is and is not closed.
+
+    With the 'process' backend, worker_instance is sent once to each worker when
+    it starts and cached there (see pool_method). The 'MPI' backend requires
+    schwimmbad and mpi4py: only the master process runs the fit, the other
+    processes wait for tasks and exit with the pool.
+
+    With the 'process' backend and a shared_model, the telescopes arrays and the
+    model parallax basis are moved into shared memory for the lifetime of the
+    pool, and the workers attach them instead of holding a copy (see
+    shared_arrays.shared_model).
+
+    Parameters
+    ----------
+    execution_backend : str or object, one of EXECUTION_BACKENDS or an object with
+    a map method (multiprocessing pool, concurrent.futures executor...)
+    number_of_workers : int, the number of threads or processes, None uses
+    os.cpu_count()
+    worker_instance : object, the instance (i.e. the fit) to cache in the workers
+    shared_model : object, a model to share with the workers of a 'process' pool
+
+    Yields
+    ------
+    pool : object, an object with map and starmap methods, None for 'serial'
+    """
+    if not isinstance(execution_backend, str):
+
+        if hasattr(execution_backend, 'starmap'):
+
+            yield execution_backend
+
+        else:
+
+            yield MapPool(execution_backend)
+
+        return
+
+    check_execution_backend(execution_backend)
+
+    if execution_backend == 'serial':
+
+        yield None
+
+        return
+
+    if (execution_backend == 'process') and (shared_model is not None):
+
+        with shared_arrays.shared_model(shared_model):
+
+            with open_pool(execution_backend, number_of_workers,
+                           worker_instance=worker_instance) as pool:
+
+                yield pool
+
+        return
+
+    if execution_backend == 'thread':
+
+        pool = multiprocessing.pool.ThreadPool(number_of_workers)
+
+    elif execution_backend == 'process':
+
+        if worker_instance is None:
+
+            pool = multiprocessing.Pool(number_of_workers)
+            pool.worker_instance = None
+
+        else:
+
+            pool = process_pool(worker_instance, number_of_workers)
+
+    else:
+
+        from schwimmbad import MPIPool
+
+        pool = MPIPool()
+
+        if not pool.is_master():
+
+            pool.wait()
+            sys.exit(0)
+
+        pool = MapPool(pool)
+
+    if isinstance(pool, MapPool):
+
+        try:
+
+            yield pool
+
+        finally:
+
+            pool.executor.close()
+
+        return
+
+    try:
+
+        yield pool
+
+    except BaseException:
+
+        pool.terminate()
+
+        raise
+
+    pool.close()
+    pool.join()
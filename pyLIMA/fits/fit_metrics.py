@@ -3,30 +3,88 @@ from emcee import autocorr
 
 
 def Gelman_Rubin(chain):
-    W = np.mean(np.var(chain, axis=0), axis=0)
+    """
+    The Gelman-Rubin potential scale reduction factor.
+    See https://ui.adsabs.harvard.edu/abs/1992StaSc...7..457G/abstract
+
+    Parameters
+    ----------
+    chain : array, (links,walkers,parameters) the MCMC chains
+
+    Returns
+    -------
+    GR : array, the R-hat of each parameter
+    """
+    number_of_links = chain.shape[0]
+    number_of_chains = chain.shape[1]
+
+    W = np.mean(np.var(chain, axis=0, ddof=1), axis=0)
     theta_B = np.mean(chain, axis=0)
     theta_BB = np.mean(theta_B, axis=0)
-    B = chain.shape[0] / (chain.shape[1] - 1) * np.sum((theta_B - theta_BB) ** 2,
-                                                       axis=0)
-    var_theta = (1 - 1 / chain.shape[1]) * W + 1 / chain.shape[1] * B
+    B = number_of_links / (number_of_chains - 1) * np.sum((theta_B - theta_BB) ** 2,
+                                                          axis=0)
+    var_theta = (1 - 1 / number_of_links) * W + 1 / number_of_links * B
     GR = (var_theta / W) ** 0.5
     return GR
 
 
 def split_R(chain):
-    """https://arxiv.org/pdf/1903.08008.pdf"""
+    """
+    The split R-hat, i.e. the Gelman-Rubin statistic with each chain split in two
+    halves. See https://arxiv.org/pdf/1903.08008.pdf
 
-    W = np.mean(np.var(chain, axis=0), axis=0)
-    theta_B = np.mean(chain, axis=0)
-    theta_BB = np.mean(theta_B, axis=0)
-    B = chain.shape[0] / (chain.shape[1] - 1) * np.sum((theta_B - theta_BB) ** 2,
-                                                       axis=0)
-    var_theta = (1 - 1 / chain.shape[1]) * W + 1 / chain.shape[1] * B
-    GR = (var_theta / W) ** 0.5
-    return GR
+    Parameters
+    ----------
+    chain : array, (links,walkers,parameters) the MCMC chains
+
+    Returns
+    -------
+    split_R : array, the split R-hat of each parameter
+    """
+    half = chain.shape[0] // 2
+
+    split_chain = np.concatenate([chain[:half], chain[half:2 * half]], axis=1)
 
+    return Gelman_Rubin(split_chain)
 
-def autocorrelation_time(chain):
-    tau = autocorr.integrated_time(chain)
+
+def autocorrelation_time(chain, tol=50):
+    """
+    The integrated autocorrelation time, see emcee.autocorr.integrated_time
+
+    Parameters
+    ----------
+    chain : array, (links,walkers,parameters) the MCMC chains
+    tol : float, the minimum number of autocorrelation times needed to trust the
+    estimate, emcee raises an AutocorrError below. 0 always returns the estimate
+
+    Returns
+    -------
+    tau : array, the autocorrelation time of each parameter
+    """
+    tau = autocorr.integrated_time(chain, tol=tol)
 
     return tau
+
+
+def convergence_diagnostics(chain):
+    """
+    Estimate the convergence of MCMC chains
+
+    Parameters
+    ----------
+    chain : array, (links,walkers,parameters) the MCMC chains
+
+    Returns
+    -------
+    diagnostics : dict, the autocorrelation_time and the split R_hat of each
+    parameter, and the effective_sample_size of the worst mixed parameter
+    """
+    tau = autocorrelation_time(chain, tol=0)
+    effective_sample_size = chain.shape[0] * chain.shape[1] / np.max(tau)
+
+    diagnostics = {'autocorrelation_time': tau,
+                   'effective_sample_size': effective_sample_size,
+                   'R_hat': split_R(chain)}
+
+    return diagnostics
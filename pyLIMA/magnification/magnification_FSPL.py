@@ -34,30 +34,27 @@ interpol_db1 = interpolate.interp1d(zz, dB1, kind='linear')
 YOO_TABLE = [zz, interpol_b0, interpol_b1, interpol_db0, interpol_db1]
 
 
-def magnification_FSPL_Yoo(tau, beta, rho, gamma, return_impact_parameter=False):
+def magnification_FSPL_Yoo_impact_parameter(impact_parameter, rho, gamma,
+                                             derivatives=False):
     """
-    The Yoo et al. Finite Source Point Lens magnification.
+    The Yoo et al. Finite Source Point Lens magnification of given impact
+    parameters, and optionally its derivatives relative to the impact parameter
+    and rho, with the same PSPL, Witt&Mao and Yoo regimes.
     See  http://adsabs.harvard.edu/abs/2004ApJ...603..139Y
 
     Parameters
     ----------
-    tau : array, (t-t0)/tE
-    beta : array, [u0]*len(t)
+    impact_parameter : array, u(t)
     rho : float, the normalized angular source radius
     gamma : float, the linear microlensing limb darkening coefficient.
-    return_impact_parameter : bool, if the impact parameter is needed or not
+    derivatives : bool, if the derivatives are needed or not
 
     Returns
     -------
     magnification_FSPL : array, A(t) for FSPL
-    impact_parameter : array, u(t)
+    dAdu : array, dA(t)/du, if derivatives
+    dAdrho : array, dA(t)/drho, if derivatives
     """
-
-    import pyLIMA.magnification.impact_parameter
-
-    impact_parameter = pyLIMA.magnification.impact_parameter.impact_parameter(tau,
-                                                                              beta)  #
-    # u(t)
     impact_parameter_square = impact_parameter ** 2  # u(t)^2
 
     magnification_pspl = (impact_parameter_square + 2) / (
@@ -65,26 +62,69 @@ def magnification_FSPL_Yoo(tau, beta, rho, gamma, return_impact_parameter=False)
 
     z_yoo = impact_parameter / rho
 
-    magnification_fspl = np.zeros(len(magnification_pspl))
-
-    # Far from the lens (z_yoo>>1), then PSPL.
-    indexes_PSPL = np.where((z_yoo > YOO_TABLE[0][-1]))[0]
-
-    magnification_fspl[indexes_PSPL] = magnification_pspl[indexes_PSPL]
+    # the finite source factor B0-gamma*B1 and its derivative relative to z_yoo
+    factor = np.ones(len(magnification_pspl))
+    dfactor_dz = np.zeros(len(magnification_pspl))
 
     # Very close to the lens (z_yoo<<1), then Witt&Mao limit.
     indexes_WM = np.where((z_yoo < YOO_TABLE[0][0]))[0]
 
-    magnification_fspl[indexes_WM] = magnification_pspl[indexes_WM] * (
-            2 * z_yoo[indexes_WM] - gamma *
-            (2 - 3 * np.pi / 4) * z_yoo[indexes_WM])
+    witt_mao = 2 - gamma * (2 - 3 * np.pi / 4)
+
+    factor[indexes_WM] = witt_mao * z_yoo[indexes_WM]
+    dfactor_dz[indexes_WM] = witt_mao
 
     # FSPL regime (z_yoo~1), then Yoo et al derivatives
     indexes_FSPL = np.where((z_yoo <= YOO_TABLE[0][-1]) & (z_yoo >= YOO_TABLE[0][0]))[0]
 
-    magnification_fspl[indexes_FSPL] = magnification_pspl[indexes_FSPL] * (
-            YOO_TABLE[1](z_yoo[indexes_FSPL]) -
-            gamma * YOO_TABLE[2](z_yoo[indexes_FSPL]))
+    z_fspl = z_yoo[indexes_FSPL]
+
+    factor[indexes_FSPL] = YOO_TABLE[1](z_fspl) - gamma * YOO_TABLE[2](z_fspl)
+
+    # Far from the lens (z_yoo>>1), then PSPL, i.e. a factor of 1.
+    magnification_fspl = magnification_pspl * factor
+
+    if not derivatives:
+
+        return magnification_fspl
+
+    dfactor_dz[indexes_FSPL] = YOO_TABLE[3](z_fspl) - gamma * YOO_TABLE[4](z_fspl)
+
+    dmagnification_pspl_du = (-8) / (
+            impact_parameter_square * (impact_parameter_square + 4) ** 1.5)
+
+    dAdu = dmagnification_pspl_du * factor + magnification_pspl * dfactor_dz / rho
+    dAdrho = -magnification_pspl * impact_parameter / rho ** 2 * dfactor_dz
+
+    return magnification_fspl, dAdu, dAdrho
+
+
+def magnification_FSPL_Yoo(tau, beta, rho, gamma, return_impact_parameter=False):
+    """
+    The Yoo et al. Finite Source Point Lens magnification.
+    See  http://adsabs.harvard.edu/abs/2004ApJ...603..139Y
+
+    Parameters
+    ----------
+    tau : array, (t-t0)/tE
+    beta : array, [u0]*len(t)
+    rho : float, the normalized angular source radius
+    gamma : float, the linear microlensing limb darkening coefficient.
+    return_impact_parameter : bool, if the impact parameter is needed or not
+
+    Returns
+    -------
+    magnification_FSPL : array, A(t) for FSPL
+    impact_parameter : array, u(t)
+    """
+
+    import pyLIMA.magnification.impact_parameter
+
+    impact_parameter = pyLIMA.magnification.impact_parameter.impact_parameter(tau,
+                                                                              beta)  #
+    # u(t)
+    magnification_fspl = magnification_FSPL_Yoo_impact_parameter(impact_parameter,
+                                                                  rho, gamma)
 
     if return_impact_parameter:
 
@@ -95,3 +135,34 @@ def magnification_FSPL_Yoo(tau, beta, rho, gamma, return_impact_parameter=False)
 
         # return magnification
         return magnification_fspl
+
+
+def magnification_FSPL_Yoo_Jacobian(tau, beta, rho, gamma):
+    """
+    The Yoo et al. Finite Source Point Lens magnification and its derivatives
+    relative to the impact parameter and rho, see
+    magnification_FSPL_Yoo_impact_parameter
+
+    Parameters
+    ----------
+    tau : array, (t-t0)/tE
+    beta : array, [u0]*len(t)
+    rho : float, the normalized angular source radius
+    gamma : float, the linear microlensing limb darkening coefficient.
+
+    Returns
+    -------
+    magnification_FSPL : array, A(t) for FSPL
+    impact_parameter : array, u(t)
+    dAdu : array, dA(t)/du
+    dAdrho : array, dA(t)/drho
+    """
+    import pyLIMA.magnification.impact_parameter
+
+    impact_parameter = pyLIMA.magnification.impact_parameter.impact_parameter(tau,
+                                                                              beta)
+
+    magnification_fspl, dAdu, dAdrho = magnification_FSPL_Yoo_impact_parameter(
+        impact_parameter, rho, gamma, derivatives=True)
+
+    return magnification_fspl, impact_parameter, dAdu, dAdrho
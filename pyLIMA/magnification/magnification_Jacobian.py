@@ -2,130 +2,154 @@ import numpy as np
 from scipy.optimize._numdiff import approx_derivative
 
 
-def magnification_PSPL_Jacobian(pspl_model, telescope, pyLIMA_parameters):
+def point_lens_trajectory_Jacobian(point_lens_model, telescope, pyLIMA_parameters):
     """
-    The Jacobian of the PSPL magnification, i.e. [dA(t)/dt0, dA(t)/du0,dA(t)/dtE]
+    The source trajectory of a point lens model in the lens frame, i.e. (tau,beta),
+    and its derivatives relative to the trajectory parameters, i.e. [t0,u0,tE] and
+    [piEN,piEE] with parallax (the parallax shifts are linear in piE, see
+    parallax.parallax_basis)
 
     Parameters
     ----------
-    pspl_model : object, a PSPL model object
+    point_lens_model : object, a PSPL or FSPL model object
     telescope : object, a telescope object
     pyLIMA_parameters : dict, a dictionnary containing the microlensing parameters
 
     Returns
     -------
-    magnification_jacobian : array, the magnification Jacobian
-    Amplification : array, the magnification associated
+    tau : array, the x coordinates of the source
+    beta : array, the y coordinates of the source
+    dtau : array, (N,P) the derivatives of tau
+    dbeta : array, (N,P) the derivatives of beta
     """
     time = telescope.lightcurve_flux['time'].value
 
-    # Derivative of A = (u^2+2)/(u(u^2+4)^0.5). Amplification[0] is A(t).
-    # Amplification[1] is U(t).
-    Amplification = pspl_model.model_magnification(telescope, pyLIMA_parameters,
-                                                   return_impact_parameter=True)
-    dAmplificationdU = (-8) / (
-            Amplification[1] ** 2 * (Amplification[1] ** 2 + 4) ** 1.5)
+    (source1_trajectory_x, source1_trajectory_y, _, _, _, _) = \
+        point_lens_model.sources_trajectory(telescope, pyLIMA_parameters,
+                                            data_type='photometry')
 
-    # Derivative of U = (uo^2+(t-to)^2/tE^2)^0.5
-    dUdt0 = -(time - pyLIMA_parameters['t0']) / \
-            (pyLIMA_parameters['tE'] ** 2 * Amplification[1])
-    dUdu0 = pyLIMA_parameters['u0'] / Amplification[1]
-    dUdtE = -(time - pyLIMA_parameters['t0']) ** 2 / \
-            (pyLIMA_parameters['tE'] ** 3 * Amplification[1])
+    # the source trajectory is the opposite of the lens trajectory, rotated by alpha
+    alpha = pyLIMA_parameters.get('alpha', 0)
 
-    # Derivative of the model
+    tau = -(source1_trajectory_x * np.cos(alpha) +
+            source1_trajectory_y * np.sin(alpha))
+    beta = -(-source1_trajectory_x * np.sin(alpha) +
+             source1_trajectory_y * np.cos(alpha))
 
-    dAdt0 = dAmplificationdU * dUdt0
-    dAdu0 = dAmplificationdU * dUdu0
-    dAdtE = dAmplificationdU * dUdtE
+    zeros = np.zeros(len(time))
+    ones = np.ones(len(time))
 
-    magnification_jacobian = np.array([dAdt0, dAdu0, dAdtE]).T
+    dtau = [-ones / pyLIMA_parameters['tE'], zeros,
+            -(time - pyLIMA_parameters['t0']) / pyLIMA_parameters['tE'] ** 2]
+    dbeta = [zeros, ones, zeros]
 
-    return magnification_jacobian, Amplification[0]
+    if point_lens_model.parallax_model[0] != 'None':
 
+        deltas_positions = telescope.deltas_positions['photometry']
+        basis = point_lens_model.telescope_parallax_basis(telescope, 'photometry',
+                                                          deltas_positions)
 
-def magnification_FSPL_Jacobian(fspl_model, telescope, pyLIMA_parameters):
+        dtau += [basis[0][0], basis[1][0]]
+        dbeta += [basis[0][1], basis[1][1]]
+
+    return tau, beta, np.array(dtau).T, np.array(dbeta).T
+
+
+def impact_parameter_Jacobian(tau, beta, dtau, dbeta):
     """
-    The Jacobian of the FSPL magnification, i.e. [dA(t)/dt0, dA(t)/du0,dA(t)/dtE,
-    dA(t0/drho]
+    The derivatives of the impact parameter u = (tau^2+beta^2)^0.5
 
     Parameters
     ----------
-    fspl_model : object, a FSPL model object
-    telescope : object, a telescope object
-    pyLIMA_parameters : dict, a dictionnary containing the microlensing parameters
+    tau : array, the x coordinates of the source
+    beta : array, the y coordinates of the source
+    dtau : array, (N,P) the derivatives of tau
+    dbeta : array, (N,P) the derivatives of beta
 
     Returns
     -------
-    magnification_jacobian : array, the magnification Jacobian
+    impact_parameter : array, u(t)
+    dUdp : array, (N,P) the derivatives of u(t)
     """
+    impact_parameter = (tau ** 2 + beta ** 2) ** 0.5
 
-    from pyLIMA.models import PSPL_model
-    from pyLIMA.magnification import magnification_FSPL
+    dUdp = (tau[:, None] * dtau + beta[:, None] * dbeta) / impact_parameter[:, None]
 
-    yoo_table = magnification_FSPL.YOO_TABLE.copy()
+    return impact_parameter, dUdp
 
-    time = telescope.lightcurve_flux['time'].value
 
-    fake_model = PSPL_model.PSPLmodel(fspl_model.event)
-    # Derivative of A = Yoo et al (2004) method.
-    Amplification_PSPL = fake_model.model_magnification(telescope, pyLIMA_parameters,
-                                                        return_impact_parameter=True)
+def magnification_PSPL_Jacobian(pspl_model, telescope, pyLIMA_parameters):
+    """
+    The Jacobian of the PSPL magnification, i.e. [dA(t)/dt0, dA(t)/du0,dA(t)/dtE]
+    (and [dA(t)/dpiEN,dA(t)/dpiEE] with parallax)
 
-    dAmplification_PSPLdU = (-8) / (
-            Amplification_PSPL[1] ** 2 * (Amplification_PSPL[1] ** 2 + 4) ** (1.5))
+    Parameters
+    ----------
+    pspl_model : object, a PSPL model object
+    telescope : object, a telescope object
+    pyLIMA_parameters : dict, a dictionnary containing the microlensing parameters
 
-    # z_yoo=U/rho
-    z_yoo = Amplification_PSPL[1] / pyLIMA_parameters['rho']
+    Returns
+    -------
+    magnification_jacobian : array, the magnification Jacobian
+    Amplification : array, the magnification associated
+    """
+    tau, beta, dtau, dbeta = point_lens_trajectory_Jacobian(pspl_model, telescope,
+                                                            pyLIMA_parameters)
 
-    dAdu = np.zeros(len(Amplification_PSPL[0]))
-    dAdrho = np.zeros(len(Amplification_PSPL[0]))
+    impact_parameter, dUdp = impact_parameter_Jacobian(tau, beta, dtau, dbeta)
 
-    # Far from the lens (z_yoo>>1), then PSPL.
-    ind = np.where((z_yoo > yoo_table[0][-1]))[0]
-    dAdu[ind] = dAmplification_PSPLdU[ind]
-    dAdrho[ind] = -0.0
+    # Derivative of A = (u^2+2)/(u(u^2+4)^0.5)
+    impact_parameter_square = impact_parameter ** 2
 
-    # Very close to the lens (z_yoo<<1), then Witt&Mao limit.
-    ind = np.where((z_yoo < yoo_table[0][0]))[0]
-    dAdu[ind] = dAmplification_PSPLdU[ind] * (
-            2 * z_yoo[ind] - telescope.ld_gamma * (2 - 3 * np.pi / 4) * z_yoo[ind])
+    Amplification = (impact_parameter_square + 2) / (
+            impact_parameter * (impact_parameter_square + 4) ** 0.5)
+    dAmplificationdU = (-8) / (
+            impact_parameter_square * (impact_parameter_square + 4) ** 1.5)
+
+    magnification_jacobian = dAmplificationdU[:, None] * dUdp
+
+    return magnification_jacobian, Amplification
 
-    dAdrho[ind] = -Amplification_PSPL[0][ind] * Amplification_PSPL[1][
-        ind] / pyLIMA_parameters['rho'] ** 2 * \
-                  (2 - telescope.ld_gamma * (2 - 3 * np.pi / 4))
 
-    # FSPL regime (z_yoo~1), then Yoo et al derivatives
-    ind = np.where((z_yoo <= yoo_table[0][-1]) & (z_yoo >= yoo_table[0][0]))[0]
+def magnification_FSPL_Jacobian(fspl_model, telescope, pyLIMA_parameters,
+                                return_magnification=False):
+    """
+    The Jacobian of the FSPL magnification, i.e. [dA(t)/dt0, dA(t)/du0,dA(t)/dtE,
+    dA(t0/drho] (and [dA(t)/dpiEN,dA(t)/dpiEE] with parallax). The model
+    trajectory, the impact parameter and the Yoo et al. (2004) terms are computed
+    once, for both the magnification and its derivatives.
+
+    Parameters
+    ----------
+    fspl_model : object, a FSPL model object
+    telescope : object, a telescope object
+    pyLIMA_parameters : dict, a dictionnary containing the microlensing parameters
+    return_magnification : bool, if the magnification is needed or not
 
-    dAdu[ind] = dAmplification_PSPLdU[ind] * (yoo_table[1](z_yoo[ind]) - \
-                                              telescope.ld_gamma * yoo_table[2](
-                z_yoo[ind])) + \
-                Amplification_PSPL[0][ind] * \
-                (yoo_table[3](z_yoo[ind]) - \
-                 telescope.ld_gamma * yoo_table[4](
-                            z_yoo[ind])) * 1 / pyLIMA_parameters['rho']
+    Returns
+    -------
+    magnification_jacobian : array, the magnification Jacobian
+    magnification : array, the magnification associated, if return_magnification
+    """
+    from pyLIMA.magnification import magnification_FSPL
 
-    dAdrho[ind] = -Amplification_PSPL[0][ind] * Amplification_PSPL[1][
-        ind] / pyLIMA_parameters['rho'] ** 2 * \
-                  (yoo_table[3](z_yoo[ind]) - telescope.ld_gamma * yoo_table[4](
-                      z_yoo[ind]))
+    tau, beta, dtau, dbeta = point_lens_trajectory_Jacobian(fspl_model, telescope,
+                                                            pyLIMA_parameters)
 
-    dUdt0 = -(time - pyLIMA_parameters['t0']) / (
-            pyLIMA_parameters['tE'] ** 2 * Amplification_PSPL[1])
+    magnification, impact_parameter, dAdu, dAdrho = \
+        magnification_FSPL.magnification_FSPL_Yoo_Jacobian(
+            tau, beta, pyLIMA_parameters['rho'], telescope.ld_gamma)
 
-    dUdu0 = pyLIMA_parameters['u0'] / Amplification_PSPL[1]
+    impact_parameter, dUdp = impact_parameter_Jacobian(tau, beta, dtau, dbeta)
 
-    dUdtE = -(time - pyLIMA_parameters['t0']) ** 2 / (
-            pyLIMA_parameters['tE'] ** 3 * Amplification_PSPL[1])
+    # Derivative of the model, rho is the fourth parameter
+    magnification_jacobian = dAdu[:, None] * dUdp
+    magnification_jacobian = np.insert(magnification_jacobian, 3, dAdrho, axis=1)
 
-    # Derivative of the model
-    dAdt0 = dAdu * dUdt0
-    dAdu0 = dAdu * dUdu0
-    dAdtE = dAdu * dUdtE
-    dAdrho = dAdrho
+    if return_magnification:
 
-    magnification_jacobian = np.array([dAdt0, dAdu0, dAdtE, dAdrho]).T
+        return magnification_jacobian, magnification
 
     return magnification_jacobian
 
@@ -88,8 +88,9 @@ class FSPLmodel(MLmodel):
 
         if self.Jacobian_flag == 'Analytical':
 
-            magnification_jacobian = magnification_Jacobian.magnification_FSPL_Jacobian(
-                self, telescope, pyLIMA_parameters)
+            magnification_jacobian, amplification = \
+                magnification_Jacobian.magnification_FSPL_Jacobian(
+                    self, telescope, pyLIMA_parameters, return_magnification=True)
 
         else:
 
@@ -98,8 +99,8 @@ class FSPLmodel(MLmodel):
                     self, telescope,
                     pyLIMA_parameters)
 
-        amplification = self.model_magnification(telescope, pyLIMA_parameters,
-                                                 return_impact_parameter=False)
+            amplification = self.model_magnification(telescope, pyLIMA_parameters,
+                                                     return_impact_parameter=False)
 
         return magnification_jacobian, amplification
 
@@ -7,6 +7,7 @@ import numpy as np
 import pyLIMA.parallax.parallax
 import pyLIMA.priors.parameters_boundaries
 import pyLIMA.xallarap.xallarap
+from pyLIMA.toolbox import instrumentation
 from pyLIMA.magnification import magnification_Jacobian
 from pyLIMA.models import pyLIMA_fancy_parameters
 from pyLIMA.orbitalmotion import orbital_motion
@@ -49,6 +50,10 @@ class MLmodel(object):
     the lower and upper limits of standards parameters
     origin : list [str,[float,float]], a list containing the choice of the system
     origin, the floats indicating the X,Y origin
+    parallax_basis : dict, the stacked parallax basis of all telescopes for each
+    data type (see define_parallax_basis)
+    instrumentation : object, an Instrumentation object if the model is
+    instrumented (see enable_instrumentation), None otherwise
     """
     __metaclass__ = abc.ABCMeta
 
@@ -75,6 +80,8 @@ class MLmodel(object):
         self.standard_parameters_boundaries = []
 
         self.origin = origin
+        self.parallax_basis = {}
+        self.instrumentation = None
 
         self.check_data_in_event()
         self.define_pyLIMA_standard_parameters()
@@ -152,6 +159,12 @@ class MLmodel(object):
 
         magnification_jacobian, amplification = self.model_magnification_Jacobian(
             telescope, pyLIMA_parameters)
+
+        if (self.Jacobian_flag == 'Analytical') & (self.fancy_parameters is not None):
+
+            magnification_jacobian = magnification_jacobian * \
+                self.fancy_parameters_Jacobian(pyLIMA_parameters,
+                                               magnification_jacobian.shape[1])
         # fsource, fblend = self.derive_telescope_flux(telescope, pyLIMA_parameters,
         # amplification[0])
 
@@ -328,11 +341,17 @@ class MLmodel(object):
         jack = copy.copy(self.Jacobian_flag)
 
         if self.parallax_model[0] != 'None':
-            jack = 'Numerical'
+
+            # the analytical Jacobians include the parallax, see
+            # magnification_Jacobian.point_lens_trajectory_Jacobian
+            if jack != 'Analytical':
+                jack = 'Numerical'
+
             model_dictionnary['piEN'] = len(model_dictionnary)
             model_dictionnary['piEE'] = len(model_dictionnary)
 
             self.event.compute_parallax_all_telescopes(self.parallax_model)
+            self.define_parallax_basis()
 
         if self.double_source_model[0] == 'Static':
             jack = 'Numerical'
@@ -435,7 +454,11 @@ class MLmodel(object):
 
         if self.fancy_parameters is not None:
 
-            self.Jacobian_flag = 'Numerical'
+            # the analytical Jacobians need the derivatives of the fancy transforms
+            if hasattr(self.fancy_parameters, 'log10_parameters'):
+                derivable_parameters = self.fancy_parameters.log10_parameters()
+            else:
+                derivable_parameters = []
 
             for key_parameter in self.fancy_parameters.fancy_parameters.keys():
 
@@ -445,6 +468,9 @@ class MLmodel(object):
                         key_parameter]] = self.model_dictionnary.pop(
                         key_parameter)
 
+                    if key_parameter not in derivable_parameters:
+                        self.Jacobian_flag = 'Numerical'
+
                 except KeyError:
                     print('I skip the fancy parameter ' + key_parameter + ', as it is '
                                                                           'not part '
@@ -463,6 +489,51 @@ class MLmodel(object):
 
         print(self.model_dictionnary)
 
+    def model_stages(self):
+        """
+        The instrumented methods of the model and their stage names
+
+        Returns
+        -------
+        stages : dict, {method_name : stage_name}
+        """
+        stages = instrumentation.MODEL_STAGES.copy()
+        stages['model_magnification'] += '_' + self.model_type()
+
+        return stages
+
+    def enable_instrumentation(self, model_instrumentation=None):
+        """
+        Count the calls and time spent in the parameter transform, trajectory,
+        magnification and flux solve stages of this model. Off by default, and
+        without overhead when off.
+
+        Parameters
+        ----------
+        model_instrumentation : object, an Instrumentation object to share (e.g.
+        with a fit), a new one is created if None
+
+        Returns
+        -------
+        instrumentation : object, the Instrumentation object
+        """
+        if model_instrumentation is None:
+            model_instrumentation = instrumentation.Instrumentation()
+
+        self.disable_instrumentation()
+        self.instrumentation = model_instrumentation
+        instrumentation.instrument_methods(self, self.model_stages(),
+                                           self.instrumentation)
+
+        return self.instrumentation
+
+    def disable_instrumentation(self):
+        """
+        Remove the instrumentation of this model
+        """
+        instrumentation.remove_instrumentation(self, self.model_stages())
+        self.instrumentation = None
+
     def compute_the_microlensing_model(self, telescope, pyLIMA_parameters):
         """
         Find the microlensing model for given telescope astrometry and photometry
@@ -697,6 +768,98 @@ class MLmodel(object):
 
         return pyLIMA_parameters
 
+    def compute_orbital_motion_parameters_population(self, population):
+        """
+        Compute the orbital motion parameters (Rmatrix, a_true...) of a population of
+        models with a single vectorized call, see
+        orbital_motion_3D.orbital_parameters_from_position_and_velocities_vectorized
+
+        Parameters
+        ----------
+        population : array, (M,N) the models parameters (ordered as
+        model_dictionnary)
+
+        Returns
+        -------
+        orbital_parameters : dict, a dictionnary containing the stacked Rmatrix (M,2,
+        2), a_true, eccentricity, orbital_velocity and t_periastron
+        """
+        population = np.atleast_2d(np.asarray(population, dtype=float))
+
+        parameters = collections.OrderedDict()
+
+        for ind, key_parameter in enumerate(self.model_dictionnary.keys()):
+
+            if ind < population.shape[1]:
+
+                parameters[key_parameter] = population[:, ind]
+
+        if self.fancy_parameters is not None:
+            self.fancy_to_pyLIMA_parameters(parameters)
+
+        v_para = parameters['v_para']
+        v_perp = parameters['v_perp']
+        v_radial = parameters['v_radial']
+        separation = parameters['separation']
+
+        if self.orbital_motion_model[0] == 'Circular':
+
+            v_radial = np.where(v_radial == 0, 10 ** -20, v_radial)
+            r_s = -v_para / v_radial
+            a_s = np.ones(len(v_radial))
+
+        else:
+
+            r_s = parameters['r_s']
+            a_s = parameters['a_s']
+
+        longitude_ascending_node, inclination, omega_peri, a_true, \
+            orbital_velocity, eccentricity, true_anomaly, t_periastron, x, y, z = \
+            orbital_motion_3D.orbital_parameters_from_position_and_velocities_vectorized(
+                separation, r_s, a_s, v_para, v_perp, v_radial,
+                self.orbital_motion_model[1])
+
+        Rmatrix = np.stack([x[:, :2], y[:, :2]], axis=-1)
+
+        orbital_parameters = {'Rmatrix': Rmatrix,
+                              'a_true': a_true,
+                              'eccentricity': eccentricity,
+                              'orbital_velocity': orbital_velocity,
+                              't_periastron': t_periastron}
+
+        return orbital_parameters
+
+    def fancy_parameters_Jacobian(self, pyLIMA_parameters, number_of_parameters):
+        """
+        The derivatives of the standard parameters relative to the fancy parameters
+        (see the standard_parameters_derivatives of the fancy parameters object),
+        to chain the analytical Jacobians
+
+        Parameters
+        ----------
+        pyLIMA_parameters : dict, a pyLIMA_parameters object
+        number_of_parameters : int, the number of parameters of the Jacobian
+
+        Returns
+        -------
+        derivatives : array, d(standard parameter)/d(fancy parameter) of each
+        parameter, 1 for the non-fancy parameters
+        """
+        derivatives = np.ones(number_of_parameters)
+
+        standard_derivatives = self.fancy_parameters.standard_parameters_derivatives(
+            pyLIMA_parameters)
+
+        for standard_key, fancy_key in self.fancy_parameters.fancy_parameters.items():
+
+            index = self.model_dictionnary.get(fancy_key, None)
+
+            if (index is not None) and (index < number_of_parameters):
+
+                derivatives[index] = standard_derivatives[standard_key]
+
+        return derivatives
+
     def fancy_to_pyLIMA_parameters(self, fancy_parameters):
 
         for standard_key, fancy_key in self.fancy_parameters.fancy_parameters.items():
@@ -774,7 +937,9 @@ class MLmodel(object):
 
             parallax_delta_tau, parallax_delta_beta = (
                 self.parallax_trajectory_shifts(parallax_delta_positions,
-                                                pyLIMA_parameters))
+                                                pyLIMA_parameters,
+                                                telescope=telescope,
+                                                data_type=data_type))
 
         else:
 
@@ -832,13 +997,135 @@ class MLmodel(object):
                 source2_trajectory_x, source2_trajectory_y,
                 dseparation, dalpha)
 
-    def parallax_trajectory_shifts(self, parallax_delta_positions, pyLIMA_parameters):
+    def define_parallax_basis(self):
+        """
+        Stack the parallax basis (see parallax.parallax_basis) of all telescopes,
+        for each data type. The parallax shifts of the whole event, or of a
+        population of parallax vectors, are then a single matrix product (see
+        event_parallax_shifts). The basis is valid as long as the telescopes
+        parallax_version are the stacked ones.
+        """
+        self.parallax_basis = {}
+
+        for data_type in ['photometry', 'astrometry']:
+
+            telescopes = []
+            versions = []
+            bases = []
+            slices = []
+
+            start_index = 0
+
+            for telescope in self.event.telescopes:
+
+                delta_positions = telescope.deltas_positions.get(data_type, [])
+
+                if len(delta_positions) == 0:
+
+                    continue
+
+                basis = pyLIMA.parallax.parallax.parallax_basis(delta_positions)
+                number_of_points = basis.shape[-1]
+
+                telescopes.append(telescope)
+                versions.append(telescope.parallax_version)
+                bases.append(basis)
+                slices.append(slice(start_index, start_index + number_of_points))
+
+                start_index += number_of_points
+
+            if len(bases) != 0:
+
+                stacked_basis = np.concatenate(bases, axis=-1)
+
+            else:
+
+                stacked_basis = None
+
+            self.parallax_basis[data_type] = {'basis': stacked_basis,
+                                              'telescopes': telescopes,
+                                              'versions': versions,
+                                              'telescopes_basis': bases,
+                                              'slices': slices}
+
+    def telescope_parallax_basis(self, telescope, data_type, parallax_delta_positions):
+        """
+        Find the precomputed parallax basis of a telescope, or compute it if the
+        telescope is not part of the event or if its parallax has been recomputed
+        since (i.e. a new parallax_version).
+
+        Parameters
+        ----------
+        telescope : a telescope object
+        data_type : str, 'photometry' or 'astrometry'
+        parallax_delta_positions : array, the deltas_positions of the telescope
+
+        Returns
+        -------
+        basis : array, the (2,2,N) parallax basis of the telescope
+        """
+        stacked = self.parallax_basis.get(data_type, None)
+
+        if stacked is not None:
+
+            number_of_points = np.shape(parallax_delta_positions)[-1]
+
+            for ind, tel in enumerate(stacked['telescopes']):
+
+                basis = stacked['telescopes_basis'][ind]
+
+                if (tel is telescope) & (basis.shape[-1] == number_of_points) & (
+                        stacked['versions'][ind] == telescope.parallax_version):
+
+                    return basis
+
+        basis = pyLIMA.parallax.parallax.parallax_basis(parallax_delta_positions)
+
+        return basis
+
+    def event_parallax_shifts(self, piE, data_type='photometry'):
+        """
+        Compute the parallax shifts of all telescopes with a single matrix product.
+        The shifts of telescope i are [..., self.parallax_basis[data_type][
+        'slices'][i]]
+
+        Parameters
+        ----------
+        piE : array, [piEN,piEE] or a population (M,2) of parallax vectors
+        data_type : str, 'photometry' or 'astrometry'
+
+        Returns
+        -------
+        delta_tau : array, (N) or (M,N) the stacked x shifts induced by the parallax
+        delta_beta : array, (N) or (M,N) the stacked y shifts induced by the parallax
+        """
+        stacked = self.parallax_basis[data_type]
+
+        if [telescope.parallax_version for telescope in stacked['telescopes']] != \
+                stacked['versions']:
+
+            # the telescopes parallax has been recomputed
+            self.define_parallax_basis()
+
+        basis = self.parallax_basis[data_type]['basis']
+
+        delta_tau, delta_beta = (
+            pyLIMA.parallax.parallax.compute_parallax_curvature_from_basis(piE,
+                                                                           basis))
+
+        return delta_tau, delta_beta
+
+    def parallax_trajectory_shifts(self, parallax_delta_positions, pyLIMA_parameters,
+                                   telescope=None, data_type=None):
 
         piE = np.array([pyLIMA_parameters['piEN'], pyLIMA_parameters['piEE']])
 
+        basis = self.telescope_parallax_basis(telescope, data_type,
+                                              parallax_delta_positions)
+
         parallax_delta_tau, parallax_delta_beta = (
-            pyLIMA.parallax.parallax.compute_parallax_curvature(piE,
-                                                                parallax_delta_positions))
+            pyLIMA.parallax.parallax.compute_parallax_curvature_from_basis(piE,
+                                                                           basis))
 
         return parallax_delta_tau, parallax_delta_beta
 
@@ -3,6 +3,13 @@ import numpy as np
 
 class StandardFancyParameters(object):
 
+    # the transforms of this class that are the log10 of the standard parameter,
+    # i.e. {standard_key : fancy_key}. A subclass overriding a transform declares
+    # its own LOG10_PARAMETERS (see log10_parameters)
+    LOG10_PARAMETERS = {'tE': 'log_tE', 'rho': 'log_rho',
+                        'separation': 'log_separation',
+                        'mass_ratio': 'log_mass_ratio'}
+
     def __init__(self, fancy_parameters = {'tE': 'log_tE', 'rho': 'log_rho',
                                          'separation': 'log_separation',
                                          'mass_ratio': 'log_mass_ratio'
@@ -15,6 +22,22 @@ class StandardFancyParameters(object):
 
         self.fancy_boundaries = fancy_boundaries
 
+        self.log10_standard_parameters = []
+
+        for standard_key, fancy_key in self.fancy_parameters.items():
+
+            # the declaration of the class defining the transform
+            for fancy_class in type(self).__mro__:
+
+                if standard_key in vars(fancy_class):
+
+                    declared = vars(fancy_class).get('LOG10_PARAMETERS', {})
+
+                    if declared.get(standard_key) == fancy_key:
+
+                        self.log10_standard_parameters.append(standard_key)
+
+                    break
 
     def tE(self, fancy_params):
 
@@ -49,6 +72,43 @@ class StandardFancyParameters(object):
 
         return np.log10(standard_params['mass_ratio'])
 
+    def log10_parameters(self):
+        """
+        The standard parameters whose fancy parameter is their log10, i.e. declared
+        in the LOG10_PARAMETERS of the class defining their transform. They are
+        found once, at the initialization.
+
+        Returns
+        -------
+        standard_keys : list, the standard parameters with a known derivative
+        """
+        return self.log10_standard_parameters
+
+    def standard_parameters_derivatives(self, standard_params):
+        """
+        The derivatives of the standard parameters relative to their fancy
+        parameters, i.e. d(10**x)/dx = ln(10)*10**x, for the log10 parameters only
+        (see log10_parameters)
+
+        Parameters
+        ----------
+        standard_params : dict, the standard parameters
+
+        Returns
+        -------
+        derivatives : dict, {standard_key : d(standard)/d(fancy)}
+        """
+        derivatives = {}
+
+        for standard_key in self.log10_parameters():
+
+            if standard_params.get(standard_key, None) is not None:
+
+                derivatives[standard_key] = np.log(10) * standard_params[
+                    standard_key]
+
+        return derivatives
+
 
 class StandardFancyParameters2(object):
 
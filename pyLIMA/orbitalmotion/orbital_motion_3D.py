@@ -212,6 +212,167 @@ def state_orbital_elements(separation_0, r_s, a_s, v_para, v_perp, v_radial):
     return e_0, h_0, r_0, v_0, r_norm, separation_z, a_true, GMass, orbital_velocity
 
 
+def state_orbital_elements_vectorized(separation_0, r_s, a_s, v_para, v_perp,
+                                      v_radial):
+    """
+    Vectorized version of state_orbital_elements, for a population of M
+    parameters sets.
+
+    Parameters
+    ----------
+    separation_0 : array, the binary separations at t0_om
+    r_s : array, the ratios of the radial separation s_z over the projected
+    separation s_0
+    a_s : array, the ratios of the microlesing separation over the true (unscaled)
+    semi-major axis
+    v_para : array, the rotation speeds along the s_0 axis, i.e. 1/s ds/dt
+    v_perp : array, the rotation speeds perpendicular to s_0 axis, i.e. dalpha/dt
+    v_radial : array, the rotation speeds in the z axis, i.e. 1/s ds_z/dt
+
+    Returns
+    -------
+    e_0 : array, (M,3) the eccentricity vectors
+    h_0 : array, (M,3) the specific angular momentum vectors
+    r_0 : array, (M,3) the microlensing separation vectors at time t0_om
+    v_0 : array, (M,3) the microlensing speed vectors at time t0_om
+    r_norm : array, the norms of the separation vectors
+    separation_z : array, the radial separations
+    a_true : array, the semi-major-axis
+    GMass : array, the unscaled masses
+    orbital_velocity : array, the orbital velocities of the lens
+    """
+    separation_0, r_s, a_s, v_para, v_perp, v_radial = np.broadcast_arrays(
+        *[np.atleast_1d(np.asarray(i, dtype=float)) for i in
+          (separation_0, r_s, a_s, v_para, v_perp, v_radial)])
+
+    separation_z = r_s * separation_0
+    r_0 = np.c_[separation_0, np.zeros(len(separation_0)), separation_z]
+
+    r_norm = np.sum(r_0 ** 2, axis=1) ** 0.5
+    a_true = a_s * r_norm
+
+    v_0 = r_0[:, [0]] * np.c_[v_para, v_perp, v_radial]
+
+    h_0 = np.cross(r_0, v_0)
+
+    GMass = np.sum(v_0 ** 2, axis=1) / (-1 / a_true + 2 / r_norm)
+
+    e_0 = np.cross(v_0, h_0) / GMass[:, None] - r_0 / r_norm[:, None]
+
+    orbital_velocity = (GMass / a_true ** 3) ** 0.5
+
+    return e_0, h_0, r_0, v_0, r_norm, separation_z, a_true, GMass, orbital_velocity
+
+
+def orbital_parameters_from_position_and_velocities_vectorized(separation_0, r_s,
+                                                               a_s, v_para, v_perp,
+                                                               v_radial, t0_om):
+    """
+    Vectorized version of orbital_parameters_from_position_and_velocities,
+    for a population of M parameters sets.
+
+    Parameters
+    ----------
+    separation_0 : array, the binary separations at t0_om
+    r_s : array, the ratios of the radial separation s_z over the projected
+    separation s_0
+    a_s : array, the ratios of the microlesing separation over the true (unscaled)
+    semi-major axis
+    v_para : array, the rotation speeds along the s_0 axis, i.e. 1/s ds/dt
+    v_perp : array, the rotation speeds perpendicular to s_0 axis, i.e. dalpha/dt
+    v_radial : array, the rotation speeds in the z axis, i.e. 1/s ds_z/dt
+    t0_om:  float, the time of reference of the orbital _motion model
+
+    Returns
+    -------
+    longitude_ascending_node : array
+    inclination : array
+    omega_peri : array
+    a_true : array
+    orbital_velocity : array
+    eccentricity : array
+    true_anomaly : array
+    t_periastron :  array
+    x_0 : array, (M,3) the first columns of the Rotation matrices
+    y_0 : array, (M,3) the second columns of the Rotation matrices
+    z_0 : array, (M,3) the third columns of the Rotation matrices
+    """
+    e_0, h_0, r_0, v_0, r_norm, separation_z, a_true, GMass, orbital_velocity = \
+        state_orbital_elements_vectorized(
+            separation_0, r_s, a_s, v_para, v_perp, v_radial)
+
+    separation_0 = r_0[:, 0]
+
+    eccentricity = np.sum(e_0 ** 2, axis=1) ** 0.5
+    h_norm = np.sum(h_0 ** 2, axis=1) ** 0.5
+    z_0 = h_0 / h_norm[:, None]
+
+    inclination = np.arccos(z_0[:, 2])
+
+    N = np.cross([0, 0, 1], h_0)
+    longitude_ascending_node = np.arctan2(N[:, 1], N[:, 0])
+
+    x_0 = np.zeros(z_0.shape)
+    y_0 = np.zeros(z_0.shape)
+    omega_peri = np.zeros(len(z_0))
+    true_anomaly = np.zeros(len(z_0))
+    t_periastron = np.zeros(len(z_0))
+
+    circular = np.abs(np.sum(r_0 * v_0, axis=1)) < 10 ** -10
+    keplerian = ~circular
+
+    if np.any(circular):
+
+        eccentricity[circular] = 0
+        cosw = separation_0[circular] / a_true[circular] * np.cos(
+            longitude_ascending_node[circular])
+        sinw = separation_z[circular] / np.sin(inclination[circular]) / a_true[
+            circular]
+        omega_peri[circular] = np.arctan2(sinw, cosw)
+
+        true_anomaly[circular] = omega_peri[circular]
+        t_periastron[circular] = t0_om
+
+        from scipy.spatial.transform import Rotation
+
+        Rmatrix = Rotation.from_euler("ZXZ", np.c_[-omega_peri[circular],
+                                                   -inclination[circular],
+                                                   -longitude_ascending_node[
+                                                       circular]])
+        Rmatrix = Rmatrix.as_matrix()
+
+        x_0[circular] = Rmatrix[:, 0]
+        y_0[circular] = Rmatrix[:, 1]
+        z_0[circular] = Rmatrix[:, 2]
+
+    if np.any(keplerian):
+
+        ecc = eccentricity[keplerian]
+
+        x_0[keplerian] = e_0[keplerian] / ecc[:, None]
+        y_0[keplerian] = np.cross(z_0[keplerian], x_0[keplerian])
+        r_0_norm = r_0[keplerian] / r_norm[keplerian, None]
+
+        omega_peri[keplerian] = np.arctan2(x_0[keplerian, 2], y_0[keplerian, 2])
+        cos_true_anomaly = np.sum(r_0_norm * x_0[keplerian], axis=1)
+        sin_true_anomaly = np.sum(r_0_norm * y_0[keplerian], axis=1)
+
+        true_anomaly[keplerian] = np.arctan2(sin_true_anomaly, cos_true_anomaly)
+
+        eccentric_anomaly = np.arctan2(
+            (1 - ecc ** 2) ** 0.5 * np.sin(true_anomaly[keplerian]),
+            (np.cos(true_anomaly[keplerian]) + ecc))
+
+        t_periastron[keplerian] = t0_om - \
+                                  (eccentric_anomaly - ecc * np.sin(
+                                      eccentric_anomaly)) / orbital_velocity[
+                                      keplerian] * 365.25
+
+    return longitude_ascending_node, inclination, omega_peri, a_true, \
+        orbital_velocity, eccentricity, true_anomaly, \
+        t_periastron, x_0, y_0, z_0
+
+
 def eccentric_anomaly_function(time, ellipticity, t_periastron, speed):
     """
     Solve the Kepler equation, see https://github.com/dfm/kepler.py
@@ -1,3 +1,5 @@
+import itertools
+
 import numpy as np
 from astropy import constants as astronomical_constants
 from astropy.coordinates import solar_system_ephemeris, spherical_to_cartesian
@@ -9,6 +11,9 @@ AU = astronomical_constants.au.value
 SPEED_OF_LIGHT = astronomical_constants.c.value
 EARTH_RADIUS = astronomical_constants.R_earth.value
 
+# the versions of the telescopes deltas_positions, see parallax_combination
+PARALLAX_VERSIONS = itertools.count()
+
 
 def EN_trajectory_angle(piEN, piEE):
     """
@@ -55,11 +60,64 @@ def compute_parallax_curvature(piE, delta_positions):
     return delta_tau, delta_beta
 
 
+def parallax_basis(delta_positions):
+    """
+    Compute the parallax basis of a telescope, i.e. the linear operator that
+    transforms the parallax vector into the trajectory shifts. See
+    compute_parallax_curvature.
+
+    Parameters
+    ----------
+    delta_positions : array, [d_N,d_E] the projected positions of the telescope
+
+    Returns
+    -------
+    basis : array, (2,2,N) basis[0] (basis[1]) contains the [delta_tau,delta_beta]
+    coefficients of piEN (piEE)
+    """
+    delta_North = np.asarray(delta_positions[0], dtype=float)
+    delta_East = np.asarray(delta_positions[1], dtype=float)
+
+    basis = np.array([[delta_North, delta_East],
+                      [delta_East, -delta_North]])
+
+    return basis
+
+
+def compute_parallax_curvature_from_basis(piE, basis):
+    """
+    Compute the curvature induced by the parallax from a parallax basis (see
+    parallax_basis), as a single matrix product. piE can be a single parallax
+    vector or a population of parallax vectors.
+
+    Parameters
+    ----------
+    piE : array, [piEN,piEE] the parallax vector, or (M,2) parallax vectors
+    basis : array, (2,2,N) the parallax basis
+
+    Returns
+    -------
+    delta_tau : array, (N) or (M,N) the x shift induced by the parallax
+    delta_beta : array, (N) or (M,N) the y shift induced by the parallax
+    """
+    piE = np.asarray(piE, dtype=float)
+    number_of_points = basis.shape[-1]
+
+    shifts = np.dot(piE, basis.reshape(2, 2 * number_of_points))
+    shifts = shifts.reshape(piE.shape[:-1] + (2, number_of_points))
+
+    delta_tau = shifts[..., 0, :]
+    delta_beta = shifts[..., 1, :]
+
+    return delta_tau, delta_beta
+
+
 def parallax_combination(telescope, parallax_model, North_vector, East_vector):
     """
     Compute and set the deltas_positions attributes of the telescope object inside.
     deltas_positions is the offset between the position of the observatory at the
-    time t, and the center of the Earth at the date t0_par.
+    time t, and the center of the Earth at the date t0_par. Each combination sets a
+    new telescope parallax_version.
     See https://ui.adsabs.harvard.edu/abs/2004ApJ...606..319G/abstract
 
     Parameters
@@ -115,6 +173,8 @@ def parallax_combination(telescope, parallax_model, North_vector, East_vector):
 
             telescope.deltas_positions[data_type] = deltas_position
 
+    telescope.parallax_version = next(PARALLAX_VERSIONS)
+
 
 def Earth_ephemerides(time_to_treat):
     """
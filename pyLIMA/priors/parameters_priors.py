@@ -45,6 +45,172 @@ class NormalDistribution(object):
 
         return samples
 
+class LogUniformDistribution(object):
+
+    def __init__(self, bound_min, bound_max):
+
+        self.bound_min = bound_min
+        self.bound_max = bound_max
+        self.normalisation = np.log(bound_max / bound_min)
+
+    def pdf(self, x):
+
+        if (x > self.bound_min) & (x < self.bound_max):
+
+            return 1 / (x * self.normalisation)
+
+        else:
+
+            return 0
+
+    def rvs(self, size):
+
+        sample = np.random.uniform(0, 1, size)
+        samples = self.bound_min * np.exp(sample * self.normalisation)
+
+        return samples
+
+
+class CompiledPriors(object):
+    """
+    The ln-priors of a parameters vector, evaluated with array operations instead
+    of one pdf call per parameter. The uniform, normal and log-uniform priors are
+    evaluated analytically, any other prior (i.e. an object with a pdf method)
+    with its own pdf. The parameters can be a vector or a (population,parameters)
+    array.
+
+    Attributes
+    ----------
+    priors : list, the priors of each parameter, None for no prior
+    uniform_indexes : array, the indexes of the uniform priors
+    uniform_bounds : array, (2,uniform priors) their bounds
+    uniform_ln_pdf : array, their ln-pdf inside the bounds
+    normal_indexes : array, the indexes of the normal priors
+    normal_parameters : array, (2,normal priors) their means and sigmas
+    log_uniform_indexes : array, the indexes of the log-uniform priors
+    log_uniform_bounds : array, (2,log-uniform priors) their bounds
+    log_uniform_normalisations : array, their ln(bound_max/bound_min)
+    other_priors : list, [index,prior] of the other priors
+    """
+
+    def __init__(self, priors):
+
+        self.priors = list(priors)
+
+        uniforms = []
+        normals = []
+        log_uniforms = []
+        self.other_priors = []
+
+        for index, prior in enumerate(self.priors):
+
+            if prior is None:
+
+                continue
+
+            if isinstance(prior, UniformDistribution):
+
+                uniforms.append([index, prior.bound_min, prior.bound_max,
+                                 np.log(prior.probability)])
+
+            elif isinstance(prior, NormalDistribution):
+
+                normals.append([index, prior.mean, prior.sigma])
+
+            elif isinstance(prior, LogUniformDistribution):
+
+                log_uniforms.append([index, prior.bound_min, prior.bound_max,
+                                     prior.normalisation])
+
+            else:
+
+                self.other_priors.append([index, prior])
+
+        uniforms = np.array(uniforms, dtype=float).reshape(-1, 4).T
+        normals = np.array(normals, dtype=float).reshape(-1, 3).T
+        log_uniforms = np.array(log_uniforms, dtype=float).reshape(-1, 4).T
+
+        self.uniform_indexes = uniforms[0].astype(int)
+        self.uniform_bounds = uniforms[1:3]
+        self.uniform_ln_pdf = uniforms[3]
+
+        self.normal_indexes = normals[0].astype(int)
+        self.normal_parameters = normals[1:]
+
+        self.log_uniform_indexes = log_uniforms[0].astype(int)
+        self.log_uniform_bounds = log_uniforms[1:3]
+        self.log_uniform_normalisations = log_uniforms[3]
+
+    def ln_pdf(self, parameters):
+        """
+        The ln-pdf of each parameter
+
+        Parameters
+        ----------
+        parameters : array, a parameters vector or a (population,parameters) array
+
+        Returns
+        -------
+        ln_pdf : array, the ln-pdf, with the shape of parameters (0 for the
+        parameters without prior, -np.inf outside the priors support)
+        """
+        parameters = np.asarray(parameters, dtype=float)
+        ln_pdf = np.zeros(parameters.shape)
+
+        values = parameters[..., self.uniform_indexes]
+        inside = (values > self.uniform_bounds[0]) & (values < self.uniform_bounds[1])
+        ln_pdf[..., self.uniform_indexes] = np.where(inside, self.uniform_ln_pdf,
+                                                     -np.inf)
+
+        values = parameters[..., self.normal_indexes]
+        means, sigmas = self.normal_parameters
+        ln_pdf[..., self.normal_indexes] = -0.5 * ((values - means) / sigmas) ** 2 - \
+            np.log(sigmas * np.sqrt(2 * np.pi))
+
+        values = parameters[..., self.log_uniform_indexes]
+        inside = (values > self.log_uniform_bounds[0]) & (
+                values < self.log_uniform_bounds[1])
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+
+            ln_pdf[..., self.log_uniform_indexes] = np.where(
+                inside, -np.log(values) - np.log(self.log_uniform_normalisations),
+                -np.inf)
+
+            for index, prior in self.other_priors:
+
+                values = parameters[..., index]
+                probability = np.reshape([prior.pdf(value) for value in
+                                          np.ravel(values)], values.shape)
+
+                ln_pdf[..., index] = np.where(probability > 0, np.log(probability),
+                                              -np.inf)
+
+        return ln_pdf
+
+    def ln_probability(self, parameters, penalty=None):
+        """
+        The ln-prior of a parameters vector, i.e. the sum of the ln-pdf
+
+        Parameters
+        ----------
+        parameters : array, a parameters vector or a (population,parameters) array
+        penalty : float, the ln-pdf of a parameter outside its prior support, None
+        keeps -np.inf
+
+        Returns
+        -------
+        ln_prior : float or array, the ln-prior of each parameters vector
+        """
+        ln_pdf = self.ln_pdf(parameters)
+
+        if penalty is not None:
+
+            ln_pdf[ln_pdf == -np.inf] = penalty
+
+        return np.sum(ln_pdf, axis=-1)
+
+
 def default_parameters_priors(fit_parameters):
     """
     Function to return default priors on parameters (i.e. uniform)
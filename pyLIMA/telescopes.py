@@ -39,6 +39,8 @@ class Telescope(object):
     latitutde : float, the telescope latitude in degree
     deltas_positions : array, the North and East projected into the plane of
     sky positions of a telescope relative to Earth center (see parallax)
+    parallax_version : int, a new number each time the deltas_positions are
+    computed (see parallax.parallax_combination), None before
     Earth_positions : dict, dictionnary orf array containing the XYZ positions of
     Earth at time of observations
     Earth_speeds : dict, dictionnary of array containing the XYZ speeds of
@@ -80,6 +82,7 @@ class Telescope(object):
         self.longitude = longitude  # degrees
         self.latitude = latitude  # degrees , default is somewhere...
         self.deltas_positions = {}
+        self.parallax_version = None
         self.Earth_positions = {}
         self.Earth_speeds = {}
         self.sidereal_times = {}
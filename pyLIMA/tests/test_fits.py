@@ -1,6 +1,17 @@
+import concurrent.futures
+import pickle
+
+import emcee
 import numpy as np
+import pytest
+from astropy import units as u
 import pyLIMA.fits as pyfit
 import pyLIMA.models as pymod
+from pyLIMA.fits import fit_metrics
+from pyLIMA.fits.execution_backends import WorkerMethod, pool_method
+from pyLIMA.fits.MCMC_fit import sample_until_convergence
+from pyLIMA.fits.ML_fit import FitException
+from pyLIMA.priors import parameters_priors
 
 from pyLIMA import event
 from pyLIMA import telescopes
@@ -118,6 +129,296 @@ def test_TRF():
                         2.15371948e+04,  2.23667118e+03]]), atol=0, rtol=0.001)
 
 
+def test_finite_differences_Jacobian():
+    eve = create_event()
+
+    pspl = pymod.PSPLmodel(eve)
+
+    my_fit = pyfit.TRFfit(pspl, numerical_Jacobian='pool',
+                          finite_differences_steps={'t0': 10 ** -5})
+    my_fit.model_parameters_guess = [79.93, 0.0081, 10.11]
+    parameters = np.array(my_fit.initial_guess())
+
+    residuals = my_fit.cached_objective_function(parameters)
+
+    with my_fit.execution_pool('thread') as pool:
+
+        jacobian = my_fit.residuals_finite_differences(parameters, pool)
+
+    assert jacobian.shape == (len(residuals), len(parameters))
+    assert np.allclose(jacobian, my_fit.residuals_Jacobian(parameters), rtol=10 ** -3,
+                       atol=10 ** -3 * np.abs(jacobian).max())
+
+    analytical_fit = pyfit.TRFfit(pspl)
+    analytical_fit.model_parameters_guess = [79.93, 0.0081, 10.11]
+    analytical_fit.fit()
+
+    # the perturbed models are evaluated on the fit pool
+    pspl.Jacobian_flag = 'Numerical'
+    my_fit.define_execution_backend('thread', number_of_workers=2)
+    my_fit.fit()
+
+    assert np.allclose(my_fit.fit_results['best_model'],
+                       analytical_fit.fit_results['best_model'], rtol=10 ** -4)
+
+
+def test_residuals_Jacobian_sparsity():
+    eve = create_event()
+
+    pspl = pymod.PSPLmodel(eve)
+
+    my_fit = pyfit.TRFfit(pspl)
+    my_fit.model_parameters_guess = [79.93, 0.0081, 10.11]
+    parameters = np.array(my_fit.initial_guess())
+
+    sparsity = my_fit.residuals_Jacobian_sparsity().toarray()
+    jacobian = my_fit.residuals_Jacobian(parameters)
+
+    assert sparsity.shape == jacobian.shape
+    assert np.all(jacobian[sparsity == 0] == 0)
+
+    # the fluxes of each telescope only affect its own photometry
+    number_of_points = len(eve.telescopes[0].lightcurve_flux)
+    assert np.all(sparsity[:number_of_points, [3, 4]] == 1)
+    assert np.all(sparsity[number_of_points:, [3, 4]] == 0)
+    assert np.all(sparsity[:, :3] == 1)
+
+    analytical_fit = pyfit.TRFfit(pspl)
+    analytical_fit.model_parameters_guess = [79.93, 0.0081, 10.11]
+    analytical_fit.fit()
+
+    pspl.Jacobian_flag = 'Numerical'
+
+    # by default, the finite differences keep the exact trust region solver
+    my_fit.fit()
+
+    assert my_fit.sparse_Jacobian is False
+    assert np.allclose(my_fit.fit_results['best_model'],
+                       analytical_fit.fit_results['best_model'], rtol=10 ** -4)
+
+    # finite differences with the sparsity structure, i.e. the lsmr solver, reach
+    # the same minimum
+    sparse_fit = pyfit.TRFfit(pspl, sparse_Jacobian=True)
+    sparse_fit.model_parameters_guess = [79.93, 0.0081, 10.11]
+    sparse_fit.fit()
+
+    assert np.allclose(sparse_fit.fit_results['best_model'],
+                       my_fit.fit_results['best_model'], rtol=10 ** -3)
+    assert np.allclose(sparse_fit.fit_results['chi2'], my_fit.fit_results['chi2'],
+                       rtol=10 ** -6)
+
+
+def test_variable_projection():
+    eve = create_event()
+
+    fspl = pymod.FSPLmodel(eve)
+
+    fluxes_fit = pyfit.TRFfit(fspl)
+    fluxes_fit.model_parameters_guess = [79.93, 0.0081, 10.11, 0.02]
+    fluxes_fit.fit()
+
+    my_fit = pyfit.TRFfit(fspl, telescopes_fluxes_method='polyfit')
+    my_fit.model_parameters_guess = [79.93, 0.0081, 10.11, 0.02]
+    parameters = np.array(my_fit.initial_guess())
+
+    # only the model parameters are optimized, and the Kaufman Jacobian gives the
+    # exact gradient of the chi2 with the least squares fluxes
+    residuals = my_fit.objective_function(parameters)
+    jacobian = my_fit.projected_residuals_Jacobian(parameters)
+    finite_differences = my_fit.residuals_finite_differences(parameters)
+
+    assert jacobian.shape == (len(residuals), 4)
+    assert np.allclose(jacobian.T @ residuals, finite_differences.T @ residuals,
+                       rtol=10 ** -3)
+
+    my_fit.fit()
+
+    assert len(my_fit.fit_results['best_model']) == 8
+    assert np.allclose(my_fit.fit_results['best_model'],
+                       fluxes_fit.fit_results['best_model'], rtol=10 ** -4)
+    assert np.allclose(my_fit.fit_results['chi2'], fluxes_fit.fit_results['chi2'])
+    assert np.allclose(my_fit.fit_results['covariance_matrix'],
+                       fluxes_fit.fit_results['covariance_matrix'], rtol=10 ** -2,
+                       atol=0)
+
+    lm_fit = pyfit.LMfit(fspl, telescopes_fluxes_method='polyfit')
+    lm_fit.model_parameters_guess = [79.93, 0.0081, 10.11, 0.02]
+    lm_fit.fit()
+
+    assert np.allclose(lm_fit.fit_results['best_model'],
+                       fluxes_fit.fit_results['best_model'], rtol=10 ** -4)
+
+    # the 'noblend' source flux is not the least squares one
+    noblend = pymod.FSPLmodel(eve, blend_flux_parameter='noblend')
+    noblend_fit = pyfit.LMfit(noblend, telescopes_fluxes_method='polyfit')
+
+    assert noblend_fit.define_Jacobian_function() == '2-point'
+
+    pyLIMA_parameters = noblend.compute_pyLIMA_parameters(parameters)
+    magnification = noblend.model_magnification(eve.telescopes[0], pyLIMA_parameters)
+    noblend.derive_telescope_flux(eve.telescopes[0], pyLIMA_parameters,
+                                  magnification)
+
+    assert np.allclose(pyLIMA_parameters['fsource_OGLE'], np.median(
+        eve.telescopes[0].lightcurve_flux['flux'].value / magnification))
+
+
+def test_priors_probability():
+    eve = create_event()
+
+    pspl = pymod.PSPLmodel(eve)
+
+    my_fit = pyfit.MCMCfit(pspl)
+    my_fit.priors['u0'] = parameters_priors.NormalDistribution(0.01, 0.005)
+
+    parameters = np.array([79.93, 0.0081, 10.11])
+    likelihood, pyLIMA_parameters = my_fit.model_likelihood(parameters)
+
+    # the fit parameters and the telescopes fluxes priors
+    ln_prior = np.sum([np.log(my_fit.priors[key].pdf(pyLIMA_parameters[key])) for key
+                       in my_fit.priors.keys()])
+
+    assert np.allclose(my_fit.get_priors_probability(pyLIMA_parameters), ln_prior)
+
+    ln_prior = np.sum([np.log(my_fit.priors[key].pdf(parameters[ind])) for ind, key
+                       in enumerate(my_fit.fit_parameters.keys())])
+
+    assert np.allclose(my_fit.priors_probability(np.array([parameters] * 2)),
+                       [ln_prior] * 2)
+
+    # the model is not computed outside the priors support, see
+    # test_parameters_outside_support
+    calls = []
+    compute_the_microlensing_model = pspl.compute_the_microlensing_model
+    pspl.compute_the_microlensing_model = lambda *args: calls.append(args) or \
+        compute_the_microlensing_model(*args)
+
+    my_fit.objective_function_and_fluxes(parameters)
+    number_of_calls = len(calls)
+
+    assert number_of_calls != 0
+
+    objective, fluxes = my_fit.objective_function_and_fluxes(
+        np.array([79.93, 0.0081, -10.11]))
+
+    assert len(calls) == number_of_calls
+    assert objective == np.inf
+    assert np.all(np.isnan(fluxes))
+    assert np.all(np.isnan(my_fit.trials[-1][3:-1]))
+
+
+def test_parameters_outside_support():
+    eve = create_event()
+
+    pspl = pymod.PSPLmodel(eve)
+
+    my_fit = pyfit.DREAMfit(pspl)
+    my_fit.priors['u0'] = parameters_priors.UniformDistribution(0, 0.5)
+
+    population = np.array([[79.93, 0.0081, 10.11], [79.93, -0.0081, 10.11],
+                           [79.93, 0.0081, -10.11]])
+
+    assert np.all(my_fit.parameters_outside_support(population) == [False, True,
+                                                                    True])
+
+    # the boundaries are cached with the compiled priors, until they change
+    bounds = my_fit.fit_parameters_bounds()
+
+    assert my_fit.fit_parameters_bounds() is bounds
+
+    tE_bounds = my_fit.fit_parameters['tE'][1]
+    my_fit.fit_parameters['tE'][1] = (tE_bounds[0], 9)
+
+    assert my_fit.fit_parameters_bounds()[1, 2] == 9
+    assert my_fit.parameters_outside_support(population[0])
+
+    my_fit.fit_parameters['tE'][1] = tE_bounds
+
+    calls = []
+    compute_the_microlensing_model = pspl.compute_the_microlensing_model
+    pspl.compute_the_microlensing_model = lambda *args: calls.append(args) or \
+        compute_the_microlensing_model(*args)
+
+    # the rejected individuals do not compute the model
+    objectives = my_fit.population_objectives(population)
+
+    assert np.isfinite(objectives[0])
+    assert np.all(objectives[1:] == np.inf)
+    assert len(calls) == len(eve.telescopes)
+
+    mcmc_fit = pyfit.MCMCfit(pspl)
+
+    assert mcmc_fit.objective_function(population[2]) == -np.inf
+    assert len(calls) == len(eve.telescopes)
+
+    log_probability, fluxes = mcmc_fit.objective_function_with_fluxes(population[2])
+
+    assert log_probability == -np.inf
+    assert np.all(np.isnan(fluxes))
+    assert len(fluxes) == 4
+
+
+def test_objective_cache():
+    eve = create_event()
+
+    pspl = pymod.PSPLmodel(eve)
+
+    my_fit = pyfit.MCMCfit(pspl)
+    parameters = np.array([79.93, 0.0081, 10.11])
+
+    objective, fluxes = my_fit.objective_function_and_fluxes(parameters)
+
+    calls = []
+    compute_the_microlensing_model = pspl.compute_the_microlensing_model
+    pspl.compute_the_microlensing_model = lambda *args: calls.append(args) or \
+        compute_the_microlensing_model(*args)
+
+    # the second evaluation is memoized, but still recorded
+    assert my_fit.objective_function_and_fluxes(parameters) == (objective, fluxes)
+    assert len(calls) == 0
+    assert len(my_fit.trials) == 2
+    assert my_fit.objective_cache.statistics()['hits'] == 1
+
+    # new priors, new likelihood
+    my_fit.priors['u0'] = parameters_priors.NormalDistribution(0.01, 0.005)
+
+    assert my_fit.objective_function_and_fluxes(parameters)[0] != objective
+    assert len(calls) != 0
+
+    # new extra priors, new likelihood
+    objective = my_fit.objective_function_and_fluxes(parameters)[0]
+
+    class ExtraPrior(object):
+
+        def pdf(self, pyLIMA_parameters):
+
+            return 0.5
+
+    my_fit.extra_priors = [ExtraPrior()]
+
+    assert np.allclose(my_fit.objective_function_and_fluxes(parameters)[0],
+                       objective - np.log(0.5))
+
+    my_fit.define_objective_cache(0)
+    number_of_calls = len(calls)
+    my_fit.objective_function_and_fluxes(parameters)
+
+    assert my_fit.objective_cache is None
+    assert len(calls) > number_of_calls
+
+    # the least squares residuals are memoized too
+    lm_fit = pyfit.LMfit(pspl)
+    parameters = np.array(lm_fit.initial_guess())
+    residuals = lm_fit.objective_function(parameters)
+
+    assert lm_fit.objective_function(parameters) is residuals
+
+    # each fit starts with an empty cache
+    lm_fit.fit()
+
+    assert lm_fit.objective_function(parameters) is not residuals
+
+
 def test_DE():
     eve = create_event()
 
@@ -134,6 +435,357 @@ def test_DE():
 
     assert values[3].shape == (88, 9)
 
+
+def test_initial_population_design():
+    eve = create_event()
+
+    pspl = pymod.PSPLmodel(eve)
+
+    my_fit = pyfit.DREAMfit(pspl, DEMC_population_size=2, max_iteration=1)
+
+    bounds = np.array([my_fit.fit_parameters[key][1] for key in
+                       my_fit.fit_parameters.keys()]).T
+
+    for design in ['latinhypercube', 'sobol']:
+
+        population = my_fit.initial_population_design(10, design=design)
+
+        assert population.shape == (10, 3)
+        assert np.all((population >= bounds[0]) & (population <= bounds[1]))
+
+    # latin hypercube: one individual per stratum of each parameter
+    population = my_fit.initial_population_design(10)
+    strata = np.floor((population - bounds[0]) / (bounds[1] - bounds[0]) * 10)
+
+    for index in range(3):
+
+        assert np.all(np.sort(strata[:, index]) == np.arange(10))
+
+    with pytest.raises(FitException):
+
+        my_fit.initial_population_design(10, design='grid')
+
+    # the archive is evaluated in one map of the pool
+    maps = []
+
+    class CountingPool(object):
+
+        def map(self, function, iterable):
+
+            maps.append(len(iterable))
+
+            return [function(individual) for individual in iterable]
+
+    my_fit.fit(computational_pool=CountingPool())
+
+    assert maps[0] == 3 * 5 * 6
+    assert len(my_fit.all) >= 3 * 5 * 6
+
+
+def test_DREAM():
+    eve = create_event()
+
+    pspl = pymod.PSPLmodel(eve)
+
+    my_fit = pyfit.DREAMfit(pspl, DEMC_population_size=2, max_iteration=5)
+
+    my_fit.fit()
+
+    # 6 walkers, the initial population and 5 generations
+    assert my_fit.fit_results['DEMC_population'].shape == (6, 6, 4)
+    assert my_fit.acceptance.shape == (5, 6, 3)
+
+    population = my_fit.fit_results['DEMC_population']
+
+    for index, key in enumerate(my_fit.fit_parameters.keys()):
+
+        bounds = my_fit.fit_parameters[key][1]
+
+        assert np.all((population[:, :, index] >= bounds[0]) &
+                      (population[:, :, index] <= bounds[1]))
+
+    # the objectives are the ones of the stored parameters
+    assert np.allclose(my_fit.objective_function(population[-1, 0, :-1]),
+                       population[-1, 0, -1])
+
+
+def test_GRID(tmp_path):
+    eve = create_event()
+
+    pspl = pymod.PSPLmodel(eve)
+    checkpoint = str(tmp_path / 'grid.npz')
+
+    my_fit = pyfit.GRIDfit(pspl, DE_population_size=1, max_iteration=2,
+                           fix_parameters=['u0'], grid_resolution=2,
+                           GRID_checkpoint=checkpoint)
+
+    saves = []
+    save_checkpoint = my_fit.save_checkpoint
+    my_fit.save_checkpoint = lambda *args: saves.append(args) or \
+        save_checkpoint(*args)
+
+    my_fit.fit()
+
+    population = my_fit.fit_results['GRIDS_population']
+
+    assert population.shape == (2, 4)
+    assert np.allclose(np.load(checkpoint)['cells_population'], population)
+
+    # the checkpoint is saved once, at the end of the grid
+    assert len(saves) == 1
+
+    # or every GRID_checkpoint_every cells
+    my_fit.GRID_checkpoint = str(tmp_path / 'grid_every.npz')
+    my_fit.GRID_checkpoint_every = 1
+    my_fit.fit()
+
+    assert len(saves) == 3
+
+    # all cells are in the checkpoint, nothing is refitted
+    my_fit = pyfit.GRIDfit(pspl, DE_population_size=1, max_iteration=2,
+                           fix_parameters=['u0'], grid_resolution=2,
+                           GRID_checkpoint=checkpoint)
+    my_fit.fit_grid_cell = None
+    my_fit.fit()
+
+    assert np.allclose(my_fit.fit_results['GRIDS_population'], population)
+
+    # cells are fitted in parallel
+    my_fit = pyfit.GRIDfit(pspl, DE_population_size=1, max_iteration=2,
+                           fix_parameters=['u0'], grid_resolution=2)
+    my_fit.define_execution_backend('process', number_of_workers=2)
+    my_fit.fit()
+
+    assert my_fit.fit_results['GRIDS_population'].shape == (2, 4)
+    assert np.allclose(my_fit.fit_results['GRIDS_population'][:, 1],
+                       population[:, 1])
+
+    # the best cells are refined, warm-started from the coarse grid
+    my_fit = pyfit.GRIDfit(pspl, DE_population_size=1, max_iteration=2,
+                           fix_parameters=['u0'], grid_resolution=2,
+                           GRID_refinement_levels=1, GRID_delta_chi2=0)
+    my_fit.fit()
+
+    levels = my_fit.fit_results['GRIDS_levels']
+    population = my_fit.fit_results['GRIDS_population']
+
+    assert np.allclose(levels, [0, 0, 1, 1])
+    assert population.shape == (4, 4)
+
+    coarse_best = population[:2][population[:2, -1].argmin()]
+    interval = my_fit.intervals[0]
+
+    assert np.allclose(np.abs(population[2:, 1] - coarse_best[1]), interval / 4)
+
+
+def test_BOOTSTRAP():
+    eve = create_event()
+
+    pspl = pymod.PSPLmodel(eve)
+
+    my_fit = pyfit.BOOTSTRAPfit(pspl, BOOTSTRAP_seed=42)
+    my_fit.model_parameters_guess = [79.9, 0.008, 10.1]
+
+    weights = my_fit.residuals_weights(np.random.default_rng(1))
+
+    assert len(weights) == sum([len(tel.lightcurve_flux) for tel in eve.telescopes])
+    assert np.allclose(weights, np.round(weights))
+    assert np.allclose(weights.sum(), len(weights))
+
+    my_fit.fit(number_of_samples=2)
+
+    # 3 model parameters and 2 fluxes per telescope
+    assert my_fit.fit_results['samples'].shape == (2, 7)
+
+    # the samples do not depend on the execution backend
+    samples = my_fit.fit_results['samples']
+
+    my_fit.define_execution_backend('thread', number_of_workers=2)
+    my_fit.fit(number_of_samples=2)
+
+    assert np.allclose(my_fit.fit_results['samples'], samples)
+
+    with pytest.raises(pyfit.ML_fit.FitException):
+        pyfit.BOOTSTRAPfit(pspl, telescopes_fluxes_method='polyfit')
+
+
+def test_MULTISTART():
+    eve = create_event()
+
+    pspl = pymod.PSPLmodel(eve)
+
+    my_fit = pyfit.MULTISTARTfit(pspl, MULTISTART_starts=2)
+
+    # two basins, the best individual of each starts a local fit
+    population = np.array([[79.9, 0.008, 10.1, 3.0], [79.91, 0.0081, 10.1, 1.0],
+                           [79.9, 0.0079, 10.11, 2.0], [75.0, 0.5, 50.0, 10.0],
+                           [75.1, 0.5, 50.0, 5.0], [70.0, 0.9, 90.0, np.inf]])
+
+    starts = my_fit.basins_starts(population)
+
+    assert np.allclose(starts, population[[1, 4]])
+
+    my_fit.MULTISTART_starts = 1
+
+    assert np.allclose(my_fit.basins_starts(population), population[[1]])
+
+    my_fit.MULTISTART_starts = 2
+    my_fit.fit(population)
+
+    minima = my_fit.fit_results['MULTISTART_minima']
+
+    # the model parameters, 2 fluxes per telescope and the chi2, ranked
+    assert minima.shape[1] == 8
+    assert np.all(np.diff(minima[:, -1]) >= 0)
+    assert np.allclose(my_fit.fit_results['best_model'], minima[0, :-1])
+
+    trf_fit = pyfit.TRFfit(pspl)
+    trf_fit.model_parameters_guess = [79.91, 0.0081, 10.1]
+    trf_fit.fit()
+
+    assert np.allclose(my_fit.fit_results['chi2'], trf_fit.fit_results['chi2'],
+                       rtol=10 ** -4)
+
+    # the local fits do not depend on the execution backend
+    my_fit.define_execution_backend('thread', number_of_workers=2)
+    my_fit.fit(population)
+
+    assert np.allclose(my_fit.fit_results['MULTISTART_minima'], minima)
+
+    with pytest.raises(FitException):
+        pyfit.MULTISTARTfit(pspl, local_fitter='DE')
+
+
+def test_execution_backends():
+    eve = create_event()
+
+    fspl = pymod.FSPLmodel(eve)
+
+    my_fit = pyfit.DEfit(fspl, DE_population_size=1, max_iteration=2)
+
+    with pytest.raises(ValueError):
+        my_fit.define_execution_backend('cluster')
+
+    my_fit.define_execution_backend('thread', number_of_workers=2)
+    my_fit.fit()
+
+    assert my_fit.fit_results['DE_population'].shape == (24, 9)
+
+    # a user-supplied executor is used as is, and left open
+    with concurrent.futures.ThreadPoolExecutor(2) as executor:
+
+        my_fit = pyfit.DEfit(fspl, DE_population_size=1, max_iteration=2)
+        my_fit.fit(computational_pool=executor)
+
+        assert my_fit.fit_results['DE_population'].shape == (24, 9)
+
+        with my_fit.execution_pool(executor) as pool:
+
+            assert pool.starmap(pow, [(2, 3), (3, 2)]) == [8, 9]
+
+        assert executor.submit(pow, 2, 2).result() == 4
+
+    with my_fit.execution_pool() as pool:
+
+        assert pool is None
+
+
+def test_worker_initialization():
+    eve = create_event()
+
+    fspl = pymod.FSPLmodel(eve)
+
+    my_fit = pyfit.DEfit(fspl, DE_population_size=1, max_iteration=2)
+    my_fit.define_execution_backend('process', number_of_workers=2)
+
+    parameters = np.array([[79.9, 0.008, 10.1, 0.02], [79.8, 0.01, 11., 0.03]])
+
+    with my_fit.execution_pool() as pool:
+
+        objective_function = pool_method(pool, my_fit, 'objective_function')
+
+        # the fit is cached by the workers, only the method name is sent
+        assert isinstance(objective_function, WorkerMethod)
+        assert len(pickle.dumps(objective_function)) < 200
+
+        objectives = pool.map(objective_function, parameters)
+
+    assert np.allclose(objectives,
+                       [my_fit.objective_function(i) for i in parameters])
+
+    # the telescopes arrays are shared with the workers during the fit only
+    my_fit.define_execution_backend('process', number_of_workers=2,
+                                    shared_memory=True)
+
+    with my_fit.execution_pool() as pool:
+
+        shared_objectives = pool.map(pool_method(pool, my_fit, 'objective_function'),
+                                     parameters)
+
+    assert np.allclose(shared_objectives, objectives)
+    assert type(eve.telescopes[0].lightcurve_flux['flux']) is u.Quantity
+
+    # a pool made by the fit keeps its workers across fits
+    pool = my_fit.make_pool(2)
+
+    try:
+
+        assert isinstance(pool_method(pool, my_fit, 'objective_function'),
+                          WorkerMethod)
+
+        for fit in range(2):
+
+            my_fit.trials = []
+            my_fit.fit(computational_pool=pool)
+
+            # the trials are recorded by the workers
+            assert len(my_fit.trials) >= len(my_fit.fit_results['DE_population'])
+
+        assert np.allclose(pool.map(pool_method(pool, my_fit, 'objective_function'),
+                                    parameters), objectives)
+
+    finally:
+
+        pool.close()
+        pool.join()
+
+    # other pools receive the bound method
+    with my_fit.execution_pool('thread') as pool:
+
+        assert pool_method(pool, my_fit, 'objective_function') == \
+               my_fit.objective_function
+
+
+def test_fit_instrumentation():
+    eve = create_event()
+
+    fspl = pymod.FSPLmodel(eve)
+
+    my_fit = pyfit.DEfit(fspl, DE_population_size=1, max_iteration=2,
+                         display_progress=False, strategy='best1bin')
+    my_fit.enable_instrumentation()
+    my_fit.fit()
+
+    summary = my_fit.fit_results['instrumentation']
+
+    for stage in ['fit', 'parameter_transform', 'trajectory', 'magnification_FSPL',
+                  'flux_solve', 'residuals', 'priors', 'trial_recording']:
+        assert summary[stage]['calls'] > 0
+        assert summary[stage]['self_time'] <= summary[stage]['total_time']
+
+    assert summary['fit']['calls'] == 1
+    assert summary['trial_recording']['calls'] == len(my_fit.trials)
+    assert summary['magnification_FSPL']['calls'] == 2 * summary['residuals'][
+        'calls']
+
+    my_fit.disable_instrumentation()
+
+    assert my_fit.instrumentation is None
+    assert fspl.instrumentation is None
+    assert 'fit' not in my_fit.__dict__
+    assert 'model_magnification' not in fspl.__dict__
+
+
 def test_MCMC():
 
     eve = create_event()
@@ -157,6 +809,128 @@ def test_MCMC():
 
     assert values[3].shape == (10, 8, 9)
 
+    # fluxes are stored alongside the samples, not searched in the trials
+    chains_with_fluxes = my_fit.fit_results['MCMC_chains_with_fluxes']
+    sample = chains_with_fluxes[-1, 3]
+    likelihood, pyLIMA_parameters = my_fit.model_likelihood(sample[:4])
+    fluxes = my_fit.telescopes_fluxes_from_pyLIMA_parameters(pyLIMA_parameters)
+
+    assert np.allclose(sample[4:-1], fluxes)
+    assert np.allclose(sample[-1], -likelihood)
+    assert np.allclose(chains_with_fluxes[:, :, :4],
+                       my_fit.fit_results['MCMC_chains'][:, :, :4])
+
+
+def test_MCMC_backend(tmp_path):
+    pytest.importorskip('h5py')
+
+    eve = create_event()
+
+    fspl = pymod.FSPLmodel(eve)
+    guess = [79.93092166436098, 0.008144359355309872, 10.110765454770114,
+             0.022598878807753468]
+    backend = str(tmp_path / 'chains.h5')
+
+    # a run interrupted after 3 stored links...
+    my_fit = pyfit.MCMCfit(fspl, MCMC_walkers=2, MCMC_links=6, MCMC_thin=2,
+                           MCMC_burn_in=4, MCMC_backend=backend)
+    my_fit.model_parameters_guess = guess
+    my_fit.fit()
+
+    # the chains are read from the file on demand
+    assert 'MCMC_chains' not in my_fit.fit_results
+    assert my_fit.fit_results['MCMC_backend_file'] == backend
+    assert my_fit.MCMC_chains()[0].shape == (3, 8, 5)
+    assert len(my_fit.trials) == 0
+
+    # ...is resumed up to the 5 stored links
+    my_fit = pyfit.MCMCfit(fspl, MCMC_walkers=2, MCMC_links=10, MCMC_thin=2,
+                           MCMC_burn_in=4, MCMC_backend=backend)
+    my_fit.model_parameters_guess = guess
+    my_fit.fit()
+
+    chains, chains_with_fluxes = my_fit.MCMC_chains()
+
+    assert chains.shape == (5, 8, 5)
+    assert chains_with_fluxes.shape == (5, 8, 9)
+    assert np.allclose(chains_with_fluxes[:, :, :4], chains[:, :, :4])
+    assert np.all(chains_with_fluxes[:, :, 4:-1] != 0)
+
+    best_link, best_walker = np.unravel_index(np.argmax(chains[:, :, -1]),
+                                              chains.shape[:2])
+
+    assert np.allclose(my_fit.fit_results['best_model'],
+                       chains_with_fluxes[best_link, best_walker, :-1])
+    assert my_fit.MCMC_chains(discard=1, thin=2)[1].shape == (2, 8, 9)
+    assert my_fit.samples_to_plot().shape == (24, 9)
+
+
+def test_convergence_diagnostics():
+
+    # independent draws are converged, shifted walkers are not
+    chain = np.random.normal(0, 1, (2000, 8, 2))
+    diagnostics = fit_metrics.convergence_diagnostics(chain)
+
+    assert np.allclose(diagnostics['autocorrelation_time'], 1, atol=0.2)
+    assert diagnostics['effective_sample_size'] > 10000
+    assert np.all(np.abs(diagnostics['R_hat'] - 1) < 0.01)
+
+    chain[:, :4] += 5
+    assert np.all(fit_metrics.split_R(chain) > 2)
+
+
+def test_MCMC_convergence(monkeypatch):
+
+    eve = create_event()
+
+    fspl = pymod.FSPLmodel(eve)
+
+    # loose targets, the fit stops at the first check
+    my_fit = pyfit.MCMCfit(fspl, MCMC_walkers=2, MCMC_links=50, MCMC_check_every=5,
+                           MCMC_target_R=np.inf, MCMC_target_ESS=0)
+    my_fit.model_parameters_guess = [79.93092166436098, 0.008144359355309872,
+                                     10.110765454770114, 0.022598878807753468]
+    my_fit.fit()
+
+    convergence = my_fit.fit_results['convergence']
+
+    assert convergence['converged']
+    assert convergence['links'] == [5]
+    assert my_fit.fit_results['MCMC_chains'].shape == (5, 8, 5)
+    assert np.allclose(my_fit.MCMC_chains(discard=1, thin=2)[0],
+                       my_fit.fit_results['MCMC_chains'][2::2])
+
+    # the checks only use the last 4 links
+    sampler = emcee.EnsembleSampler(8, 4, lambda x: -0.5 * np.sum(x ** 2))
+    checked = []
+    convergence_diagnostics = fit_metrics.convergence_diagnostics
+    monkeypatch.setattr(fit_metrics, 'convergence_diagnostics',
+                        lambda chain: checked.append(chain.shape) or
+                        convergence_diagnostics(chain))
+
+    sample_until_convergence(sampler, np.random.normal(0, 1, (8, 4)), 10,
+                             check_every=5, window=4)
+
+    assert checked == [(4, 8, 4), (4, 8, 4)]
+
+    # unreachable targets, the fit runs all links
+    my_fit = pyfit.DEMCfit(fspl, DEMC_walkers=2, DEMC_links=10, DEMC_check_every=5,
+                           DEMC_target_ESS=np.inf)
+    my_fit.fit()
+
+    convergence = my_fit.fit_results['convergence']
+
+    assert not convergence['converged']
+    assert convergence['links'] == [5, 10]
+    assert len(convergence['R_hat'][-1]) == 4
+    assert my_fit.fit_results['DEMC_chains'].shape == (10, 8, 5)
+
+    # the empty initial_population sentinel draws the walkers
+    my_fit = pyfit.DEMCfit(fspl, DEMC_walkers=2, DEMC_links=5)
+    my_fit.fit(initial_population=[])
+
+    assert my_fit.fit_results['DEMC_chains'].shape == (5, 8, 5)
+
 
 def test_objective_functions():
 
@@ -78,6 +78,35 @@ def test_magnification_FSPL_Jacobian():
     assert np.allclose(jacobian, [-1.71720554e-01, -1.02195194e+02, 9.95481471e-04,
                                   7.42711447e+00])
 
+    jacobian, magnification = magnification_Jacobian.magnification_FSPL_Jacobian(
+        pspl, telo, pym, return_magnification=True)
+
+    assert np.allclose(jacobian, [-1.71720554e-01, -1.02195194e+02, 9.95481471e-04,
+                                  7.42711447e+00])
+    assert np.allclose(magnification, pspl.model_magnification(telo, pym))
+
+
+def test_magnification_FSPL_Yoo_Jacobian():
+    from pyLIMA.magnification import magnification_FSPL
+
+    tau = np.linspace(-0.1, 0.1, 11)
+    uo = np.array([0.01] * len(tau))
+    rho = 0.02
+    gamma = 0.5
+
+    magnification, impact_parameter, dAdu, dAdrho = \
+        magnification_FSPL.magnification_FSPL_Yoo_Jacobian(tau, uo, rho, gamma)
+
+    assert np.allclose(magnification,
+                       magnification_FSPL.magnification_FSPL_Yoo(tau, uo, rho, gamma))
+    assert np.allclose(impact_parameter, np.sqrt(tau ** 2 + uo ** 2))
+
+    epsilon = 10 ** -7
+    numerical_dAdrho = (magnification_FSPL.magnification_FSPL_Yoo(
+        tau, uo, rho + epsilon, gamma) - magnification) / epsilon
+
+    assert np.allclose(dAdrho, numerical_dAdrho, rtol=10 ** -2)
+
 
 def test_magnification_numerical_Jacobian():
     from pyLIMA.magnification import magnification_Jacobian
@@ -2,7 +2,7 @@ import unittest.mock as mock
 
 import numpy as np
 from pyLIMA.models import FSBLmodel, FSPLmodel, FSPLargemodel, \
-    PSBLmodel, PSPLmodel, USBLmodel
+    PSBLmodel, PSPLmodel, USBLmodel, pyLIMA_fancy_parameters
 from pyLIMA.toolbox import time_series
 
 
@@ -303,6 +303,70 @@ def test_PSPL():
                                          [99.99999999, 100.00000007]]))
 
 
+def test_parallax_basis():
+    event = _create_event()
+    event.telescopes[0].deltas_positions['photometry'] = np.array([[0.1, 0.2],
+                                                                   [5.4, 8.2]])
+
+    Model = PSPLmodel(event, parallax=['Full', 0])
+
+    basis = Model.parallax_basis['photometry']
+
+    assert basis['basis'].shape == (2, 2, 2)
+    assert basis['slices'] == [slice(0, 2)]
+
+    population = np.array([[0.22, 0.11], [-0.5, 0.3]])
+    delta_tau, delta_beta = Model.event_parallax_shifts(population)
+
+    for ind, pie in enumerate(population):
+        pym = {'piEN': pie[0], 'piEE': pie[1]}
+        shifts = Model.parallax_trajectory_shifts(
+            event.telescopes[0].deltas_positions['photometry'], pym,
+            telescope=event.telescopes[0], data_type='photometry')
+
+        assert np.allclose(delta_tau[ind], shifts[0])
+        assert np.allclose(delta_beta[ind], shifts[1])
+
+    assert np.allclose(delta_tau[0], [0.616, 0.946])
+    assert np.allclose(delta_beta[0], [1.177, 1.782])
+
+    # a recomputed telescope parallax invalidates the basis
+    event.telescopes[0].deltas_positions['photometry'] = np.array([[0.2, 0.4],
+                                                                   [10.8, 16.4]])
+    event.telescopes[0].parallax_version = 1
+
+    shifts = Model.parallax_trajectory_shifts(
+        event.telescopes[0].deltas_positions['photometry'], {'piEN': 0.22,
+                                                             'piEE': 0.11},
+        telescope=event.telescopes[0], data_type='photometry')
+
+    assert np.allclose(shifts[0], [1.232, 1.892])
+    assert np.allclose(Model.event_parallax_shifts(population)[0][0], shifts[0])
+    assert Model.parallax_basis['photometry']['versions'] == [1]
+
+
+def test_compute_orbital_motion_parameters_population():
+    event = _create_event()
+
+    Model = USBLmodel(event, orbital_motion=['Keplerian', 0.5])
+
+    population = np.array([[0.5, 0.002, 38, 0.025, 1.24, 0.002, 0.01, 0.25, -0.33,
+                            1.45, 0.98, 1.2],
+                           [0.5, 0.002, 38, 0.025, 0.8, 0.002, 0.01, 0.1, 0.5, -0.4,
+                            0.25, 1.1]])
+
+    orbital_parameters = Model.compute_orbital_motion_parameters_population(
+        population)
+
+    assert orbital_parameters['Rmatrix'].shape == (2, 2, 2)
+
+    for ind, params in enumerate(population):
+        pym = Model.compute_pyLIMA_parameters(params)
+
+        for key in orbital_parameters.keys():
+            assert np.allclose(orbital_parameters[key][ind], pym[key])
+
+
 def test_USBL():
     event = _create_event()
 
@@ -322,3 +386,67 @@ def test_USBL():
     magi = Model.model_magnification(event.telescopes[0], pym)
 
     assert np.allclose(magi, [76.16515049, 2.11882843])
+
+
+class NaturalLogFancyParameters(
+        pyLIMA_fancy_parameters.StandardFancyParameters):
+
+    def tE(self, fancy_params):
+
+        return np.exp(fancy_params['log_tE'])
+
+
+def test_analytical_Jacobians():
+    from pyLIMA.magnification import magnification_Jacobian
+    from pyLIMA.models import pyLIMA_fancy_parameters
+
+    event = _create_event()
+    event.telescopes[0].deltas_positions['photometry'] = np.array([[0.1, 0.2],
+                                                                   [5.4, 8.2]])
+
+    fancy = pyLIMA_fancy_parameters.StandardFancyParameters(
+        fancy_parameters={'tE': 'log_tE'}, fancy_boundaries={'log_tE': (0, 3)})
+
+    assert fancy.log10_parameters() == ['tE']
+    assert pyLIMA_fancy_parameters.StandardFancyParameters().log10_parameters() == [
+        'tE', 'rho', 'separation', 'mass_ratio']
+
+    for model_type, params in [(PSPLmodel, [0.5, 0.2, 38, 0.1, -0.2]),
+                               (FSPLmodel, [0.5, 0.2, 38, 0.1, 0.1, -0.2])]:
+
+        Model = model_type(event, parallax=['Full', 0])
+
+        assert Model.Jacobian_flag == 'Analytical'
+
+        pym = Model.compute_pyLIMA_parameters(params)
+        jacobi, magi = Model.model_magnification_Jacobian(event.telescopes[0], pym)
+        numerical_jacobi = magnification_Jacobian.magnification_numerical_Jacobian(
+            Model, event.telescopes[0], pym)
+
+        assert jacobi.shape == (2, len(params))
+        assert np.allclose(magi, Model.model_magnification(event.telescopes[0], pym))
+        assert np.allclose(jacobi, numerical_jacobi, rtol=10 ** -2, atol=10 ** -6)
+
+        # the fancy log10(tE) is chained
+        Model = model_type(event, parallax=['Full', 0], fancy_parameters=fancy)
+
+        assert Model.Jacobian_flag == 'Analytical'
+
+        fancy_params = np.copy(params).astype(float)
+        fancy_params[2] = np.log10(params[2])
+
+        pym = Model.compute_pyLIMA_parameters(fancy_params)
+        fancy_jacobi = Model.photometric_model_Jacobian(event.telescopes[0], pym)
+
+        assert np.allclose(fancy_jacobi[2], jacobi[:, 2] * pym['fsource_Test'] *
+                           np.log(10) * 38)
+
+        # the derivative of a non-log10 transform is not known
+        Model = model_type(event, parallax=['Full', 0],
+                           fancy_parameters=NaturalLogFancyParameters(
+                               fancy_parameters={'tE': 'log_tE'},
+                               fancy_boundaries={'log_tE': (0, 3)}))
+
+        assert Model.Jacobian_flag == 'Numerical'
+        assert Model.fancy_parameters.log10_parameters() == []
+        assert Model.fancy_parameters.standard_parameters_derivatives(pym) == {}
@@ -119,3 +119,32 @@ def test_eccentric_anomaly_function():
                                                                       2456589, 3.2)
 
     assert ecc[0] == 6.2307350891533675
+
+
+def test_orbital_parameters_from_position_and_velocities_vectorized():
+    separation_0 = np.array([1.25, 0.8, 1.25])
+    v_para = np.array([0.25, 0.1, 0.25])
+    v_perp = np.array([-0.33, 0.5, -0.33])
+    v_radial = np.array([1.45, -0.4, 1.45])
+    r_s = np.array([0.98, 0.25, -0.25 / 1.45])  # the last two are circular orbits
+    a_s = np.array([1.2, 1, 1])
+    t0_om = 2459855
+
+    outputs = orbital_motion.orbital_motion_3D \
+        .orbital_parameters_from_position_and_velocities_vectorized(
+        separation_0, r_s, a_s, v_para, v_perp, v_radial, t0_om)
+
+    for ind in range(len(separation_0)):
+        expected = orbital_motion.orbital_motion_3D \
+            .orbital_parameters_from_position_and_velocities(
+            separation_0[ind], r_s[ind], a_s[ind], v_para[ind], v_perp[ind],
+            v_radial[ind], t0_om)
+
+        for output, value in zip(outputs, expected):
+            assert np.allclose(output[ind], value)
+
+    states = orbital_motion.orbital_motion_3D.state_orbital_elements_vectorized(
+        separation_0, r_s, a_s, v_para, v_perp, v_radial)
+
+    assert np.allclose(states[0][0], [-0.03404491, 0.20206611, -0.77121146])
+    assert np.allclose(states[1][0], [0.5053125, -1.8828125, -0.515625])
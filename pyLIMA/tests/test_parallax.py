@@ -85,6 +85,33 @@ def test_compute_parallax_curvature():
     assert np.allclose(projection, (np.array([0.616, 0.946]), np.array([1.177, 1.782])))
 
 
+def test_parallax_basis():
+    delta_positions = np.array([[0.1, 0.2], [5.4, 8.2]])
+    basis = parallax.parallax_basis(delta_positions)
+
+    assert basis.shape == (2, 2, 2)
+    assert np.allclose(basis, [[[0.1, 0.2], [5.4, 8.2]], [[5.4, 8.2], [-0.1, -0.2]]])
+
+
+def test_compute_parallax_curvature_from_basis():
+    pie = [0.22, 0.11]
+    delta_positions = np.array([[0.1, 0.2], [5.4, 8.2]])
+    basis = parallax.parallax_basis(delta_positions)
+
+    projection = parallax.compute_parallax_curvature_from_basis(pie, basis)
+
+    assert np.allclose(projection, (np.array([0.616, 0.946]), np.array([1.177, 1.782])))
+
+    population = np.array([pie, [-0.5, 0.3]])
+    projection = parallax.compute_parallax_curvature_from_basis(population, basis)
+
+    for ind, pie_i in enumerate(population):
+        expected = parallax.compute_parallax_curvature(pie_i, delta_positions)
+
+        assert np.allclose(projection[0][ind], expected[0])
+        assert np.allclose(projection[1][ind], expected[1])
+
+
 def test_parallax_combination():
     lightcurve = np.array([[2456789, 12.8, 0.01], [2458888, 12, 0.25]])
 
@@ -104,6 +131,11 @@ def test_parallax_combination():
                        np.array([[8.24926684, -0.74170405],
                                  [1.4884521, -1.0171205]]))
 
+    version = telo.parallax_version
+    parallax.parallax_combination(telo, ['Full', 2458988], North_vector, East_vector)
+
+    assert telo.parallax_version > version
+
 
 def test_Earth_ephemerides():
     times = np.array([258927, 2458936])
@@ -112,3 +112,41 @@ def test_default_priors():
     assert np.allclose(priors['t0'].pdf(5), 0.1)
     assert np.allclose(priors['delta_t0'].pdf(0.5), 0.5)
     assert np.allclose(priors['piEN'].pdf(0.0), 0.1)
+
+
+class _HalfNormal(object):
+
+    def pdf(self, x):
+
+        if x < 0:
+
+            return 0
+
+        return 2 / np.sqrt(2 * np.pi) * np.exp(-0.5 * x ** 2)
+
+
+def test_compiled_priors():
+    priors = [parameters_priors.UniformDistribution(0, 10),
+              parameters_priors.NormalDistribution(1, 2),
+              parameters_priors.LogUniformDistribution(0.1, 100), None, _HalfNormal()]
+
+    compiled_priors = parameters_priors.CompiledPriors(priors)
+
+    parameters = np.array([5, -1, 3, 42, 0.5])
+    ln_pdf = compiled_priors.ln_pdf(parameters)
+
+    assert np.allclose(ln_pdf, [np.log(prior.pdf(value)) if prior is not None else 0
+                                for prior, value in zip(priors, parameters)])
+
+    # a population is evaluated at once, outside the support is -inf
+    population = np.array([[5, -1, 3, 42, 0.5], [11, -1, 3, 42, 0.5],
+                           [5, -1, 300, 42, -0.5]])
+    ln_priors = compiled_priors.ln_probability(population)
+
+    assert ln_priors.shape == (3,)
+    assert np.allclose(ln_priors[0], np.sum(ln_pdf))
+    assert np.all(ln_priors[1:] == -np.inf)
+
+    penalized = compiled_priors.ln_probability(population, penalty=-10 ** 10)
+
+    assert np.allclose(penalized[2], np.sum(ln_pdf[:2]) - 2 * 10 ** 10)
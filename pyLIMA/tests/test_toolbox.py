@@ -1,5 +1,13 @@
+import pickle
+
 import numpy as np
-from pyLIMA.toolbox import brightness_transformation
+from astropy import units as u
+from astropy.table import QTable
+from pyLIMA import event, telescopes
+from pyLIMA.models import PSPLmodel
+from pyLIMA.parallax import parallax
+from pyLIMA.toolbox import brightness_transformation, instrumentation, \
+    objective_cache, shared_arrays
 
 
 def test_magnitude_to_flux():
@@ -37,3 +45,174 @@ def test_noisy_observations():
     flux_obs = brightness_transformation.noisy_observations(flux, exp_time=None)
 
     assert flux_obs != flux
+
+
+def test_instrumentation():
+    counters = instrumentation.Instrumentation()
+
+    def stage_two(x):
+        return x + 1
+
+    def stage_one(x):
+        return counters.timed_call('two', stage_two, x) * 2
+
+    for i in range(3):
+        assert counters.timed_call('one', stage_one, i) == 2 * (i + 1)
+
+    summary = counters.summary()
+
+    assert set(summary.keys()) == {'one', 'two'}
+    assert summary['one']['calls'] == 3
+    assert summary['two']['calls'] == 3
+    assert summary['one']['self_time'] < summary['one']['total_time']
+    assert np.allclose(summary['two']['self_time'], summary['two']['total_time'])
+
+    counters.reset()
+
+    assert len(counters.summary()) == 0
+
+
+def test_objective_cache():
+    cache = objective_cache.ObjectiveCache(maxsize=2)
+
+    assert cache.get(('objective',), np.array([1.0, 2.0])) is None
+
+    cache.put(('objective',), np.array([1.0, 2.0]), 3.0)
+    cache.put(('objective',), np.array([1.0, 3.0]), 4.0)
+
+    # the key is the exact parameters, whatever the container
+    assert cache.get(('objective',), [1, 2]) == 3.0
+    assert cache.get(('residuals',), [1, 2]) is None
+
+    # [1,3] is the least recently used
+    cache.put(('objective',), np.array([1.0, 4.0]), 5.0)
+
+    assert cache.get(('objective',), [1, 3]) is None
+    assert cache.get(('objective',), [1, 4]) == 5.0
+
+    statistics = cache.statistics()
+
+    assert statistics['hits'] == 2
+    assert statistics['misses'] == 3
+    assert statistics['size'] == 2
+    assert np.allclose(statistics['hit_rate'], 0.4)
+
+    # a pickled cache is empty
+    unpickled = pickle.loads(pickle.dumps(cache))
+
+    assert unpickled.maxsize == 2
+    assert unpickled.statistics()['size'] == 0
+
+    cache.clear()
+
+    assert cache.statistics()['size'] == 0
+    assert cache.statistics()['hits'] == 0
+
+
+def test_instrument_methods():
+    class Dummy(object):
+
+        def square(self, x):
+            return x ** 2
+
+    dummy = Dummy()
+    counters = instrumentation.Instrumentation()
+
+    instrumentation.instrument_methods(dummy, {'square': 'power', 'cube': 'power'},
+                                       counters)
+
+    assert isinstance(dummy.square, instrumentation.TimedMethod)
+    assert 'cube' not in dummy.__dict__
+    assert dummy.square(3) == 9
+    assert counters.summary()['power']['calls'] == 1
+
+    instrumentation.remove_instrumentation(dummy, ['square'])
+
+    assert 'square' not in dummy.__dict__
+    assert dummy.square(2) == 4
+    assert counters.summary()['power']['calls'] == 1
+
+
+def test_shared_event():
+    your_event = event.Event()
+
+    lightcurve = np.c_[np.arange(2459000, 2459100), np.ones(100) * 18.,
+                       np.ones(100) * 0.01]
+    telescope = telescopes.Telescope(name='OGLE', light_curve=lightcurve,
+                                     light_curve_names=['time', 'mag', 'err_mag'],
+                                     light_curve_units=['JD', 'mag', 'mag'])
+    telescope.deltas_positions['photometry'] = np.ones((2, 100))
+    your_event.telescopes.append(telescope)
+
+    flux = np.copy(telescope.lightcurve_flux['flux'].value)
+    size = len(pickle.dumps(your_event))
+
+    with shared_arrays.shared_event(your_event) as blocks:
+
+        assert len(blocks) == 8
+        assert isinstance(telescope.lightcurve_flux['flux'],
+                          shared_arrays.SharedQuantity)
+
+        # only references to the shared memory blocks are pickled
+        assert len(pickle.dumps(your_event)) < size / 2
+
+        telescope_copy = pickle.loads(pickle.dumps(telescope))
+
+        assert np.allclose(telescope_copy.lightcurve_flux['flux'].value, flux)
+        assert telescope_copy.lightcurve_flux['flux'].unit == \
+               telescope.lightcurve_flux['flux'].unit
+        assert np.allclose(telescope_copy.deltas_positions['photometry'], 1)
+
+        # views and copies are pickled by value
+        assert type(pickle.loads(pickle.dumps(
+            telescope.lightcurve_flux['flux'][:10]))) is u.Quantity
+
+    assert type(telescope.lightcurve_flux) is QTable
+    assert type(telescope.lightcurve_flux['flux']) is u.Quantity
+    assert type(telescope.deltas_positions['photometry']) is np.ndarray
+    assert np.allclose(telescope.lightcurve_flux['flux'].value, flux)
+
+
+def test_shared_model(monkeypatch):
+    your_event = event.Event(ra=270, dec=-30)
+
+    lightcurve = np.c_[np.linspace(2459000, 2459100, 200), np.ones(200) * 18.,
+                       np.ones(200) * 0.01]
+    telescope = telescopes.Telescope(name='OGLE', light_curve=lightcurve,
+                                     light_curve_names=['time', 'mag', 'err_mag'],
+                                     light_curve_units=['JD', 'mag', 'mag'])
+    your_event.telescopes.append(telescope)
+
+    model = PSPLmodel(your_event, parallax=['Full', 2459050])
+    pyLIMA_parameters = model.compute_pyLIMA_parameters([2459050, 0.1, 30, 0.1, 0.2])
+    magnification = model.compute_the_microlensing_model(
+        telescope, pyLIMA_parameters)['photometry']
+
+    calls = []
+    parallax_basis = parallax.parallax_basis
+    monkeypatch.setattr(parallax, 'parallax_basis',
+                        lambda *args: calls.append(args) or parallax_basis(*args))
+
+    with shared_arrays.shared_model(model):
+
+        assert isinstance(model.parallax_basis['photometry']['basis'],
+                          shared_arrays.SharedArray)
+
+        # a worker copy uses the shared, precomputed basis
+        model_copy = pickle.loads(pickle.dumps(model))
+
+        assert isinstance(model_copy.parallax_basis['photometry']['basis'],
+                          shared_arrays.SharedArray)
+
+        for microlensing_model in [model, model_copy]:
+
+            assert np.allclose(microlensing_model.compute_the_microlensing_model(
+                microlensing_model.event.telescopes[0],
+                pyLIMA_parameters)['photometry'], magnification)
+
+        del model_copy
+
+    assert type(model.parallax_basis['photometry']['basis']) is np.ndarray
+    assert np.allclose(model.compute_the_microlensing_model(
+        telescope, pyLIMA_parameters)['photometry'], magnification)
+    assert len(calls) == 0
@@ -0,0 +1,172 @@
+import time as python_time
+from collections import OrderedDict
+
+# method name : stage name, the magnification stage is suffixed by the model type
+MODEL_STAGES = OrderedDict([('compute_pyLIMA_parameters', 'parameter_transform'),
+                            ('sources_trajectory', 'trajectory'),
+                            ('model_magnification', 'magnification'),
+                            ('derive_telescope_flux', 'flux_solve')])
+
+FIT_STAGES = OrderedDict([('model_residuals', 'residuals'),
+                          ('get_priors_probability', 'priors'),
+                          ('record_trial', 'trial_recording')])
+
+
+class Instrumentation(object):
+    """
+    Count the calls and accumulate the time spent in each stage of a model or a fit.
+    Stages can be nested (e.g. the magnification calls the trajectory): the
+    total_time of a stage includes its sub-stages, the self_time does not.
+
+    Only the calls made in the current process are counted, i.e. not the ones of
+    the workers of a computational_pool.
+
+    Attributes
+    ----------
+    counters : dict, {stage : [calls, total_time, self_time]}
+    """
+
+    def __init__(self):
+
+        self.counters = OrderedDict()
+        self.stack = [0.0]
+
+    def reset(self):
+        """
+        Reset all the counters
+        """
+        self.counters = OrderedDict()
+        self.stack = [0.0]
+
+    def timed_call(self, stage, function, *args, **kwargs):
+        """
+        Call function and record its cost in the given stage
+
+        Parameters
+        ----------
+        stage : str, the stage name
+        function : callable, the function to call
+
+        Returns
+        -------
+        output : the function output
+        """
+        self.stack.append(0.0)
+        start = python_time.perf_counter()
+
+        try:
+
+            return function(*args, **kwargs)
+
+        finally:
+
+            elapsed = python_time.perf_counter() - start
+            sub_stages_time = self.stack.pop()
+            self.stack[-1] += elapsed
+
+            counter = self.counters.setdefault(stage, [0, 0.0, 0.0])
+            counter[0] += 1
+            counter[1] += elapsed
+            counter[2] += elapsed - sub_stages_time
+
+    def summary(self):
+        """
+        Summarize the counters
+
+        Returns
+        -------
+        summary : dict, {stage : {'calls','total_time','self_time'}} sorted by
+        decreasing self_time
+        """
+        stages = sorted(self.counters.keys(),
+                        key=lambda stage: -self.counters[stage][2])
+
+        summary = OrderedDict()
+
+        for stage in stages:
+
+            calls, total_time, self_time = self.counters[stage]
+            summary[stage] = {'calls': calls, 'total_time': total_time,
+                              'self_time': self_time}
+
+        return summary
+
+
+class TimedMethod(object):
+    """
+    Replace a method of an instance by a timed version of it. The original method
+    is looked up on the class, so the object stays picklable.
+
+    Attributes
+    ----------
+    instrumentation : object, an Instrumentation object
+    stage : str, the stage name
+    instance : object, the instrumented object
+    method_name : str, the name of the instrumented method
+    """
+
+    def __init__(self, instrumentation, stage, instance, method_name):
+
+        self.instrumentation = instrumentation
+        self.stage = stage
+        self.instance = instance
+        self.method_name = method_name
+
+    def __call__(self, *args, **kwargs):
+
+        method = getattr(type(self.instance), self.method_name)
+
+        return self.instrumentation.timed_call(self.stage, method, self.instance,
+                                               *args, **kwargs)
+
+
+class InstrumentedFit(TimedMethod):
+    """
+    A TimedMethod for the fit method of a fit object, that also stores the
+    instrumentation summary in fit_results['instrumentation']
+    """
+
+    def __call__(self, *args, **kwargs):
+
+        output = super().__call__(*args, **kwargs)
+
+        if isinstance(self.instance.fit_results, dict):
+            self.instance.fit_results['instrumentation'] = \
+                self.instrumentation.summary()
+
+        return output
+
+
+def instrument_methods(instance, stages, instrumentation):
+    """
+    Wrap the methods of an instance into TimedMethod. Nothing is changed for the
+    other instances, so there is no overhead when the instrumentation is off.
+
+    Parameters
+    ----------
+    instance : object, the object to instrument
+    stages : dict, {method_name : stage_name}
+    instrumentation : object, an Instrumentation object
+    """
+    for method_name, stage in stages.items():
+
+        if hasattr(type(instance), method_name):
+
+            setattr(instance, method_name,
+                    TimedMethod(instrumentation, stage, instance, method_name))
+
+
+def remove_instrumentation(instance, stages):
+    """
+    Restore the original methods of an instrumented object
+
+    Parameters
+    ----------
+    instance : object, the instrumented object
+    stages : dict or list, the instrumented methods names
+    """
+    for method_name in stages:
+
+        if isinstance(instance.__dict__.get(method_name), TimedMethod):
+
+            del instance.__dict__[method_name]
@@ -0,0 +1,137 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class ObjectiveCache(object):
+    """
+    A bounded memoization of the objective function of a fit, keyed on the exact
+    bytes of the parameters vector. When full, the least recently used entry is
+    dropped. The cache can be shared by several threads (e.g. a 'thread' pool);
+    a process receiving a pickled cache gets an empty one.
+
+    Attributes
+    ----------
+    maxsize : int, the maximum number of entries
+    entries : OrderedDict, {key : value}, the most recently used last
+    hits : int, the number of lookups found in the cache
+    misses : int, the number of lookups not found in the cache
+    lock : object, the threading.Lock protecting the entries and counters
+    """
+
+    def __init__(self, maxsize=128):
+
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+
+        return {'maxsize': self.maxsize}
+
+    def __setstate__(self, state):
+
+        self.__init__(state['maxsize'])
+
+    @staticmethod
+    def key(kind, parameters):
+        """
+        The key of a parameters vector
+
+        Parameters
+        ----------
+        kind : tuple, what is cached, e.g. ('objective','chi2')
+        parameters : array, the parameters vector
+
+        Returns
+        -------
+        key : tuple, (kind, shape, bytes of the float parameters)
+        """
+        parameters = np.ascontiguousarray(parameters, dtype=float)
+
+        return kind, parameters.shape, parameters.tobytes()
+
+    def get(self, kind, parameters):
+        """
+        Look for the value of a parameters vector
+
+        Parameters
+        ----------
+        kind : tuple, what is cached
+        parameters : array, the parameters vector
+
+        Returns
+        -------
+        value : the cached value, None if not in the cache
+        """
+        key = self.key(kind, parameters)
+
+        with self.lock:
+
+            value = self.entries.get(key)
+
+            if value is None:
+
+                self.misses += 1
+
+            else:
+
+                self.hits += 1
+                self.entries.move_to_end(key)
+
+        return value
+
+    def put(self, kind, parameters, value):
+        """
+        Store the value of a parameters vector
+
+        Parameters
+        ----------
+        kind : tuple, what is cached
+        parameters : array, the parameters vector
+        value : object, the value to store (arrays should not be modified
+        afterwards)
+        """
+        key = self.key(kind, parameters)
+
+        with self.lock:
+
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.maxsize:
+
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Empty the cache and reset the counters
+        """
+        with self.lock:
+
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def statistics(self):
+        """
+        The cache statistics
+
+        Returns
+        -------
+        statistics : dict, the hits, misses, hit_rate, size and maxsize
+        """
+        with self.lock:
+
+            lookups = self.hits + self.misses
+            hit_rate = 0.0
+
+            if lookups != 0:
+
+                hit_rate = self.hits / lookups
+
+            return {'hits': self.hits, 'misses': self.misses, 'hit_rate': hit_rate,
+                    'size': len(self.entries), 'maxsize': self.maxsize}
@@ -0,0 +1,392 @@
+import contextlib
+from multiprocessing import shared_memory
+
+import astropy.units as u
+import numpy as np
+from astropy.table import QTable
+
+# the shared memory blocks attached by this process, kept open for its lifetime
+ATTACHED_BLOCKS = {}
+
+# the Telescope attributes containing arrays
+TELESCOPE_TABLES = ['lightcurve_flux', 'lightcurve_magnitude', 'astrometry']
+TELESCOPE_DICTIONNARIES = ['deltas_positions', 'Earth_positions', 'Earth_speeds',
+                           'sidereal_times', 'telescope_positions',
+                           'Earth_positions_projected', 'Earth_speeds_projected']
+
+
+class SharedArray(np.ndarray):
+    """
+    An array stored in a multiprocessing.shared_memory block. It is pickled as a
+    reference to the block, so another process attaches a zero-copy view instead
+    of receiving a copy of the data (see attach_array). Views and results of
+    operations are pickled as normal arrays.
+
+    Attributes
+    ----------
+    shared_block : tuple, (block name, shape, dtype), None if the array is not the
+    whole block
+    """
+    shared_block = None
+
+    def __array_finalize__(self, obj):
+
+        if super().__array_finalize__:
+
+            super().__array_finalize__(obj)
+
+        shared_block = getattr(obj, 'shared_block', None)
+
+        # only the views of the whole block keep the reference
+        if (shared_block is not None) and (self.shape == obj.shape) and (
+                self.dtype == obj.dtype) and (
+                self.__array_interface__['data'][0] ==
+                obj.__array_interface__['data'][0]):
+
+            self.shared_block = shared_block
+
+    def __reduce__(self):
+
+        if self.shared_block is None:
+
+            return np.asarray(self).__reduce__()
+
+        return attach_array, self.shared_block
+
+
+class SharedQuantity(SharedArray, u.Quantity):
+    """
+    A SharedArray with a unit, to be used as a QTable column
+    """
+
+    def __reduce__(self):
+
+        if self.shared_block is None:
+
+            return u.Quantity(self).__reduce__()
+
+        return attach_array, self.shared_block + (self.unit,)
+
+
+class SharedQTable(QTable):
+    """
+    A QTable pickled column by column, so that its SharedQuantity columns are
+    pickled as references (a QTable pickles copies of its columns)
+    """
+
+    def __reduce__(self):
+
+        return rebuild_table, ([self[name] for name in self.colnames],
+                               self.colnames, self.meta)
+
+
+def rebuild_table(columns, names, meta):
+    """
+    Rebuild a pickled SharedQTable, without copying its columns
+
+    Parameters
+    ----------
+    columns : list, the columns
+    names : list, the columns names
+    meta : dict, the table meta
+
+    Returns
+    -------
+    table : object, a SharedQTable
+    """
+    return SharedQTable(columns, names=names, meta=meta, copy=False)
+
+
+def attach_array(name, shape, dtype, unit=None):
+    """
+    Attach a zero-copy view of a shared memory block
+
+    Parameters
+    ----------
+    name : str, the block name
+    shape : tuple, the array shape
+    dtype : str, the array dtype
+    unit : object, the unit of a SharedQuantity, None for a SharedArray
+
+    Returns
+    -------
+    array : array, a SharedArray or a SharedQuantity
+    """
+    if name not in ATTACHED_BLOCKS:
+
+        try:
+
+            # the creator of the block is in charge of it (python >= 3.13)
+            block = shared_memory.SharedMemory(name=name, track=False)
+
+        except TypeError:
+
+            block = shared_memory.SharedMemory(name=name)
+
+        ATTACHED_BLOCKS[name] = block
+
+    return shared_view(ATTACHED_BLOCKS[name], shape, dtype, unit)
+
+
+def shared_view(block, shape, dtype, unit=None):
+    """
+    The array view of a shared memory block
+
+    Parameters
+    ----------
+    block : object, a SharedMemory object
+    shape : tuple, the array shape
+    dtype : str, the array dtype
+    unit : object, the unit of a SharedQuantity, None for a SharedArray
+
+    Returns
+    -------
+    array : array, a SharedArray or a SharedQuantity
+    """
+    view = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+    if unit is None:
+
+        array = view.view(SharedArray)
+
+    else:
+
+        array = SharedQuantity(view, unit, copy=False)
+
+    array.shared_block = (block.name, shape, dtype)
+
+    return array
+
+
+def share_array(array, blocks):
+    """
+    Copy an array into a new shared memory block
+
+    Parameters
+    ----------
+    array : array, a numerical array or Quantity
+    blocks : list, the list of created blocks, the new block is appended
+
+    Returns
+    -------
+    shared_array : array, a SharedArray, or a SharedQuantity if array has a unit
+    """
+    values = np.ascontiguousarray(getattr(array, 'value', array))
+
+    block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+    blocks.append(block)
+
+    unit = None
+
+    if isinstance(array, u.Quantity):
+
+        unit = array.unit
+
+    shared_array = shared_view(block, values.shape, values.dtype.str, unit)
+    shared_array.view(np.ndarray)[...] = values
+
+    return shared_array
+
+
+def is_shareable(array):
+    """
+    Check if an array can be moved into shared memory
+
+    Parameters
+    ----------
+    array : object, the object to check
+
+    Returns
+    -------
+    shareable : bool, True for non-empty numerical arrays
+    """
+    return isinstance(array, np.ndarray) and (array.size > 0) and (
+        array.dtype.kind in 'biufc')
+
+
+def share_telescope(telescope, blocks):
+    """
+    Move the numerical arrays of a telescope into shared memory, i.e. the
+    lightcurves and astrometry columns with a unit and the positions
+    dictionnaries (parallax deltas_positions, Earth positions...)
+
+    Parameters
+    ----------
+    telescope : object, a telescope object
+    blocks : list, the list of created blocks, the new blocks are appended
+    """
+    for table_name in TELESCOPE_TABLES:
+
+        table = getattr(telescope, table_name)
+
+        if table is None:
+
+            continue
+
+        table = SharedQTable(table, copy=False)
+
+        for column_name in table.colnames:
+
+            column = table[column_name]
+
+            if isinstance(column, u.Quantity) and is_shareable(column):
+
+                table.replace_column(column_name, share_array(column, blocks),
+                                     copy=False)
+
+        setattr(telescope, table_name, table)
+
+    for dictionnary_name in TELESCOPE_DICTIONNARIES:
+
+        dictionnary = getattr(telescope, dictionnary_name)
+
+        for key, array in dictionnary.items():
+
+            if is_shareable(array):
+
+                dictionnary[key] = share_array(array, blocks)
+
+
+def unshare_telescope(telescope):
+    """
+    Replace the shared arrays of a telescope by private copies
+
+    Parameters
+    ----------
+    telescope : object, a telescope object
+    """
+    for table_name in TELESCOPE_TABLES:
+
+        table = getattr(telescope, table_name)
+
+        if isinstance(table, SharedQTable):
+
+            columns = [u.Quantity(table[name]) if isinstance(table[name], SharedArray)
+                       else table[name] for name in table.colnames]
+
+            setattr(telescope, table_name, QTable(columns, names=table.colnames,
+                                                  meta=table.meta))
+
+    for dictionnary_name in TELESCOPE_DICTIONNARIES:
+
+        dictionnary = getattr(telescope, dictionnary_name)
+
+        for key, array in dictionnary.items():
+
+            if isinstance(array, SharedArray):
+
+                dictionnary[key] = np.array(array)
+
+
+@contextlib.contextmanager
+def shared_event(event):
+    """
+    Move the telescopes arrays of an event into shared memory, so that the
+    processes receiving the event (e.g. the workers of a process pool) attach
+    them instead of holding a copy. At exit, the telescopes get private copies
+    back and the shared memory is released.
+
+    Parameters
+    ----------
+    event : object, an event object
+
+    Yields
+    ------
+    blocks : list, the created SharedMemory blocks
+    """
+    blocks = []
+
+    try:
+
+        for telescope in event.telescopes:
+
+            share_telescope(telescope, blocks)
+
+        yield blocks
+
+    finally:
+
+        for telescope in event.telescopes:
+
+            unshare_telescope(telescope)
+
+        for block in blocks:
+
+            try:
+
+                block.close()
+
+            except BufferError:
+
+                # a view is still referenced somewhere, the memory is released
+                # with it
+                pass
+
+            block.unlink()
+
+
+def share_parallax_basis(model, blocks):
+    """
+    Move the stacked parallax basis of a model (see
+    ML_model.define_parallax_basis) into shared memory
+
+    Parameters
+    ----------
+    model : object, a microlensing model
+    blocks : list, the list of created blocks, the new blocks are appended
+    """
+    for data_type, stacked in getattr(model, 'parallax_basis', {}).items():
+
+        if is_shareable(stacked['basis']):
+
+            stacked['basis'] = share_array(stacked['basis'], blocks)
+
+        stacked['telescopes_basis'] = [share_array(basis, blocks) if
+                                       is_shareable(basis) else basis for basis in
+                                       stacked['telescopes_basis']]
+
+
+def unshare_parallax_basis(model):
+    """
+    Replace the shared parallax basis of a model by private copies
+
+    Parameters
+    ----------
+    model : object, a microlensing model
+    """
+    for data_type, stacked in getattr(model, 'parallax_basis', {}).items():
+
+        if isinstance(stacked['basis'], SharedArray):
+
+            stacked['basis'] = np.array(stacked['basis'])
+
+        stacked['telescopes_basis'] = [np.array(basis) if
+                                       isinstance(basis, SharedArray) else basis
+                                       for basis in stacked['telescopes_basis']]
+
+
+@contextlib.contextmanager
+def shared_model(model):
+    """
+    Move the telescopes arrays of the model event and the model parallax basis
+    into shared memory, see shared_event
+
+    Parameters
+    ----------
+    model : object, a microlensing model
+
+    Yields
+    ------
+    blocks : list, the created SharedMemory blocks
+    """
+    with shared_event(model.event) as blocks:
+
+        try:
+
+            share_parallax_basis(model, blocks)
+
+            yield blocks
+
+        finally:
+
+            unshare_parallax_basis(model)